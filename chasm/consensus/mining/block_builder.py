@@ -1,10 +1,15 @@
-import queue
+import heapq
+import time
+
+import rlp
+from rlp.codec import length_prefix
 
 from chasm.consensus import Block
 from chasm.consensus.primitives.transaction import MintingTransaction
 from chasm.consensus.primitives.tx_output import TransferOutput
 from chasm.consensus.validation.block_validator import DIFFICULTY_COMPUTATION_INTERVAL, \
     BlockStatelessValidator
+from chasm.serialization import type_registry
 from chasm.serialization.rlp_serializer import RLPSerializer
 from chasm.state.service import StateService
 from chasm.state.state import State
@@ -17,7 +22,11 @@ class BlockBuilder:
         self._miner: bytes = miner
         self._dev = dev
 
+        self.last_build_time = None  # seconds
+        self.last_fees = None
+
     def build_block(self) -> Block:
+        started = time.perf_counter()
 
         current_height = self._state.current_height
         last_block = self._state.get_block_by_no(current_height)
@@ -30,47 +39,218 @@ class BlockBuilder:
                                                                      old_block.timestamp, last_block.timestamp,
                                                                      dev=self._dev)
 
-        minting_tx = self._get_minting_tx(minted_value)
-
         block = Block(previous_block_hash=last_block.hash(), difficulty=difficulty)
 
-        block = self._add_transactions(block, minting_tx)
+        block = self._add_transactions(block, minted_value)
 
         block.update_merkle_root()
 
+        self.last_build_time = time.perf_counter() - started
         return block
 
     def _get_minting_tx(self, value) -> MintingTransaction:
         output = TransferOutput(value, self._miner)
         return MintingTransaction(outputs=[output], height=self._state.current_height)
 
-    def _add_transactions(self, block, minting_tx):
-        utxos = self._state.get_utxos()
-        used_utxos = []
+    def _add_transactions(self, block, minted_value):
+        """
+        Fills the block with the minting transaction and the pending transactions paying the most per byte.
 
+        The ones which can never be valid are removed from the pending ones. The chosen ones stay pending
+        until the block is applied, so pending transactions may still spend their outputs and not their inputs.
+        """
         serializer = RLPSerializer()
+        entries, invalid = self._build_entries(self._state.get_pending_txs(), self._state.get_utxos(), serializer)
 
-        minting_output = minting_tx.outputs[0]
+        # NOTE: the minting transaction grows with the collected fees, so space for the largest one is reserved
+        largest_minting_tx = self._get_minting_tx(minted_value + sum(entry.fee for entry in entries.values()))
+        block_size = _EncodedBlockSize(block, len(serializer.encode(largest_minting_tx)))
 
-        block.add_transaction(minting_tx)
+        selected = self._select(entries, block_size)
+        self.last_fees = sum(entry.fee for entry in selected)
 
-        while BlockStatelessValidator.check_block_size(len(serializer.encode(block))):
-            tx = None
-            try:
-                tx = self._state.pop_pending_tx()
-            except queue.Empty:
-                return block
+        block.add_transaction(self._get_minting_tx(minted_value + self.last_fees))
+        for entry in selected:
+            block.add_transaction(entry.tx)
+
+        self._state.remove_pending_txs(invalid)
+
+        return block
 
+    @staticmethod
+    def _build_entries(pending_txs, utxos, serializer):
+        """
+        Computes fee, size and pending ancestors of every pending transaction
+
+        :return: (dict of tx hash -> _TemplateEntry, list of hashes of the transactions which can never be valid)
+        """
+        hashes = [tx.hash() for tx in pending_txs]
+        pending_outputs = {(tx_hash, i): tx_output
+                           for tx_hash, tx in zip(hashes, pending_txs) for i, tx_output in enumerate(tx.outputs)}
+
+        entries, invalid = {}, []
+        for tx_hash, tx in zip(hashes, pending_txs):
+            input_sum, parents = 0, set()
             for tx_input in tx.inputs:
                 utxo = (tx_input.tx_hash, tx_input.output_no)
-                if utxo in used_utxos or utxo not in utxos:
+                tx_output = utxos.get(utxo)
+                if tx_output is None:
+                    tx_output = pending_outputs.get(utxo)
+                    if tx_output is None:
+                        break
+                    parents.add(tx_input.tx_hash)
+                input_sum += tx_output.value
+            else:
+                fee = input_sum - sum(tx_output.value for tx_output in tx.outputs)
+                entries[tx_hash] = _TemplateEntry(tx, tx_hash, fee, len(serializer.encode(tx)), parents)
+                continue
+
+            invalid.append(tx_hash)
+
+        BlockBuilder._resolve_ancestors(entries, invalid)
+
+        return entries, invalid
+
+    @staticmethod
+    def _resolve_ancestors(entries, invalid):
+        """
+        Fills ancestors of the entries, descendants of the invalid transactions are invalid as well
+        """
+        invalid_hashes = set(invalid)
+
+        for entry in entries.values():
+            stack = [entry]
+            while stack:
+                current = stack[-1]
+                if current.ancestors is not None:
+                    stack.pop()
                     continue
-                tx_output = utxos[utxo]
-                minting_output.value += tx_output.value
 
-            for tx_output in tx.outputs:
-                minting_output.value -= tx_output.value
+                unresolved = [entries[parent] for parent in current.parents
+                              if parent in entries and entries[parent].ancestors is None]
+                if unresolved:
+                    stack.extend(unresolved)
+                    continue
 
-            block.add_transaction(tx)
+                stack.pop()
+                ancestors = set(current.parents)
+                for parent in current.parents:
+                    if parent in entries:
+                        ancestors.update(entries[parent].ancestors)
+                current.ancestors = frozenset(ancestors)
 
-        return block
+        for tx_hash, entry in list(entries.items()):
+            if not entry.ancestors <= entries.keys() or entry.ancestors & invalid_hashes:
+                del entries[tx_hash]
+                invalid.append(tx_hash)
+
+    @staticmethod
+    def _select(entries, block_size):
+        """
+        Greedily picks the transactions with the highest fee per byte of their package,
+        which is the transaction together with its ancestors not picked yet
+
+        :return: chosen entries, every transaction comes after its ancestors
+        """
+        heap = [(-BlockBuilder._package_rate(entries, entry, ()), order, tx_hash)
+                for order, (tx_hash, entry) in enumerate(entries.items())]
+        heapq.heapify(heap)
+
+        selected, selected_hashes, skipped = [], set(), set()
+        while heap:
+            neg_rate, order, tx_hash = heapq.heappop(heap)
+            if tx_hash in selected_hashes or tx_hash in skipped:
+                continue
+
+            entry = entries[tx_hash]
+            if entry.ancestors & skipped:
+                # NOTE: the ancestor did not fit, so a package including it will not fit as well
+                skipped.add(tx_hash)
+                continue
+
+            rate = BlockBuilder._package_rate(entries, entry, selected_hashes)
+            if rate != -neg_rate:
+                heapq.heappush(heap, (-rate, order, tx_hash))
+                continue
+
+            package = sorted((entries[ancestor] for ancestor in entry.ancestors if ancestor not in selected_hashes),
+                             key=lambda ancestor: len(ancestor.ancestors))
+            package.append(entry)
+
+            if not BlockStatelessValidator.check_block_size(block_size.with_txs(p.size for p in package)):
+                skipped.add(tx_hash)
+                continue
+
+            for package_entry in package:
+                selected.append(package_entry)
+                selected_hashes.add(package_entry.tx_hash)
+                block_size.add_tx(package_entry.size)
+
+        return selected
+
+    @staticmethod
+    def _package_rate(entries, entry, selected_hashes):
+        package = [entries[ancestor] for ancestor in entry.ancestors if ancestor not in selected_hashes]
+        package.append(entry)
+        return sum(p.fee for p in package) / sum(p.size for p in package)
+
+
+class _TemplateEntry:
+    __slots__ = ('tx', 'tx_hash', 'fee', 'size', 'parents', 'ancestors')
+
+    def __init__(self, tx, tx_hash, fee, size, parents):
+        self.tx = tx
+        self.tx_hash = tx_hash
+        self.fee = fee
+        self.size = size
+        self.parents = parents
+        self.ancestors = None
+
+
+class _EncodedBlockSize:
+    """
+    Tracks the length of the encoded block from the lengths of its encoded transactions, so the block
+    is never encoded while it is built.
+
+    The nonce and the merkle root are set after the transactions are chosen, so their longest encodings are assumed.
+    """
+    _MAX_NONCE = 2 ** 64 - 1
+
+    def __init__(self, block: Block, minting_tx_len):
+        type_id = next(type_id for (type_name, type_id) in type_registry if type_name == Block)
+        self._type_id_len = len(rlp.encode(type_id))
+
+        header = [block.previous_block_hash, bytes(32), _EncodedBlockSize._MAX_NONCE, block.difficulty,
+                  block.timestamp]
+        self._header_len = sum(len(rlp.encode(field)) for field in header)
+
+        self._minting_tx_len = _string_len(minting_tx_len)
+        self._txs_len = 0
+
+    def add_tx(self, tx_len):
+        self._txs_len += _string_len(tx_len)
+
+    def with_txs(self, tx_lens):
+        """
+        :return: length of the encoded block with more transactions of the given encoded lengths
+        """
+        return self._size(self._txs_len + sum(_string_len(tx_len) for tx_len in tx_lens))
+
+    @property
+    def size(self):
+        return self._size(self._txs_len)
+
+    def _size(self, txs_len):
+        values_len = _list_len(self._header_len + _list_len(self._minting_tx_len + txs_len))
+        return _list_len(self._type_id_len + _string_len(values_len))
+
+
+def _string_len(length):
+    """
+    :return: length of a RLP encoded string of the given length, longer than a single byte
+    """
+    return len(length_prefix(length, 0x80)) + length
+
+
+def _list_len(payload_len):
+    return len(length_prefix(payload_len, 0xc0)) + payload_len
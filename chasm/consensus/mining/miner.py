@@ -1,17 +1,194 @@
-import copy
+import itertools
+import multiprocessing
+import os
+import queue
+import time
 
+import rlp
+from rlp.codec import length_prefix
+
+from chasm import consensus
 from chasm.consensus import Block
 from chasm.consensus.validation.block_validator import BlockStatelessValidator
 
+WORKER_STEP = 10000
+
+_NO_JOB = 0
+_FOUND, _PROGRESS = 'found', 'progress'
+_POLL_INTERVAL = 0.1  # seconds
+
+
+class HeaderTemplate:
+    """
+    Header representation for nonce grinding, produces the same hashes as :func: `Block.Header.hash`.
+
+    Only the nonce changes between the hashed headers, so the fields around it are encoded once.
+    The RLP list prefix depends on the length of the encoded nonce, so the hasher state fed with
+    the prefix and the fields preceding the nonce is kept for every such length and copied for each nonce.
+    """
+
+    def __init__(self, header: Block.Header):
+        self.difficulty = header.difficulty
+
+        self._head = b''.join(rlp.encode(item) for item in
+                              (header.previous_block_hash, header.merkle_root, header.timestamp))
+        self._tail = rlp.encode(header.difficulty)
+        self._hashers = {}
+
+    def hash(self, nonce):
+        encoded_nonce = HeaderTemplate._encode_nonce(nonce)
+
+        hasher = self._hashers.get(len(encoded_nonce))
+        if hasher is None:
+            hasher = self._build_hasher(len(encoded_nonce))
+
+        hasher = hasher.copy()
+        hasher.update(encoded_nonce)
+        hasher.update(self._tail)
+        return hasher.digest()
+
+    def _build_hasher(self, encoded_nonce_len):
+        payload_len = len(self._head) + encoded_nonce_len + len(self._tail)
+        hasher = consensus.HASH_FUNC(length_prefix(payload_len, 0xc0) + self._head)
+        self._hashers[encoded_nonce_len] = hasher
+        return hasher
+
+    @staticmethod
+    def _encode_nonce(nonce):
+        if nonce == 0:
+            return b'\x80'
+        if nonce < 0x80:
+            return bytes((nonce,))
+
+        length = (nonce.bit_length() + 7) // 8
+        return bytes((0x80 + length,)) + nonce.to_bytes(length, byteorder='big')
+
 
 class Miner:
     def __init__(self, header: Block.Header):
-        self._header = copy.deepcopy(header)
+        self._template = HeaderTemplate(header)
         self.result = None
 
     def check_nonce_in_range(self, r: range):
+        template_hash, check_block_hash = self._template.hash, BlockStatelessValidator.check_block_hash
+        difficulty = self._template.difficulty
+
         for i in r:
-            self._header.set_nonce(i)
-            if BlockStatelessValidator.check_block_hash(self._header.hash(), self._header.difficulty):
+            if check_block_hash(template_hash(i), difficulty):
                 self.result = i
                 break
+
+
+class MiningPool:
+    """
+    Searches for a nonce with a pool of persistent worker processes.
+
+    Every worker gets the header of a job once and scans its own, disjoint chunks of nonces:
+    worker `i` of `n` checks chunks `i, i + n, i + 2n, ...` of `step` nonces each.
+    After every chunk it reports the number of checked nonces and stops as soon as
+    the job is no longer the current one, so a job is cancelled within a single chunk.
+    """
+
+    def __init__(self, workers=0, step=WORKER_STEP):
+        """
+        :param workers: number of worker processes, 0 means one per core
+        :param step: number of nonces a worker checks between reporting the progress
+        """
+        self._workers_no = workers if workers > 0 else os.cpu_count() or 1
+        self._step = step
+
+        self._context = multiprocessing.get_context('spawn')
+        self._current_job = self._context.Value('Q', _NO_JOB, lock=False)
+        self._results = self._context.Queue()
+        self._jobs = []
+        self._processes = []
+        self._job_ids = itertools.count(_NO_JOB + 1)
+
+        self.hashrate = 0.0
+
+    @property
+    def workers(self):
+        return self._workers_no
+
+    def start(self):
+        for worker_no in range(self._workers_no):
+            jobs = self._context.Queue()
+            process = self._context.Process(target=_mining_worker, name=f'{MiningPool.__name__}-{worker_no}',
+                                            args=(worker_no, self._workers_no, self._step, jobs, self._results,
+                                                  self._current_job),
+                                            daemon=True)
+            process.start()
+            self._jobs.append(jobs)
+            self._processes.append(process)
+
+    def stop(self):
+        self.cancel()
+        for jobs in self._jobs:
+            jobs.put(None)
+
+        for process in self._processes:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+
+        self._jobs, self._processes = [], []
+
+    def cancel(self):
+        self._current_job.value = _NO_JOB
+
+    def mine(self, header: Block.Header, exit_condition, on_progress=None):
+        """
+        Searches for a nonce which makes the hash of the header meet its difficulty.
+
+        :param header: header of the mined block, it is not modified
+        :param exit_condition: callable, the search is abandoned once it returns True
+        :param on_progress: optional callable invoked with the number of checked nonces and the current hashrate
+        :return: found nonce or None if the search was abandoned
+        """
+        job_id = next(self._job_ids)
+        self._current_job.value = job_id
+        for jobs in self._jobs:
+            jobs.put((job_id, header))
+
+        checked, started = 0, time.perf_counter()
+        try:
+            while not exit_condition():
+                try:
+                    result_job, kind, value = self._results.get(timeout=_POLL_INTERVAL)
+                except queue.Empty:
+                    continue
+
+                if result_job != job_id:
+                    continue
+
+                if kind == _FOUND:
+                    return value
+
+                checked += value
+                self.hashrate = checked / (time.perf_counter() - started)
+                if on_progress is not None:
+                    on_progress(checked, self.hashrate)
+
+            return None
+        finally:
+            self.cancel()
+
+
+def _mining_worker(worker_no, workers_no, step, jobs, results, current_job):
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+
+        job_id, header = job
+        miner = Miner(header)
+        chunk = worker_no
+
+        while current_job.value == job_id:
+            miner.check_nonce_in_range(range(chunk * step, (chunk + 1) * step))
+            if miner.result is not None:
+                results.put((job_id, _FOUND, miner.result))
+                break
+
+            results.put((job_id, _PROGRESS, step))
+            chunk += workers_no
@@ -1,18 +1,20 @@
+import queue
 import time
-from threading import Thread
+from threading import Thread, Event, Lock
 
 from termcolor import colored
 
 from chasm.consensus.mining.block_builder import BlockBuilder
-from chasm.consensus.mining.miner import Miner
+from chasm.consensus.mining.miner import MiningPool
 from chasm.maintenance.config import Config
+from chasm.maintenance.exceptions import TransactionValidationException, ValidationError
 from chasm.maintenance.logger import Logger
 from chasm.services_manager import Service
-from chasm.state.service import StateService
+from chasm.state.service import StateService, StateEvent
 
 
 class MinerService(Service):
-    WORKER_STEP = 10000
+    PROGRESS_LOG_INTERVAL = 10  # seconds
 
     def __init__(self, state: StateService, config: Config, dev=False):
         self._state = state
@@ -22,10 +24,17 @@ class MinerService(Service):
         self._dev = dev
 
         self._builder = None
-        self._workers = None
+        self._pool: MiningPool = None
+        self._last_progress_log = 0
+
+        self._rebuild_fee_threshold = config.get('xpeer_miner_rebuild_fee_threshold')
+        self._tip_changed = Event()
+        self._fee_gain = 0
+        self._arrived_fees = None  # tx hash -> fee of the transactions which arrived while the block is built
+        self._fee_gain_lock = Lock()
 
         self._exit_condition = None
-        self._logger = None
+        self._logger = Logger('chasm.miner')
 
     def __call__(self, *args, **kwargs):
 
@@ -33,29 +42,45 @@ class MinerService(Service):
 
         while not self._exit_condition():
 
+            self._reset_template_state()
+
             self._logger.info('Building new block')
             block = self._builder.build_block()
-            self._logger.info(f'Successfully built a new block with {block.transactions.__len__()} transactions.')
+            self._discount_included_txs(block)
+            self._logger.info(f'Successfully built a new block with {block.transactions.__len__()} transactions '
+                              f'paying {self._builder.last_fees} in fees, '
+                              f'built in {self._builder.last_build_time * 1000:.1f}ms.')
 
             nonce = self._mine(block)
-            if nonce:
+            if nonce is not None:
                 block.header.set_nonce(nonce)
                 self._logger.info('\U00002692 ' + colored(
                     f' Mined new block with hash {block.hash().hex()}, difficulty: {block.header.difficulty}',
                     'yellow'))
 
-                self._state.apply_block(block)
+                try:
+                    self._state.apply_block(block)
+                except (TransactionValidationException, ValidationError):
+                    self._logger.exception('Mined block is invalid, dropped it')
+                    self._revalidate_transactions(block)
+                    continue
                 self._logger.info('\U000026D3 ' + colored(
                     f' Successfully applied the new block at height {self._state.current_height}', "green"))
+            elif not self._exit_condition():
+                self._logger.info('Abandoned the block: ' + (
+                    'the chain tip has changed' if self._tip_changed.is_set() else
+                    f'pending transactions pay {self._fee_gain} more in fees'))
 
     def start(self, exit_condition):
 
         miner = self._config.get('xpeer_miner_address')
 
-        self._logger = Logger('chasm.miner')
-
         self._builder = BlockBuilder(self._state, miner, dev=self._dev)
-        self._workers = self._config.get('xpeer_miner_threads')
+        self._state.subscribe(self._on_state_event)
+        if not self._dev:
+            self._pool = MiningPool(self._config.get('xpeer_miner_threads'))
+            self._pool.start()
+            self._logger.info(f'Started {self._pool.workers} mining workers')
 
         self._exit_condition = exit_condition
         self._thread.start()
@@ -63,6 +88,9 @@ class MinerService(Service):
 
     def stop(self):
         self._thread.join()
+        self._state.unsubscribe(self._on_state_event)
+        if self._pool is not None:
+            self._pool.stop()
 
     def is_running(self):
         return self._thread.is_alive()
@@ -73,25 +101,59 @@ class MinerService(Service):
             time.sleep(1)
             return 1
 
-        searched_nonces = 0
-
-        while not self._exit_condition():
-            workers = []
-            for i in range(self._workers):
-                miner = Miner(block.header)
-                worker_range = range(searched_nonces, searched_nonces + MinerService.WORKER_STEP)
-                thread = Thread(target=lambda: miner.check_nonce_in_range(worker_range))
-                searched_nonces += MinerService.WORKER_STEP
-                workers.append((miner, thread))
-                thread.start()
-
-            for _, thread in workers:
-                thread.join()
-
-            for miner, _ in workers:
-                if miner.result:
-                    return miner.result
-
-            self._logger.debug(colored(f'Searched through up to: {searched_nonces}', "blue"))
-
-        return None
+        return self._pool.mine(block.header, lambda: self._exit_condition() or self._is_template_stale(),
+                               on_progress=self._log_progress)
+
+    def _on_state_event(self, event, *args):
+        if event == StateEvent.NEW_TIP:
+            self._tip_changed.set()
+        elif event == StateEvent.NEW_PENDING_TX:
+            tx, fee = args
+            with self._fee_gain_lock:
+                self._fee_gain += fee
+                if self._arrived_fees is not None:
+                    self._arrived_fees[tx.hash()] = fee
+
+    def _reset_template_state(self):
+        """
+        Invoked before the block is built, transactions which arrive while it is built are remembered
+        until :func: `_discount_included_txs`
+        """
+        self._tip_changed.clear()
+        with self._fee_gain_lock:
+            self._fee_gain = 0
+            self._arrived_fees = {}
+
+    def _discount_included_txs(self, block):
+        """
+        Transactions which arrived while the block was built and got into it do not count towards abandoning it
+        """
+        with self._fee_gain_lock:
+            for tx in block.transactions[1:]:
+                self._fee_gain -= self._arrived_fees.pop(tx.hash(), 0)
+            self._arrived_fees = None
+
+    def _is_template_stale(self):
+        """
+        The block is stale when it no longer extends the chain tip, or when the transactions which arrived
+        since it was built pay at least the configured threshold in fees (0 disables the rebuilds on fees)
+        """
+        return self._tip_changed.is_set() or 0 < self._rebuild_fee_threshold <= self._fee_gain
+
+    def _revalidate_transactions(self, block):
+        """
+        Validates the pending transactions of a block which failed to apply again, the invalid ones are dropped
+        """
+        txs = block.transactions[1:]
+        self._state.remove_pending_txs([tx.hash() for tx in txs])
+        for tx in txs:
+            try:
+                self._state.add_pending_tx(tx)
+            except (TransactionValidationException, ValidationError, queue.Full):
+                self._logger.debug(f'Dropped transaction {tx.hash().hex()} of the invalid block')
+
+    def _log_progress(self, checked, hashrate):
+        now = time.monotonic()
+        if now - self._last_progress_log >= MinerService.PROGRESS_LOG_INTERVAL:
+            self._last_progress_log = now
+            self._logger.debug(colored(f'Searched through {checked} nonces, hashrate: {hashrate:.0f} H/s', "blue"))
@@ -21,6 +21,11 @@ class Block(Serializable):
                 ('timestamp', sedes.big_endian_int), ('transactions', countable_list)]
 
     class Header:
+        """
+        NOTE: the hash is memoized, setting any of the fields invalidates it
+        """
+        _FIELDS = ('previous_block_hash', 'merkle_root', 'timestamp', 'nonce', 'difficulty')
+
         def __init__(self, previous_block_hash, merkle_root, difficulty, nonce, timestamp):
             self.previous_block_hash = previous_block_hash
             self.merkle_root = merkle_root if merkle_root is not None else b''
@@ -28,8 +33,13 @@ class Block(Serializable):
             self.nonce = nonce
             self.difficulty = difficulty
 
+        def __setattr__(self, name, value):
+            object.__setattr__(self, name, value)
+            object.__setattr__(self, '_hash', None)
+
         def __eq__(self, other):
-            return self.__class__ == other.__class__ and self.__dict__ == other.__dict__
+            return self.__class__ == other.__class__ and \
+                   all(getattr(self, field) == getattr(other, field) for field in Block.Header._FIELDS)
 
         def adjust_timestamp(self):
             self.timestamp = int(time.time())
@@ -38,9 +48,10 @@ class Block(Serializable):
             self.nonce = value
 
         def hash(self):
-            encoded = rlp.encode(
-                [self.previous_block_hash, self.merkle_root, self.timestamp, self.nonce, self.difficulty])
-            return consensus.HASH_FUNC(encoded).digest()
+            if self._hash is None:
+                encoded = rlp.encode([getattr(self, field) for field in Block.Header._FIELDS])
+                object.__setattr__(self, '_hash', consensus.HASH_FUNC(encoded).digest())
+            return self._hash
 
     def __init__(self, previous_block_hash, difficulty, merkle_root=None, timestamp=None, nonce=0,
                  transactions: [Union[SignedTransaction, MintingTransaction]] = None):
@@ -8,6 +8,10 @@ from chasm.serialization.serializable import Serializable
 
 
 class Transaction(Serializable):
+    """
+    NOTE: transactions are immutable once encoded or hashed
+    """
+    _memoize_encoding = True
 
     @classmethod
     def fields(cls) -> [(str, object)]:
@@ -23,14 +27,22 @@ class Transaction(Serializable):
         self.inputs: [TxInput] = inputs
         self.outputs = outputs
 
-        self.encoded = RLPSerializer().encode(self)
+        self._hash = None
+        RLPSerializer().encode(self)  # NOTE: memoizes the encoding, unless it is already known
+
+    @property
+    def encoded(self) -> bytes:
+        from chasm.serialization.rlp_serializer import RLPSerializer
+        return RLPSerializer().encode(self)
 
     def sign(self, private_key: str):
         key = SigningKey.from_string(private_key, curve=consensus.CURVE)
         return key.sign(self.encoded, hashfunc=consensus.HASH_FUNC)
 
     def hash(self):
-        return consensus.HASH_FUNC(self.encoded).digest()
+        if self._hash is None:
+            self._hash = consensus.HASH_FUNC(self.encoded).digest()
+        return self._hash
 
 
 class MintingTransaction(Transaction):
@@ -42,10 +54,6 @@ class MintingTransaction(Transaction):
         self.height = height
         super().__init__(outputs=outputs)
 
-    def hash(self):
-        from chasm.serialization.rlp_serializer import RLPSerializer
-        return consensus.HASH_FUNC(RLPSerializer().encode(self)).digest()
-
 
 class OfferTransaction(Transaction):
     @classmethod
@@ -119,6 +127,7 @@ class UnlockingDepositTransaction(Transaction):
 
 
 class SignedTransaction(Serializable):
+    _memoize_encoding = True
 
     @classmethod
     def fields(cls) -> [(str, object)]:
@@ -1,6 +1,13 @@
+import time
+
 from chasm.consensus import Block
-from chasm.consensus.validation.tx_validator import Validator
-from chasm.maintenance.exceptions import BlockHashError, BlockDifficultyError, BlockSizeError
+from chasm.consensus.primitives.transaction import MintingTransaction, OfferTransaction, MatchTransaction, \
+    ConfirmationTransaction, UnlockingDepositTransaction
+from chasm.consensus.validation.overlay import OverlayView
+from chasm.consensus.validation.signature_verifier import SignatureVerifier
+from chasm.consensus.validation.tx_validator import Validator, TxValidator
+from chasm.maintenance.exceptions import BlockHashError, BlockDifficultyError, BlockSizeError, BlockMintingError, \
+    BlockUnlockError
 from chasm.serialization.rlp_serializer import RLPSerializer
 
 EXPECTED_BLOCK_INTERVAL = 5  # time interval between two consecutive blocks
@@ -20,24 +27,82 @@ def check_block_size(block: Block):
 
 
 class BlockValidator(Validator):
-
-    def __init__(self, utxos, offers, accepted_offers, last_block_header, old_block_header, height, dev=False):
+    """
+    Validates a block on top of the given state, `height` is the height of the last block.
+
+    Transactions are validated in stages, their durations (in seconds) are kept in `timings`:
+     - stateless: checks of single transactions (size, positive outputs, duplicated inputs)
+     - signatures: all the signatures of the block verified in a single batch, by the worker processes
+       of the signature verifier if it has any
+     - stateful: the remaining checks of the transactions in their order, every one of them sees
+       the outputs created and spent, offers created and matched by the preceding ones.
+       Offers which timed out before the last block are expired first, the way :class: `State` does
+    """
+
+    def __init__(self, utxos, offers, accepted_offers, last_block_header, old_block_header, height, dev=False,
+                 signature_verifier: SignatureVerifier = None):
+        self._utxos = utxos
+        self._offers = offers
+        self._accepted_offers = accepted_offers
         self._last_block: Block.Header = last_block_header
         self._old_block: Block.Header = old_block_header
         self._height = height
+        self._signature_verifier = signature_verifier
 
         self._dev = dev
 
+        self.timings = {}
+
     def prepare(self, obj: Block):
         return {
             'block': obj,
             'header': obj.header
         }
 
-    @staticmethod
-    def check_all_transactions(block):
+    def check_all_transactions(self, block):
+        if not block.transactions:
+            raise BlockMintingError('missing')
+
+        minting_tx, *txs = block.transactions
+        overlay = _BlockOverlay(self._utxos, self._offers, self._accepted_offers)
+        validator = TxValidator(overlay.utxos, overlay.active_offers, overlay.matched_offers,
+                                self._signature_verifier)
+
+        started = time.perf_counter()
         for tx in block.transactions:
-            pass
+            validator.validate_stateless(tx)
+        self.timings['stateless'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        validator.verify_signatures(txs)
+        self.timings['signatures'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        overlay.expire_offers(self._last_block.timestamp)
+        fees = 0
+        for tx in txs:
+            if isinstance(tx, MintingTransaction):
+                raise BlockMintingError('more than one in the block')
+
+            validator.validate_stateful(tx)
+
+            fees += sum(overlay.utxos[(tx_input.tx_hash, tx_input.output_no)].value for tx_input in tx.inputs) - \
+                sum(output.value for output in tx.outputs)
+            overlay.apply(tx.transaction, block.timestamp)
+
+        self._validate_minting_tx(minting_tx, fees)
+        self.timings['stateful'] = time.perf_counter() - started
+
+    def _validate_minting_tx(self, tx, fees):
+        if not isinstance(tx, MintingTransaction):
+            raise BlockMintingError('not the first transaction of the block')
+        if tx.height != self._height:
+            raise BlockMintingError(f'height {tx.height}, expected {self._height}')
+
+        minted_value = BlockStatelessValidator.get_minting_value(self._height + 1)
+        output_sum = sum(output.value for output in tx.outputs)
+        if output_sum > minted_value + fees:
+            raise BlockMintingError(f'outputs of value {output_sum}, expected at most {minted_value + fees}')
 
     def check_block_difficulty(self, header: Block.Header):
         expected = BlockStatelessValidator.get_expected_difficulty(self._height, self._last_block.difficulty,
@@ -84,3 +149,63 @@ class BlockStatelessValidator:
             return False
 
         return True
+
+
+class _BlockOverlay:
+    """
+    State seen by a transaction of a validated block: the state the block is validated against,
+    changed by the preceding transactions of the block the same way :class: `State` applies them
+    """
+
+    _DEPOSIT_TXS = (OfferTransaction, MatchTransaction, UnlockingDepositTransaction)
+
+    def __init__(self, utxos, active_offers, matched_offers):
+        self._outputs, self._spent = {}, set()
+        self._offers, self._removed_offers = {}, set()
+        self._matches, self._closed = {}, set()
+
+        self.utxos = OverlayView(utxos, self._outputs, self._spent)
+        self.active_offers = OverlayView(active_offers, self._offers, self._removed_offers)
+        self.matched_offers = OverlayView(matched_offers, self._matches, self._closed)
+
+    def expire_offers(self, timestamp):
+        """
+        Expires active offers which timed out before the timestamp and returns their deposits,
+        costs O(number of active offers)
+        """
+        for offer_hash, offer in list(self.active_offers.items()):
+            if offer.timeout < timestamp:
+                self._removed_offers.add(offer_hash)
+                self._outputs[(offer_hash, offer.deposit_index)] = offer.outputs[offer.deposit_index]
+
+    def apply(self, tx, timestamp):
+        """
+        :raise BlockUnlockError: if the transaction unlocks deposits of an exchange which is not matched
+        """
+        tx_hash = tx.hash()
+        for tx_input in tx.inputs:
+            self._spent.add((tx_input.tx_hash, tx_input.output_no))
+
+        deposit_index = tx.deposit_index if isinstance(tx, _BlockOverlay._DEPOSIT_TXS) else None
+        for output_no, output in enumerate(tx.outputs):
+            if output_no != deposit_index:
+                self._outputs[(tx_hash, output_no)] = output
+
+        if isinstance(tx, OfferTransaction):
+            self._offers[tx_hash] = tx
+        elif isinstance(tx, MatchTransaction):
+            self._matches[tx.exchange] = (self.active_offers[tx.exchange], tx, timestamp)
+            self._removed_offers.add(tx.exchange)
+        elif isinstance(tx, (ConfirmationTransaction, UnlockingDepositTransaction)):
+            if tx.exchange not in self.matched_offers:
+                raise BlockUnlockError(tx_hash, tx.exchange)
+            offer, match, _timestamp = self.matched_offers[tx.exchange]
+            self._closed.add(tx.exchange)
+
+            if isinstance(tx, ConfirmationTransaction):
+                unlocked = [offer, match]
+            else:
+                unlocked = [offer] if tx.proof_side == 0 else [match]
+            for exchange_tx in unlocked:
+                self._outputs[(exchange_tx.hash(), exchange_tx.deposit_index)] = \
+                    exchange_tx.outputs[exchange_tx.deposit_index]
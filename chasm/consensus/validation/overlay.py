@@ -0,0 +1,35 @@
+from collections.abc import Mapping
+
+
+class OverlayView(Mapping):
+    """
+    Read-only view of a base mapping with entries added and hidden by an overlay.
+
+    NOTE: the overlay mappings are not copied, changes made to them are visible through the view
+    """
+
+    def __init__(self, base, added, hidden):
+        self._base = base
+        self._added = added
+        self._hidden = hidden
+
+    def __getitem__(self, key):
+        if key in self._hidden:
+            raise KeyError(key)
+        if key in self._added:
+            return self._added[key]
+        return self._base[key]
+
+    def __contains__(self, key):
+        return key not in self._hidden and (key in self._added or key in self._base)
+
+    def __iter__(self):
+        for key in self._base:
+            if key not in self._hidden:
+                yield key
+        for key in list(self._added):
+            if key not in self._hidden and key not in self._base:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
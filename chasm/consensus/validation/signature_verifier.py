@@ -0,0 +1,143 @@
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+
+from ecdsa import VerifyingKey
+
+from chasm.consensus import CURVE, HASH_FUNC
+
+DEFAULT_CACHE_SIZE = 2 ** 16  # verified signatures
+DEFAULT_KEYS_CACHE_SIZE = 2 ** 12  # parsed public keys
+
+PARALLEL_BATCH_SIZE = 64  # smaller batches are verified in the calling thread
+
+
+class _LRUCache:
+    """
+    Thread-safe mapping which keeps at most `size` of the recently used entries
+    """
+
+    def __init__(self, size):
+        self._size = size
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self._size:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SignatureVerifier:
+    """
+    Verifies ECDSA signatures of messages, remembering the successfully verified ones.
+
+    A transaction is validated once when it enters the mempool and again in a block,
+    so the second time its signatures are only looked up in the cache of
+    (public key, message hash, signature) triples. Parsed public keys are cached as well.
+    Batches of signatures (e.g. of a whole block) can be verified by a pool of worker processes.
+    """
+
+    def __init__(self, cache_size=DEFAULT_CACHE_SIZE, keys_cache_size=DEFAULT_KEYS_CACHE_SIZE, workers=0):
+        """
+        :param workers: number of processes verifying batches, batches are verified in the calling thread if 0
+        """
+        self._verified = _LRUCache(cache_size)
+        self._keys = _LRUCache(keys_cache_size)
+
+        self._workers = workers
+        self._pool: ProcessPoolExecutor = None
+        self._pool_lock = Lock()
+
+    def verify(self, pub_key, signature, message, message_hash=None):
+        """
+        :param message_hash: hash of the message if already known, it identifies the message in the cache
+        :raise BadSignatureError: if the signature is invalid
+        :return: True
+        """
+        key = (pub_key, message_hash or HASH_FUNC(message).digest(), signature)
+        if self._verified.get(key):
+            return True
+
+        self._get_key(pub_key).verify(signature, message)
+        self._verified.put(key, True)
+        return True
+
+    def verify_batch(self, requests):
+        """
+        Verifies a batch of signatures, in the worker processes if there are any and the batch is big enough
+
+        :param requests: list of (public key, signature, message, message hash) tuples, the hash may be None
+        :return: list of results - True if a signature is valid, False otherwise (including malformed keys)
+        """
+        keys = [(pub_key, message_hash or HASH_FUNC(message).digest(), signature)
+                for pub_key, signature, message, message_hash in requests]
+        results = [bool(self._verified.get(key)) for key in keys]
+
+        pending = [i for i, verified in enumerate(results) if not verified]
+        pending_requests = [requests[i][:3] for i in pending]
+        if self._workers > 0 and len(pending) >= PARALLEL_BATCH_SIZE:
+            chunk_size = -(-len(pending) // self._workers)
+            chunks = [pending_requests[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+            verified = [result for chunk in self._get_pool().map(_verify_all, chunks) for result in chunk]
+        else:
+            verified = [self._verify_quietly(*request) for request in pending_requests]
+
+        for i, result in zip(pending, verified):
+            if result:
+                results[i] = True
+                self._verified.put(keys[i], True)
+
+        return results
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+    def _get_key(self, pub_key):
+        vk = self._keys.get(pub_key)
+        if vk is None:
+            vk = VerifyingKey.from_string(pub_key, curve=CURVE, hashfunc=HASH_FUNC)
+            self._keys.put(pub_key, vk)
+        return vk
+
+    def _verify_quietly(self, pub_key, signature, message):
+        try:
+            return self._get_key(pub_key).verify(signature, message)
+        except Exception:  # pylint: disable=broad-except
+            return False
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self._workers, mp_context=multiprocessing.get_context('spawn'))
+            return self._pool
+
+
+_worker_verifier = None
+
+
+def _verify_all(requests):
+    """
+    Verifies signatures in a worker process, it keeps its own cache of parsed public keys
+    """
+    global _worker_verifier  # pylint: disable=global-statement
+    if _worker_verifier is None:
+        _worker_verifier = SignatureVerifier(cache_size=0)
+
+    return [_worker_verifier._verify_quietly(*request) for request in requests]  # pylint: disable=protected-access
@@ -1,10 +1,9 @@
 # pylint: disable=missing-docstring
 from datetime import datetime, timedelta
 
-from ecdsa import VerifyingKey, BadSignatureError
-from multipledispatch import dispatch
+from ecdsa import BadSignatureError
 
-from chasm.consensus import HASH_FUNC, CURVE, Side
+from chasm.consensus import Side
 from chasm.consensus.primitives.transaction import Transaction, \
     SignedTransaction, OfferTransaction, MatchTransaction, \
     UnlockingDepositTransaction, ConfirmationTransaction, \
@@ -12,7 +11,8 @@ from chasm.consensus.primitives.transaction import Transaction, \
 from chasm.consensus.primitives.tx_output import TransferOutput, \
     XpeerFeeOutput, XpeerOutput
 from chasm.consensus.tokens import ADDRESS_LENGTH, Tokens
-from chasm.consensus.validation.validator import Validator
+from chasm.consensus.validation.signature_verifier import SignatureVerifier
+from chasm.consensus.validation.validator import Validator, TypeDispatcher
 from chasm.maintenance.exceptions import DuplicatedInput, \
     NonexistentUTXO, InputOutputSumsException, \
     SignaturesAmountException, TransactionSizeException, \
@@ -35,21 +35,33 @@ MAX_SIZE = 2 ** 20
 
 
 class TxValidator(Validator):
-    def __init__(self, utxos, active_offers, accepted_offers):
+    # checks which do not depend on the state
+    STATELESS_CHECKS = ('check_size', 'check_outputs_are_positive', 'check_inputs_repetitions')
+
+    def __init__(self, utxos, active_offers, accepted_offers, signature_verifier: SignatureVerifier = None):
         self._utxos = utxos
         self._active_offers = active_offers
         self._accepted_offers = accepted_offers
         self._rlp_serializer = RLPSerializer()
+        self._signature_verifier = signature_verifier if signature_verifier is not None else SignatureVerifier()
 
     @staticmethod
-    @dispatch(SignedTransaction)
     def prepare(tx):
-        return {'tx': tx.transaction, 'signatures': tx.signatures}
+        if isinstance(tx, SignedTransaction):
+            return {'tx': tx.transaction, 'signatures': tx.signatures}
+        if isinstance(tx, MintingTransaction):
+            return {'tx': tx, 'signatures': list()}
+        raise NotImplementedError(f'Could not prepare {tx.__class__.__name__}')
 
-    @staticmethod
-    @dispatch(MintingTransaction)
-    def prepare(tx):
-        return {'tx': tx, 'signatures': list()}
+    def validate_stateless(self, tx):
+        tx = self.prepare(tx)['tx']
+        for check in TxValidator.STATELESS_CHECKS:
+            getattr(self, check)(tx)
+
+        return True
+
+    def validate_stateful(self, tx):
+        return self.validate(tx, skipped_checks=TxValidator.STATELESS_CHECKS)
 
     def check_size(self, tx):
         data = self._rlp_serializer.encode(tx)
@@ -96,28 +108,58 @@ class TxValidator(Validator):
 
         return True
 
-    @dispatch(TransferOutput, bytes, Transaction)
-    def _validate_signature(self, utxo, signature, tx):
-        vk = VerifyingKey.from_string(utxo.receiver, curve=CURVE, hashfunc=HASH_FUNC)
-        vk.verify(signature, tx.encoded)
-        return True
+    def verify_signatures(self, txs):
+        """
+        Verifies signatures of the given transactions in a single batch, so validating them
+        afterwards only looks the results up. Invalid signatures are reported by the validation.
+        :param txs: transactions in order, they may spend outputs of the preceding ones
+        """
+        outputs = {}
+        requests = []
+        for tx in txs:
+            if isinstance(tx, SignedTransaction):
+                for tx_input, signature in zip(tx.transaction.inputs, tx.signatures):
+                    utxo = outputs.get((tx_input.tx_hash, tx_input.output_no)) or \
+                           self._utxos.get((tx_input.tx_hash, tx_input.output_no))
+                    for pub_key in TxValidator._get_signing_keys(utxo):
+                        requests.append((pub_key, signature, tx.transaction.encoded, tx.transaction.hash()))
+                tx = tx.transaction
+
+            for output_no, output in enumerate(tx.outputs):
+                outputs[(tx.hash(), output_no)] = output
+
+        self._signature_verifier.verify_batch(requests)
+
+    @staticmethod
+    def _get_signing_keys(utxo):
+        if isinstance(utxo, XpeerOutput):
+            return [utxo.receiver, utxo.sender]
+        if isinstance(utxo, TransferOutput):
+            return [utxo.receiver]
+        return []
+
+    def _verify(self, pub_key, signature, tx):
+        return self._signature_verifier.verify(pub_key, signature, tx.encoded, tx.hash())
 
-    @dispatch(XpeerFeeOutput, bytes, Transaction)
     def _validate_signature(self, utxo, signature, tx):
+        return TxValidator._signature_validators(self, utxo, signature, tx)
+
+    def _validate_transfer_signature(self, utxo, signature, tx):
+        return self._verify(utxo.receiver, signature, tx)
+
+    @staticmethod
+    def _validate_xpeer_fee_signature(_utxo, _signature, _tx):
         return True
 
-    @dispatch(XpeerOutput, bytes, Transaction)
-    def _validate_signature(self, utxo: XpeerOutput, signature, tx):
+    def _validate_xpeer_signature(self, utxo: XpeerOutput, signature, tx):
         try:
             # receiver
-            vk_1 = VerifyingKey.from_string(utxo.receiver, curve=CURVE, hashfunc=HASH_FUNC)
-            vk_1.verify(signature, tx.encoded)
+            self._verify(utxo.receiver, signature, tx)
             if utxo.exchange in self._accepted_offers:
                 raise ReceiverUseXpeerOutputBeforeConfirmationError(tx.hash(), utxo.exchange)
         except BadSignatureError:
             # sender
-            vk_1 = VerifyingKey.from_string(utxo.sender, curve=CURVE, hashfunc=HASH_FUNC)
-            vk_1.verify(signature, tx.encoded)
+            self._verify(utxo.sender, signature, tx)
             if utxo.exchange not in self._accepted_offers:
                 raise SenderUseXpeerOutputAfterConfirmationError(tx.hash(), utxo.exchange)
 
@@ -128,6 +170,10 @@ class TxValidator(Validator):
 
         return True
 
+    _signature_validators = TypeDispatcher({TransferOutput: '_validate_transfer_signature',
+                                            XpeerFeeOutput: '_validate_xpeer_fee_signature',
+                                            XpeerOutput: '_validate_xpeer_signature'})
+
     def _get_utxo(self, tx_hash, tx_input):
         key = (tx_input.tx_hash, tx_input.output_no)
         if key not in self._utxos:
@@ -150,42 +196,47 @@ class TxValidator(Validator):
         self._do_specific_validation(tx)
         return True
 
-    @dispatch(MintingTransaction)
     def _do_specific_validation(self, tx):
+        return TxValidator._specific_validators(self, tx)
+
+    @staticmethod
+    def _validate_minting(_tx):
         return True
 
-    @dispatch(Transaction)
-    def _do_specific_validation(self, tx):
+    def _validate_base(self, tx):
         return TxValidator.BaseTxValidator(self._utxos,
                                            self._accepted_offers). \
             validate(tx)
 
-    @dispatch(OfferTransaction)
-    def _do_specific_validation(self, tx: OfferTransaction):
+    def _validate_offer(self, tx: OfferTransaction):
         return TxValidator.OfferValidator(self._utxos,
                                           self._accepted_offers, self._active_offers). \
             validate(tx)
 
-    @dispatch(MatchTransaction)
-    def _do_specific_validation(self, tx: MatchTransaction):
+    def _validate_match(self, tx: MatchTransaction):
         return TxValidator.AcceptanceValidator(self._utxos,
                                                self._accepted_offers,
                                                self._active_offers). \
             validate(tx)
 
-    @dispatch(ConfirmationTransaction)
-    def _do_specific_validation(self, tx: ConfirmationTransaction):
+    def _validate_confirmation(self, tx: ConfirmationTransaction):
         return TxValidator.ConfirmationValidator(self._utxos,
                                                  self._accepted_offers). \
             validate(tx)
 
-    @dispatch(UnlockingDepositTransaction)
-    def _do_specific_validation(self, tx: UnlockingDepositTransaction):
+    def _validate_deposit_unlock(self, tx: UnlockingDepositTransaction):
         return TxValidator.DepositUnlockValidator(self._utxos,
                                                   self._accepted_offers,
                                                   self._active_offers). \
             validate(tx)
 
+    _specific_validators = TypeDispatcher({MintingTransaction: '_validate_minting',
+                                           Transaction: '_validate_base',
+                                           OfferTransaction: '_validate_offer',
+                                           MatchTransaction: '_validate_match',
+                                           ConfirmationTransaction: '_validate_confirmation',
+                                           UnlockingDepositTransaction: '_validate_deposit_unlock'})
+
     class TransactionValidator(Validator):
         def __init__(self, utxos, accepted_offers):
             self._utxos = utxos
@@ -199,13 +250,14 @@ class TxValidator(Validator):
         def prepare(self, obj):
             return {'tx': obj}
 
-        @dispatch(TransferOutput)
         def _validate_output(self, output):
+            return TxValidator.TransactionValidator._output_validators(self, output)
+
+        def _validate_transfer_output(self, output):
             return self._validate_address_length(Tokens.XPEER.value,
                                                  output.receiver)
 
-        @dispatch(XpeerOutput)
-        def _validate_output(self, output: XpeerOutput):
+        def _validate_xpeer_output(self, output: XpeerOutput):
             if output.exchange not in self._accepted_offers:
                 raise XpeerOutputException()
 
@@ -214,10 +266,13 @@ class TxValidator(Validator):
                    self._validate_address_length(Tokens.XPEER.value,
                                                  output.sender)
 
-        @dispatch(XpeerFeeOutput)
-        def _validate_output(self, output):
+        def _validate_xpeer_fee_output(self, output):
             raise XpeerFeeOutputException()
 
+        _output_validators = TypeDispatcher({TransferOutput: '_validate_transfer_output',
+                                             XpeerOutput: '_validate_xpeer_output',
+                                             XpeerFeeOutput: '_validate_xpeer_fee_output'})
+
         def _validate_outputs(self, tx):
             for i, output in enumerate(tx.outputs):
                 try:
@@ -259,18 +314,9 @@ class TxValidator(Validator):
             self._utxos = utxos
             self._accepted_offers = accepted_offers
 
-        @dispatch(XpeerFeeOutput)
-        def _validate_output(self, output):
+        def _validate_xpeer_fee_output(self, output):
             return True
 
-        @dispatch(XpeerOutput)
-        def _validate_output(self, output):
-            return super()._validate_output(output)
-
-        @dispatch(TransferOutput)
-        def _validate_output(self, output):
-            return super()._validate_output(output)
-
         @staticmethod
         def _validate_confirmation_fee(tx):
             if len(tx.outputs) < tx.confirmation_fee_index:
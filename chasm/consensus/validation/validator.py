@@ -3,16 +3,82 @@ from abc import ABC
 
 
 class Validator(ABC):
+    """
+    Runs all the `check_*` methods of a validator, passing them the parameters named
+    like their arguments, taken from the result of :func: `prepare`.
+
+    The checks and their arguments are found once per class (and set of skipped checks) and cached.
+    """
+
+    _plans = {}
 
     def prepare(self, obj):
         raise NotImplementedError
 
-    def validate(self, obj):
+    def validate(self, obj, skipped_checks=()):
         prepared_parameters = self.prepare(obj)
-        methods = [getattr(self, method) for method in dir(self) if method.startswith('check_')]
 
-        for method in methods:
-            parameters = {k: prepared_parameters[k] for k in inspect.getfullargspec(method).args if not k == 'self'}
-            method(**parameters)
+        for check, is_static, arguments in self._get_plan(skipped_checks):
+            parameters = {argument: prepared_parameters[argument] for argument in arguments}
+            if is_static:
+                check(**parameters)
+            else:
+                check(self, **parameters)
 
         return True
+
+    def _get_plan(self, skipped_checks):
+        key = (self.__class__, skipped_checks)
+        plan = Validator._plans.get(key)
+        if plan is None:
+            plan = Validator._plans[key] = Validator._build_plan(self.__class__, skipped_checks)
+        return plan
+
+    @staticmethod
+    def _build_plan(validator_class, skipped_checks):
+        """
+        :return: tuple of (function, whether it is static, names of its arguments) tuples, in the order of names
+        """
+        plan = []
+        for name in dir(validator_class):
+            if not name.startswith('check_') or name in skipped_checks:
+                continue
+
+            is_static = isinstance(inspect.getattr_static(validator_class, name), staticmethod)
+            check = getattr(validator_class, name)
+            arguments = tuple(argument for argument in inspect.getfullargspec(check).args if argument != 'self')
+            plan.append((check, is_static, arguments))
+
+        return tuple(plan)
+
+
+class TypeDispatcher:
+    """
+    Maps types to the names of the methods handling them, a type is handled by the method
+    registered for its closest base class. Resolved types are cached.
+
+    Methods are looked up by name, so subclasses of the owner can override them.
+    """
+
+    def __init__(self, handlers):
+        """
+        :param handlers: dict of type -> method name
+        """
+        self._handlers = dict(handlers)
+
+    def __call__(self, owner, obj, *args):
+        """
+        Invokes the method of the owner handling the type of `obj` with `obj` and `args`
+        :raise NotImplementedError: if there is no method for the type
+        """
+        return getattr(owner, self._resolve(obj.__class__))(obj, *args)
+
+    def _resolve(self, obj_type):
+        handler = self._handlers.get(obj_type)
+        if handler is None:
+            handler = next((self._handlers[base] for base in obj_type.__mro__ if base in self._handlers), None)
+            if handler is None:
+                raise NotImplementedError(f'Could not find a handler for {obj_type.__name__}')
+            self._handlers[obj_type] = handler
+
+        return handler
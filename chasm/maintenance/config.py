@@ -41,9 +41,16 @@ class Config:
                 'datadir': _canonize_path(parser.get('DEFAULT', 'data_dir')),
                 'node': parser.get('CLI', 'node'),
                 'rpc_port': parser.getint('RPC', 'port'),
+                'rpc_legacy_json': parser.getboolean('RPC', 'legacy_json'),
+                'rpc_server': parser.get('RPC', 'server'),
+                'rpc_max_concurrency': parser.getint('RPC', 'max_concurrency'),
+                'rpc_executor_workers': parser.getint('RPC', 'executor_workers'),
                 'xpeer_pending_txs': parser.getint('XPEER', 'pending_txs'),
+                'xpeer_block_cache_size': parser.getint('XPEER', 'block_cache_size'),
+                'xpeer_verifier_workers': parser.getint('XPEER', 'verifier_workers'),
                 'xpeer_miner_address': bytes.fromhex(parser.get('XPEER', 'miner_address')),
-                'xpeer_miner_threads': parser.getint('XPEER', 'miner_threads')}
+                'xpeer_miner_threads': parser.getint('XPEER', 'miner_threads'),
+                'xpeer_miner_rebuild_fee_threshold': parser.getint('XPEER', 'miner_rebuild_fee_threshold')}
 
     def get(self, param):
         return self._configs[param]
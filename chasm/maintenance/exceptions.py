@@ -66,6 +66,17 @@ class UseXpeerFeeOutputAsInputException(TransactionValidationException):
         super().__init__(tx_hash, f"transaction use XpeerFeeOutput as input")
 
 
+class MempoolConflictError(TransactionValidationException):
+    def __init__(self, tx_hash, input_tx_hash, input_output_no, spender_hash=None):
+        spender = f"pending transaction: {spender_hash.hex()}" if spender_hash is not None else "a block"
+        super().__init__(tx_hash, f"input ({input_tx_hash.hex()}, {input_output_no}) already spent by {spender}")
+
+
+class DuplicatedPendingTxError(TransactionValidationException):
+    def __init__(self, tx_hash):
+        super().__init__(tx_hash, "transaction is already pending")
+
+
 class TxOverwriteError(Exception):
     def __init__(self, tx_hash):
         super().__init__(f"Tried to overwrite transaction with hash: {tx_hash}")
@@ -122,6 +133,16 @@ class BlockSizeError(BlockValidationError):
         super().__init__(f'Block size {actual_size} (max size={MAX_BLOCK_SIZE})')
 
 
+class BlockMintingError(BlockValidationError):
+    def __init__(self, message):
+        super().__init__(f'Invalid minting transaction: {message}')
+
+
+class BlockUnlockError(BlockValidationError):
+    def __init__(self, tx_hash: bytes, exchange: bytes):
+        super().__init__(f'Transaction {tx_hash.hex()} unlocks deposits of unmatched exchange {exchange.hex()}')
+
+
 class NegativeOutput(TransactionValidationException):
     def __init__(self, tx_hash, output_no):
         super().__init__(tx_hash, f"Try to send negative output, output_no: {output_no}")
@@ -0,0 +1,232 @@
+"""Asynchronous RPC Server"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread, Event
+
+from jsonrpc import Dispatcher, JSONRPCResponseManager
+
+from chasm.maintenance.config import Config
+from chasm.maintenance.logger import Logger
+from chasm.serialization.json_serializer import dumps
+from chasm.services_manager import Service
+from chasm.state.state import State
+from .node import RPCServer
+
+MAX_HEAD_SIZE = 2 ** 16  # request line and headers, in bytes
+MAX_BODY_SIZE = 2 ** 22
+PIPELINE_DEPTH = 16  # requests of a connection handled ahead of their responses
+KEEP_ALIVE_TIMEOUT = 30  # seconds a connection may stay idle
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 413: 'Payload Too Large', 500: 'Internal Server Error',
+            501: 'Not Implemented'}
+
+
+class _BadRequest(Exception):
+    def __init__(self, status):
+        super().__init__(_REASONS[status])
+        self.status = status
+
+
+class AsyncRPCServerService(Service):
+    """
+    JSON-RPC server running on an asyncio event loop in a thread of its own.
+
+    Connections are kept alive and requests may be pipelined: up to `PIPELINE_DEPTH` requests
+    of a connection are handled while their responses are written in order. At most `max_concurrency`
+    requests are handled at once, a connection with all its requests waiting is not read any further,
+    so its client is slowed down by TCP flow control. Methods read the state, so they run
+    in a pool of `executor_workers` threads instead of the event loop.
+    """
+
+    def __init__(self, state: State, config: Config):
+        self._prototype = RPCServer(state, legacy_json=config.get('rpc_legacy_json'))
+        self._dispatcher = Dispatcher()
+        self._logger = Logger('chasm.rpc.server')
+
+        self._port = config.get('rpc_port')
+        self._max_concurrency = config.get('rpc_max_concurrency')
+        self._executor = ThreadPoolExecutor(config.get('rpc_executor_workers'), thread_name_prefix='rpc')
+
+        self._loop: asyncio.AbstractEventLoop = None
+        self._server: asyncio.AbstractServer = None
+        self._server_thread: Thread = None
+        self._semaphore: asyncio.Semaphore = None
+        self._stopped: asyncio.Event = None
+        self._connections = set()
+
+    def start(self, stop_condition):
+        self._dispatcher.build_method_map(self._prototype)
+
+        started = Event()
+        self._server_thread = Thread(target=self._run, args=(started,))
+        self._server_thread.start()
+        started.wait()
+
+        return self._server is not None
+
+    def is_running(self):
+        return self._server_thread.is_alive()
+
+    def stop(self):
+        if self._server_thread.is_alive():
+            self._loop.call_soon_threadsafe(self._stopped.set)
+        self._server_thread.join()
+        self._executor.shutdown()
+
+    def _run(self, started):
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._loop.run_until_complete(self._serve(started))
+        finally:
+            self._loop.close()
+
+    async def _serve(self, started):
+        self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        self._stopped = asyncio.Event()
+
+        try:
+            self._server = await asyncio.start_server(self._handle_connection, host='localhost', port=self._port,
+                                                      limit=MAX_HEAD_SIZE)
+        except OSError:
+            self._logger.exception('Cannot start the server')
+            return
+        finally:
+            started.set()
+
+        await self._stopped.wait()
+
+        self._server.close()
+        for connection in list(self._connections):
+            connection.cancel()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+        await self._server.wait_closed()
+
+    async def _handle_connection(self, reader, writer):
+        connection = asyncio.current_task()
+        self._connections.add(connection)
+
+        responses = asyncio.Queue(PIPELINE_DEPTH)
+        writing = asyncio.ensure_future(self._write_responses(responses, writer))
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), KEEP_ALIVE_TIMEOUT)
+                except _BadRequest as error:
+                    await responses.put((self._completed(error.status, b''), False))
+                    break
+                except (asyncio.TimeoutError, ConnectionError):
+                    break
+
+                if request is None:
+                    break
+                body, keep_alive = request
+                await responses.put((asyncio.ensure_future(self._handle(body)), keep_alive))
+
+            await responses.put(None)
+            await writing
+        finally:
+            writing.cancel()
+            writer.close()
+            self._connections.discard(connection)
+
+    async def _read_request(self, reader):
+        """
+        :raise _BadRequest: if the request is malformed or not supported
+        :return: (body, whether to keep the connection alive) tuple, None if the client closed the connection
+        """
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except asyncio.IncompleteReadError as error:
+            if error.partial.strip():
+                raise _BadRequest(400)
+            return None
+        except asyncio.LimitOverrunError:
+            raise _BadRequest(400)
+
+        lines = head.decode('latin-1').split('\r\n')
+        request_line = lines[0].split()
+        if len(request_line) != 3:
+            raise _BadRequest(400)
+        version = request_line[2]
+
+        headers = {}
+        for line in filter(None, lines[1:]):
+            name, separator, value = line.partition(':')
+            if not separator:
+                raise _BadRequest(400)
+            headers[name.strip().lower()] = value.strip()
+
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            raise _BadRequest(501)
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise _BadRequest(400)
+        if length < 0:
+            raise _BadRequest(400)
+        if length > MAX_BODY_SIZE:
+            raise _BadRequest(413)
+
+        try:
+            body = await reader.readexactly(length)
+        except asyncio.IncompleteReadError:
+            return None
+
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+        return body, keep_alive
+
+    async def _handle(self, body):
+        """
+        :return: (HTTP status, response body) tuple
+        """
+        self._logger.debug('Got a request.')
+
+        async with self._semaphore:
+            try:
+                return 200, await self._loop.run_in_executor(self._executor, self._handle_in_executor, body)
+            except Exception:  # pylint: disable=broad-except
+                self._logger.exception('Cannot handle a request')
+                return 500, b''
+
+    def _handle_in_executor(self, body):
+        response = JSONRPCResponseManager.handle(body, self._dispatcher)
+        return dumps(response.data).encode() if response is not None else b''
+
+    async def _write_responses(self, responses, writer):
+        """
+        Writes responses in the order of the requests, once the connection breaks the rest is only cancelled
+        """
+        broken = False
+        while True:
+            entry = await responses.get()
+            if entry is None:
+                return
+
+            response, keep_alive = entry
+            if broken:
+                response.cancel()
+                continue
+
+            status, body = await response
+            try:
+                writer.write(self._format_response(status, body, keep_alive))
+                await writer.drain()
+            except ConnectionError:
+                broken = True
+                writer.transport.abort()
+
+    def _completed(self, status, body):
+        future = self._loop.create_future()
+        future.set_result((status, body))
+        return future
+
+    @staticmethod
+    def _format_response(status, body, keep_alive):
+        head = f'HTTP/1.1 {status} {_REASONS[status]}\r\n' \
+               f'Content-Type: application/json\r\n' \
+               f'Content-Length: {len(body)}\r\n'
+        if not keep_alive:
+            head += 'Connection: close\r\n'
+        return head.encode() + b'\r\n' + body
@@ -330,8 +330,11 @@ def count_balance(address, node, port):
     :param port: node port
     :return: balance of each address (dict[address]=balance))
     """
-    utxos = get_utxos(address=address, node=node, port=port)
-    balance = sum(utxo["value"] for utxo in utxos)
+    try:
+        balance = fetch_balance(hex_to_address(address), node, port)
+    except RPCError:
+        raise RuntimeError("Cannot get balance of: {}".format(address))
+
     return balance
 
 
@@ -447,6 +450,24 @@ def fetch_utxos(address, host, port):
     return utxos
 
 
+def fetch_balance(address, host, port):
+    """
+    Get balance of given address
+
+    Calls remote method through json-rpc
+
+    :param address: owner of UTXOs
+    :param host: node hostname
+    :param port: node port
+    :return: sum of UTXOs values
+    """
+    payload = PAYLOAD_TAGS.copy()
+    payload[METHOD] = "get_balance"
+    payload[PARAMS] = [address.hex()]
+
+    return run(host=host, port=port, payload=payload)
+
+
 def fetch_dutxos(address, host, port):
     """
     Get DUTXOs of given address
@@ -460,7 +481,7 @@ def fetch_dutxos(address, host, port):
     """
     payload = PAYLOAD_TAGS.copy()
     payload[METHOD] = "get_dutxos"
-    payload[PARAMS] = [address]
+    payload[PARAMS] = [address.hex()]
 
     dutxos = run(host=host, port=port, payload=payload)
 
@@ -10,7 +10,7 @@ from werkzeug.wrappers import Request, Response
 
 from chasm.maintenance.config import Config
 from chasm.maintenance.logger import Logger
-from chasm.serialization.json_serializer import JSONSerializer
+from chasm.serialization.json_serializer import JSONSerializer, dumps
 from chasm.serialization.rlp_serializer import RLPSerializer
 from chasm.services_manager import Service
 from chasm.state.state import State
@@ -22,28 +22,43 @@ rlp_serializer = RLPSerializer()
 
 class RPCServer:
 
-    def __init__(self, state):
+    def __init__(self, state, legacy_json=False):
+        """
+        :param legacy_json: return transactions as JSON strings nested in the results
+        instead of JSON objects, for clients which expect the former format
+        """
         self._state = state
+        self._legacy_json = legacy_json
         self._logger = Logger('chasm.rpc.handler')
 
+    def _serialize(self, obj):
+        """
+        Serialize transaction(s) for a result
+        :param obj: transaction or list of them
+        :return: JSON object(s), or JSON string(s) in the legacy format
+        """
+        if self._legacy_json:
+            if isinstance(obj, (list, tuple)):
+                return [json_serializer.encode(o) for o in obj]
+            return json_serializer.encode(obj)
+        return json_serializer.to_plain(obj)
+
     @staticmethod
-    def _filter_txos(txos, address):
+    def _format_txos(txos):
         """
-        Filter both DUTXOs and UTXOs
-        and create list of readable TXOs dict
-        :param txos: dictionary of outputs of outputs
-        :param address: required address(bytes)
+        Create list of readable TXOs dict
+        from both DUTXOs and UTXOs
+        :param txos: dictionary of outputs
         :return: list of TXOs dict
         """
 
         result = []
         for (tx, output_no), txo in txos.items():
-            if hasattr(txo, 'receiver') and txo.receiver == address:
-                result.append({
-                    "tx": tx.hex(),
-                    "output_no": output_no,
-                    "value": txo.value
-                })
+            result.append({
+                "tx": tx.hex(),
+                "output_no": output_no,
+                "value": txo.value
+            })
 
         return result
 
@@ -53,9 +68,18 @@ class RPCServer:
         :param address: address(hex)
         :return: list of UTXOs dict
         """
-        self._logger.info("Getting UTXOs of: %s", address)
-        utxos = self._state.get_utxos()
-        return self._filter_txos(utxos, bytes.fromhex(address))
+        self._logger.debug("Getting UTXOs of: %s", address)
+        utxos = self._state.get_address_utxos(bytes.fromhex(address))
+        return self._format_txos(utxos)
+
+    def get_balance(self, address):
+        """
+        Return balance of given address
+        :param address: address(hex)
+        :return: sum of UTXOs values
+        """
+        self._logger.debug("Getting balance of: %s", address)
+        return self._state.get_balance(bytes.fromhex(address))
 
     def get_exchange(self, exchange):
         """
@@ -76,7 +100,7 @@ class RPCServer:
         :param exchange: exchange
         :return: list of UTXOs dict
         """
-        self._logger.info("Getting UTXOs of exchange: %s", exchange)
+        self._logger.debug("Getting UTXOs of exchange: %s", exchange)
         utxos = self._state.get_utxos()
         try:
             offer, match = self.get_exchange(exchange)
@@ -105,27 +129,25 @@ class RPCServer:
         :param address: address(hex)
         :return: list of DUTXOs dict
         """
-        self._logger.info("Getting DUTXOs of: %s", address)
-        dutxos = self._state.get_dutxos()
-        return self._filter_txos(dutxos, bytes.fromhex(address))
+        self._logger.debug("Getting DUTXOs of: %s", address)
+        dutxos = self._state.get_address_dutxos(bytes.fromhex(address))
+        return self._format_txos(dutxos)
 
     def get_current_offers(self, token_in, token_out):
         """
         Return all current offers
         :param token_in: Filter on token being sold
         :param token_out: Filter on expected payment token
-        :return: list of json serialized offers
+        :return: list of serialized offers
         """
-        self._logger.info("Getting current offers")
+        self._logger.debug("Getting current offers")
         offers = self._state.get_active_offers()
         offers = list(filter(lambda o:
                              token_in in (ALL, o.token_in) and
                              token_out in (ALL, o.token_out),
                              offers.values()))
 
-        serialized_offers = list(map(lambda offer: json_serializer.encode(offer),
-                                     offers))
-        return serialized_offers
+        return self._serialize(offers)
 
     def get_tx(self, tx_hash):
         """
@@ -134,21 +156,52 @@ class RPCServer:
         :return: Transaction / None if tx does not exist
         """
         try:
-            transaction = self._state.get_transaction(bytes.fromhex(tx_hash))
+            transaction = self._state.get_transaction(bytes.fromhex(tx_hash), lazy=True)
+        except (ValueError, KeyError):
+            self._logger.debug("Transaction not found, hex: %s", tx_hash)
+            return None
+        return self._serialize(transaction.transaction)
+
+    def get_pending_tx(self, tx_hash):
+        """
+        Get pending transaction
+        :param tx_hash: hash of the transaction
+        :return: SignedTransaction / None if tx is not pending
+        """
+        try:
+            transaction = self._state.get_pending_tx(bytes.fromhex(tx_hash))
         except (ValueError, KeyError):
-            self._logger.info("Transaction not found, hex: %s", tx_hash)
+            self._logger.debug("Pending transaction not found, hex: %s", tx_hash)
             return None
-        return json_serializer.encode(transaction.transaction)
+        return self._serialize(transaction)
+
+    def get_pending_spender(self, tx_hash, output_no):
+        """
+        Get pending transaction spending given output
+        :param tx_hash: hash of the transaction of the output
+        :param output_no: number of the output
+        :return: hash of the pending transaction / None if no pending transaction spends the output
+        """
+        spender = self._state.get_pending_spender(bytes.fromhex(tx_hash), output_no)
+        return spender.hex() if spender is not None else None
+
+    def get_pending_txs(self, address):
+        """
+        Return pending transactions with outputs received by given address
+        :param address: address(hex)
+        :return: list of serialized transactions
+        """
+        self._logger.debug("Getting pending transactions of: %s", address)
+        return self._serialize(self._state.get_address_pending_txs(bytes.fromhex(address)))
 
     def publish_transaction(self, signed_tx_json):
         """
         Add SignedTransaction to the blockchain
-        :param signed_tx_json: serialized SignedTransaction
+        :param signed_tx_json: serialized SignedTransaction(JSON string or object)
         :return: True if transaction is added
         """
 
-        self._logger.info("Publishing tx: %s",
-                          json_serializer.encode(signed_tx_json))
+        self._logger.debug("Publishing tx: %s", signed_tx_json)
 
         result = True
         try:
@@ -168,11 +221,11 @@ class RPCServer:
         Get pairs of offer and its match filtered by addresses
         :param offer_addr: address to filter offers
         :param match_addr: address to filter matches
-        :return: list of tuples (OfferTransaction, MatchTransaction)
-        transactions are serialized into json
+        :return: list of pairs [OfferTransaction, MatchTransaction]
+        transactions are serialized
         """
-        self._logger.info("Getting matches, offer_addr: %s, match_addr: %s",
-                          offer_addr, match_addr)
+        self._logger.debug("Getting matches, offer_addr: %s, match_addr: %s",
+                           offer_addr, match_addr)
 
         matches = self._state.get_matched_offers()
 
@@ -183,8 +236,7 @@ class RPCServer:
                 match = match_pair[1]
                 if offer_addr in (offer.address_out.hex(), ALL_ADDRESSES) and \
                         match_addr in (match.address_in.hex(), ALL_ADDRESSES):
-                    result.append((json_serializer.encode(offer),
-                                   json_serializer.encode(match)))
+                    result.append(self._serialize((offer, match)))
             except (ValueError, IndexError):
                 self._logger.error("Got hash of unknown transaction")
 
@@ -201,7 +253,7 @@ class RPCServer:
 
 class RPCServerService(Service):
     def __init__(self, state: State, config: Config):
-        self._prototype = RPCServer(state)
+        self._prototype = RPCServer(state, legacy_json=config.get('rpc_legacy_json'))
         self._dispatcher = Dispatcher()
         self._logger = Logger('chasm.rpc.server')
 
@@ -216,11 +268,11 @@ class RPCServerService(Service):
         :return: None
         """
 
-        self._logger.info('Got a request.')
+        self._logger.debug('Got a request.')
 
         response = JSONRPCResponseManager.handle(
             request.data, self._dispatcher)
-        return Response(response.json, mimetype='application/json')
+        return Response(dumps(response.data), mimetype='application/json')
 
     def start(self, stop_condition):
         self._dispatcher.build_method_map(self._prototype)
@@ -1,46 +1,110 @@
-from json import JSONEncoder, JSONDecoder
+import json
 
 from rlp import sedes
 from rlp.sedes import binary
 
 from chasm.serialization import countable_list, \
     countable_list_of_binaries, type_registry
+from chasm.serialization.rlp_serializer import RLPView
 from chasm.serialization.serializable import Serializable
 from chasm.serialization.serializer import Serializer
 
+try:
+    import orjson
 
-class JSONSerializer(JSONEncoder, Serializer):
-    def default(self, obj):
-        if isinstance(obj, Serializable):
-            return self._do_encode(obj.serialize())
-        elif isinstance(obj, bytes):
-            return obj.hex()
+    def _fast_dumps(obj):
+        return orjson.dumps(obj).decode()
+except ImportError:
+    try:
+        import ujson
+
+        _fast_dumps = ujson.dumps
+    except ImportError:
+        _fast_dumps = json.dumps
+
+
+def dumps(obj) -> str:
+    """
+    Dumps plain data (dicts, lists, strings, numbers) to JSON with orjson or ujson if installed,
+    values they cannot handle (e.g. integers wider than 64 bits) fall back to the standard library encoder
+    """
+    try:
+        return _fast_dumps(obj)
+    except (TypeError, OverflowError):
+        return json.dumps(obj)
+
+
+class JSONSerializer(Serializer):
+    """
+    Serializes objects as JSON objects: `{"type": <class name>, <field>: <value>, ...}`, bytes as hex strings.
+
+    :func: `to_plain` converts objects to plain dicts in a single pass over their fields,
+    so they can be embedded in other JSON documents (e.g. RPC results) without encoding them twice.
+    """
+
+    _decoders = {}
+
+    def encode(self, obj) -> str:
+        return dumps(self.to_plain(obj))
 
     def decode(self, encoded) -> object:
-        return JSONDecoder(object_hook=JSONSerializer._do_decode).decode(encoded)
-
-    def _do_encode(self, serialized):
-        obj_class, *fields = serialized
-        d = {'type': obj_class.__name__}
-        for ((field_name, field_type), value) in zip(obj_class.fields(), fields):
-            if field_type == sedes.raw:
-                value = self._do_encode(value)
-            elif field_type == countable_list:
-                value = [self._do_encode(v) for v in value]
-            elif field_type == binary:
-                value = value.hex()
-            d[field_name] = value
-        return d
+        """
+        :param encoded: JSON string or its parsed form, e.g. a structured RPC result
+        """
+        if isinstance(encoded, (str, bytes)):
+            encoded = json.loads(encoded)
+        return self.from_plain(encoded)
 
-    @staticmethod
-    def _do_decode(json_obj):
-        obj_type_name = json_obj.pop('type')
-        obj_type = next(type_name for (type_name, _) in type_registry if type_name.__name__ == obj_type_name)
+    def to_plain(self, obj):
+        """
+        :return: JSON-compatible form of the object, serializable objects become dicts
+        """
+        if isinstance(obj, bytes):
+            return obj.hex()
+        if isinstance(obj, (list, tuple)):
+            return [self.to_plain(v) for v in obj]
+        if isinstance(obj, Serializable):
+            return self._fields_to_plain(obj, obj.__class__)
+        if isinstance(obj, RLPView):
+            return self._fields_to_plain(obj, obj.obj_type)
+        if isinstance(obj, dict):
+            return {key: self.to_plain(value) for key, value in obj.items()}
+        return obj
+
+    def from_plain(self, plain) -> object:
+        """
+        Reverse of :func: `to_plain` for serializable objects
 
-        for (field_name, field_type) in obj_type.fields():
+        :raise KeyError: if the type or a field is unknown
+        """
+        type_name = plain['type']
+        obj_type, fields = JSONSerializer._decoders.get(type_name) or JSONSerializer._build_decoders()[type_name]
+
+        params = {}
+        for field, field_type in fields:
+            value = plain[field]
             if field_type == binary:
-                json_obj[field_name] = bytes.fromhex(json_obj[field_name])
+                value = bytes.fromhex(value)
+            elif field_type == sedes.raw:
+                value = self.from_plain(value)
+            elif field_type == countable_list:
+                value = [self.from_plain(v) for v in value]
             elif field_type == countable_list_of_binaries:
-                json_obj[field_name] = [bytes.fromhex(v) for v in json_obj[field_name]]
+                value = [bytes.fromhex(v) for v in value]
+            params[field] = value
+
+        return obj_type(**params)
 
-        return obj_type(**json_obj)
+    def _fields_to_plain(self, obj, obj_type):
+        plain = {'type': obj_type.__name__}
+        for field, _ in obj_type.fields():
+            plain[field] = self.to_plain(getattr(obj, field))
+        return plain
+
+    @staticmethod
+    def _build_decoders():
+        """
+        :return: dict of type name -> (type, fields) tuple
+        """
+        JSONSerializer._decoders = {obj_type.__name__: (obj_type, obj_type.fields()) for obj_type, _ in type_registry}
+        return JSONSerializer._decoders
@@ -1,50 +1,281 @@
 import rlp
 from rlp import sedes
+from rlp.codec import length_prefix
 from rlp.sedes import big_endian_int
 
+from chasm import consensus
+from chasm.consensus.primitives.block import Block
+from chasm.consensus.primitives.transaction import SignedTransaction
 from chasm.serialization import type_registry, countable_list
 from chasm.serialization.serializer import Serializer
 
+_ENVELOPE = sedes.List([big_endian_int, sedes.raw])
+
+# kinds of fields
+_PLAIN, _NESTED, _NESTED_LIST, _LIST = range(4)
+
+
+class _Codec:
+    """
+    Encoding scheme of a registered type, compiled once from its :func: `fields`
+    """
+    __slots__ = ('obj_type', 'type_id', 'encoded_type_id', 'fields', 'field_indices', 'sedes')
+
+    def __init__(self, obj_type, type_id):
+        self.obj_type = obj_type
+        self.type_id = type_id
+        self.encoded_type_id = rlp.encode(type_id)
+        self.fields = tuple((field, _Codec._kind(field_type), field_type) for field, field_type in obj_type.fields())
+        self.field_indices = {field: i for i, (field, _) in enumerate(obj_type.fields())}
+        self.sedes = sedes.List([field_type for _, field_type in obj_type.fields()])
+
+    @staticmethod
+    def _kind(field_type):
+        if field_type == sedes.raw:
+            return _NESTED
+        if field_type == countable_list:
+            return _NESTED_LIST
+        if isinstance(field_type, sedes.CountableList):
+            return _LIST
+        return _PLAIN
+
 
 class RLPSerializer(Serializer):
+    _codecs_by_type = {}
+    _codecs_by_id = {}
+
     def encode(self, obj) -> bytes:
-        return self._do_encode(obj.serialize())
+        encoded = obj._encoded
+        if encoded is None:
+            encoded = self._encode_fields(obj)
+            if obj._memoize_encoding:
+                obj._encoded = encoded
 
-    def decode(self, encoded: bytes) -> object:
-        [obj_type_id, serialized] = rlp.decode(encoded, sedes.List([big_endian_int, sedes.raw]))
-        obj_type = next(type_name for (type_name, type_id) in type_registry if type_id == obj_type_id)
+        return encoded
 
-        sedes_list = []
-        for (_field, field_type) in obj_type.fields():
-            sedes_list.append(field_type)
+    def decode(self, encoded: bytes) -> object:
+        [obj_type_id, serialized] = rlp.decode(encoded, _ENVELOPE)
+        codec = RLPSerializer._get_codec(obj_type_id)
 
-        decoded = rlp.decode(serialized, sedes.List(sedes_list))
+        items = rlp.decode(serialized)
+        if not isinstance(items, list) or len(items) != len(codec.fields):
+            raise rlp.DeserializationError(f'{codec.obj_type.__name__} has {len(codec.fields)} fields', serialized)
 
-        values = []
-        for ((_field, field_type), value) in zip(obj_type.fields(), decoded):
-            if field_type == sedes.raw:
+        params = {}
+        for (field, kind, field_type), value in zip(codec.fields, items):
+            if kind == _NESTED:
                 value = self.decode(value)
-            elif field_type == countable_list:
+            elif kind == _NESTED_LIST:
                 value = [self.decode(v) for v in value]
-            elif isinstance(field_type, sedes.CountableList):
-                value = list(value)
-            values.append(value)
+            else:
+                value = field_type.deserialize(value)
+                if kind == _LIST:
+                    value = list(value)
+            params[field] = value
+
+        obj_type = codec.obj_type
+        obj = obj_type.__new__(obj_type)
+        if obj._memoize_encoding:
+            obj._encoded = encoded
+        obj.__init__(**params)
+
+        return obj
+
+    def _encode_fields(self, obj):
+        obj_class = obj.__class__
+        codec = RLPSerializer._codecs_by_type.get(obj_class) or RLPSerializer._compile_codecs()[0][obj_class]
+
+        items = []
+        for field, kind, field_type in codec.fields:
+            value = getattr(obj, field)
+            if kind == _NESTED:
+                items.append(_encode_string(self.encode(value)))
+            elif kind == _NESTED_LIST:
+                items.append(_encode_list(b''.join(_encode_string(self.encode(v)) for v in value)))
+            elif kind == _LIST:
+                items.append(rlp.encode(value, field_type))
+            else:
+                items.append(_encode_string(field_type.serialize(value)))
+
+        return _encode_list(codec.encoded_type_id + _encode_string(_encode_list(b''.join(items))))
+
+    def decode_lazy(self, encoded) -> 'RLPView':
+        """
+        Decodes an object lazily, see :class: `RLPView`
+        """
+        return RLPView(encoded)
+
+    @staticmethod
+    def _get_codec(type_id):
+        return RLPSerializer._codecs_by_id.get(type_id) or RLPSerializer._compile_codecs()[1][type_id]
+
+    @staticmethod
+    def _compile_codecs():
+        """
+        Compiles codecs of all the registered types, invoked when a type is not known yet
+
+        :return: (dict of type -> codec, dict of type id -> codec) tuple
+        """
+        codecs = [_Codec(obj_type, type_id) for obj_type, type_id in type_registry]
+
+        RLPSerializer._codecs_by_type = {codec.obj_type: codec for codec in codecs}
+        RLPSerializer._codecs_by_id = {codec.type_id: codec for codec in codecs}
+
+        return RLPSerializer._codecs_by_type, RLPSerializer._codecs_by_id
+
+
+class RLPView:
+    """
+    Read-only view of an object encoded with :class: `RLPSerializer`, decoded lazily.
+
+    Only the offsets of the top-level fields are read up front. A field is decoded on its first access
+    and cached, nested objects are views over slices of the same buffer, so nothing is copied until then.
+    Hashes of transactions are computed straight from the encoded bytes.
+    """
+    __slots__ = ('_encoded', '_payload', '_codec', '_items', '_cache')
+
+    def __init__(self, encoded):
+        self._encoded = encoded if isinstance(encoded, memoryview) else memoryview(encoded)
+        self._cache = {}
+
+        [(_, _, type_start, type_end), (_, _, start, end)] = _list_items(self._encoded, 0)
+        self._codec = RLPSerializer._get_codec(big_endian_int.deserialize(bytes(self._encoded[type_start:type_end])))
+
+        self._payload = self._encoded[start:end]
+        self._items = _list_items(self._payload, 0)
+        if len(self._items) != len(self._codec.fields):
+            raise rlp.DeserializationError(f'{self._codec.obj_type.__name__} has {len(self._codec.fields)} fields',
+                                           bytes(self._encoded))
+
+    @property
+    def obj_type(self):
+        return self._codec.obj_type
+
+    @property
+    def encoded(self) -> bytes:
+        return bytes(self._encoded)
+
+    def __getattr__(self, name):
+        try:
+            return self._cache[name]
+        except KeyError:
+            pass
+
+        try:
+            index = self._codec.field_indices[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+        value = self._cache[name] = self._decode_field(index)
+        return value
+
+    def hash(self):
+        """
+        :return: the same hash as the decoded object would return
+        """
+        if self.obj_type == SignedTransaction:
+            return self.transaction.hash()
+        if self.obj_type == Block:
+            return Block.Header(self.previous_block_hash, self.merkle_root, self.difficulty, self.nonce,
+                                self.timestamp).hash()
+        return consensus.HASH_FUNC(self._encoded).digest()
+
+    def materialize(self):
+        """
+        :return: fully decoded object
+        """
+        return RLPSerializer().decode(self.encoded)
+
+    def serialize(self):
+        """
+        Same as :func: `Serializable.serialize` of the decoded object
+        """
+        serialized = [self.obj_type]
+        for field, kind, _ in self._codec.fields:
+            value = getattr(self, field)
+            if kind == _NESTED:
+                value = value.serialize()
+            elif kind == _NESTED_LIST:
+                value = [v.serialize() for v in value]
+            serialized.append(value)
+
+        return serialized
+
+    def _decode_field(self, index):
+        _field, kind, field_type = self._codec.fields[index]
+        item_type, item_start, start, end = self._items[index]
+        payload = self._payload
+
+        if kind == _NESTED:
+            return RLPView(payload[start:end])
+        if kind == _NESTED_LIST:
+            return [RLPView(payload[s:e]) for _, _, s, e in _list_items(payload, item_start)]
+        if kind == _LIST:
+            return list(field_type.deserialize([bytes(payload[s:e]) for _, _, s, e in _list_items(payload, item_start)]))
+        if item_type != bytes:
+            raise rlp.DeserializationError(f'{_field} is not a string', bytes(self._encoded))
+        return field_type.deserialize(bytes(payload[start:end]))
+
+
+def _list_items(buffer, start):
+    """
+    Reads offsets of the items of the RLP list at the given position
+
+    :return: list of (item type, item start, payload start, payload end) tuples
+    """
+    item_type, position, end = _read_prefix(buffer, start)
+    if item_type != list:
+        raise rlp.DecodingError('RLP list expected', bytes(buffer))
+
+    items = []
+    while position < end:
+        item_start = position
+        item_type, payload_start, position = _read_prefix(buffer, position)
+        items.append((item_type, item_start, payload_start, position))
+
+    if position != end:
+        raise rlp.DecodingError('RLP list length does not match its items', bytes(buffer))
+
+    return items
+
+
+def _read_prefix(buffer, start):
+    """
+    Reads the prefix of the RLP item at the given position, works on memoryviews without copying them
+
+    :return: (item type, payload start, payload end) tuple
+    """
+    first = buffer[start]
+    if first < 0x80:
+        item_type, payload_start, length = bytes, start, 1
+    elif first < 0xb8:
+        item_type, payload_start, length = bytes, start + 1, first - 0x80
+    elif first < 0xc0:
+        payload_start = start + 1 + first - 0xb7
+        item_type, length = bytes, int.from_bytes(buffer[start + 1:payload_start], byteorder='big')
+    elif first < 0xf8:
+        item_type, payload_start, length = list, start + 1, first - 0xc0
+    else:
+        payload_start = start + 1 + first - 0xf7
+        item_type, length = list, int.from_bytes(buffer[start + 1:payload_start], byteorder='big')
 
-        params = {field: value for ((field, _), value) in zip(obj_type.fields(), values)}
+    if payload_start + length > len(buffer):
+        raise rlp.DecodingError('RLP item exceeds the buffer', bytes(buffer))
 
-        return obj_type(**params)
+    return item_type, payload_start, payload_start + length
 
-    def _do_encode(self, serialized):
-        obj_class, *serialized = serialized
 
-        values = []
-        for ((field_name, field_type), value) in zip(obj_class.fields(), serialized):
-            if field_type == sedes.raw:
-                value = self._do_encode(value)
-            elif field_type == countable_list:
-                value = [self._do_encode(v) for v in value]
-            values.append(value)
+def _encode_string(value: bytes):
+    length = len(value)
+    if length == 1 and value[0] < 0x80:
+        return value
+    if length < 56:
+        return bytes((0x80 + length,)) + value
+    return length_prefix(length, 0x80) + value
 
-        type_id = next(type_id for (type_name, type_id) in type_registry if type_name == obj_class)
 
-        return rlp.encode([type_id, rlp.encode(values)])
+def _encode_list(payload: bytes):
+    length = len(payload)
+    if length < 56:
+        return bytes((0xc0 + length,)) + payload
+    return length_prefix(length, 0xc0) + payload
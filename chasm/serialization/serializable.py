@@ -6,6 +6,14 @@ from chasm.serialization import countable_list
 
 
 class Serializable(ABC):
+    """
+    Object serialized as the list of its :func: `fields`.
+
+    Classes with `_memoize_encoding` set are immutable once encoded - serializers cache
+    their encoding in `_encoded` and the fields must not be modified afterwards.
+    """
+    _memoize_encoding = False
+    _encoded = None
 
     @classmethod
     def fields(cls) -> [(str, object)]:
@@ -25,4 +33,5 @@ class Serializable(ABC):
         return serialized
 
     def __eq__(self, other):
-        return self.__class__ == other.__class__ and self.__dict__ == other.__dict__
+        return self.__class__ == other.__class__ and \
+               all(getattr(self, field) == getattr(other, field) for field, _ in self.fields())
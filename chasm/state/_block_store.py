@@ -0,0 +1,120 @@
+from collections import OrderedDict
+from threading import Lock
+
+from chasm.consensus import Block
+from chasm.serialization.rlp_serializer import RLPSerializer, RLPView
+
+DEFAULT_BLOCK_CACHE_SIZE = 2 ** 26  # 64MB
+
+
+class BlockStore:
+    """
+    Reads blocks from the database on demand, heights are resolved with the height-ordered index of the database.
+
+    Decoded blocks are kept in a LRU cache limited by `cache_size` - the sum of sizes
+    of the encoded blocks it holds, in bytes. The cache may be used by many threads.
+    """
+
+    _rlp_serializer = RLPSerializer()
+
+    def __init__(self, db, cache_size=DEFAULT_BLOCK_CACHE_SIZE):
+        self._db = db
+        self._cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cached_bytes = 0
+        self._cache_lock = Lock()
+
+    def put(self, block: Block, height: int, block_hash: bytes):
+        """
+        Stores a block, it gets written when the current db transaction is executed
+        """
+        encoded = self._db.put_block(block, height)
+        self._cache_block(block_hash, block, len(encoded))
+
+    def get(self, block_hash) -> Block:
+        """
+        :raise KeyError: if there is no block with the given hash
+        """
+        block = self._get_cached(block_hash)
+        if block is not None:
+            return block
+
+        encoded = self._get_encoded(block_hash)
+        block = self._rlp_serializer.decode(encoded)
+        self._cache_block(block_hash, block, len(encoded))
+
+        return block
+
+    def get_by_height(self, height) -> Block:
+        """
+        :raise KeyError: if there is no block at the given height
+        """
+        return self.get(self.get_hash(height))
+
+    def get_hash(self, height) -> bytes:
+        """
+        :raise KeyError: if there is no block at the given height
+        """
+        block_hash = self._db.get_block_hash(height)
+        if block_hash is None:
+            raise KeyError(height)
+        return block_hash
+
+    def iter_range(self, start_height=0, end_height=None):
+        """
+        Streams blocks from the given range of heights in height order,
+        cached blocks are not decoded again and the streamed ones are not cached
+
+        :param end_height: end of the range (exclusive), the range is open if None
+        :return: generator of (height, block) tuples
+        """
+        for height, block_hash in self._db.iter_block_hashes(start_height, end_height):
+            block = self._get_cached(block_hash)
+            if block is not None:
+                yield height, block
+            else:
+                _, encoded = self._db.get_block(block_hash)
+                yield height, self._rlp_serializer.decode(encoded)
+
+    def get_transaction(self, block_hash, index, lazy=False):
+        """
+        Reads a single transaction, if the block is not cached only the transaction gets decoded
+
+        :param lazy: return a lazily decoded :class: `RLPView` instead of decoding the transaction
+        """
+        block = self._get_cached(block_hash)
+        if block is not None:
+            return block.transactions[index]
+
+        tx = RLPView(self._get_encoded(block_hash)).transactions[index]
+        return tx if lazy else tx.materialize()
+
+    def __contains__(self, block_hash):
+        return block_hash in self._cache or self._db.has_block(block_hash)
+
+    def _get_cached(self, block_hash):
+        with self._cache_lock:
+            cached = self._cache.get(block_hash)
+            if cached is None:
+                return None
+            self._cache.move_to_end(block_hash)
+            return cached[0]
+
+    def _get_encoded(self, block_hash):
+        _height, encoded = self._db.get_block(block_hash)
+        return encoded
+
+    def _cache_block(self, block_hash, block, size):
+        if size > self._cache_size:
+            return
+
+        with self._cache_lock:
+            if block_hash in self._cache:
+                self._cached_bytes -= self._cache.pop(block_hash)[1]
+
+            self._cache[block_hash] = (block, size)
+            self._cached_bytes += size
+
+            while self._cached_bytes > self._cache_size:
+                _, (_, evicted_size) = self._cache.popitem(last=False)
+                self._cached_bytes -= evicted_size
@@ -1,3 +1,4 @@
+import threading
 from enum import Enum
 from typing import Union
 
@@ -14,6 +15,7 @@ from chasm.serialization.serializer import Serializer
 class DB:
     class _KeyPrefixes(Enum):
         BLOCK = b'b'
+        BLOCK_HEIGHT = b'n'
 
         TRANSACTION = b't'
         PENDING_TRANSACTION = b'p'
@@ -23,17 +25,31 @@ class DB:
 
         OFFER_ACTIVE = b'oa'
         OFFER_MATCHED = b'om'
+        OFFER_TIMEOUT = b'ot'
+
+        ADDRESS_UTXO = b'au'
+        ADDRESS_DUTXO = b'ad'
+        ADDRESS_BALANCE = b'ab'
 
     _rlp_serializer = RLPSerializer()
+    _block_sedes = sedes.List([sedes.big_endian_int, sedes.raw])
 
     def __init__(self, db_dir, create_if_missing=False):
         self.db = plyvel.DB(db_dir, create_if_missing=create_if_missing)
 
-        self.write_obj = self.db
+        self._local = threading.local()  # transactions are per thread
+
+    @property
+    def write_obj(self):
+        return getattr(self._local, 'write_obj', self.db)
+
+    @write_obj.setter
+    def write_obj(self, write_obj):
+        self._local.write_obj = write_obj
 
     def start_transaction(self):
         """
-        Starts a transaction, writes and deletions from now on will not be executed
+        Starts a transaction of the current thread, its writes and deletions from now on will not be executed
         until :func: `execute_transaction` method is invoked.
         """
 
@@ -87,25 +103,127 @@ class DB:
 
     def put_block(self, block: Block, height: int):
         """
-        Inserts a block to db.
+        Inserts a block to db, it is keyed by its hash and indexed by its height.
 
         NOTE: does no validation
         :param block: Block object
         :param height: block height
+        :return: encoded block
+        """
+        block_hash = block.hash()
+        encoded_block = DB._rlp_serializer.encode(block)
+        encoded = rlp.encode([height, encoded_block], sedes=DB._block_sedes)
+        self.put(block_hash, encoded, prefix=DB._KeyPrefixes.BLOCK)
+        self.put_block_hash(height, block_hash)
+        return encoded_block
+
+    def put_block_hash(self, height, block_hash):
+        self.put(DB._height_key(height), block_hash, prefix=DB._KeyPrefixes.BLOCK_HEIGHT)
+
+    def get_block_hash(self, height):
+        """
+        :return: hash of the block at the given height or None if there is no such a block
         """
-        encoded = rlp.encode([height, DB._rlp_serializer.encode(block)],
-                             sedes=sedes.List([sedes.big_endian_int, sedes.raw]))
-        self.put(block.hash(), encoded, prefix=DB._KeyPrefixes.BLOCK)
+        return self.get(DB._height_key(height), prefix=DB._KeyPrefixes.BLOCK_HEIGHT)
 
-    def get_blocks(self):
+    def get_block(self, block_hash):
         """
-        Reads db and returns blocks with its heights
+        Reads a single block without decoding it
 
-        :return: list of (height, block) tuples
+        :raise KeyError: if there is no such a block
+        :return: (height, encoded block) tuple
+        """
+        encoded = self.get(block_hash, prefix=DB._KeyPrefixes.BLOCK)
+        if encoded is None:
+            raise KeyError(block_hash)
+
+        height, encoded_block = rlp.decode(encoded, sedes=DB._block_sedes)
+        return height, encoded_block
+
+    def has_block(self, block_hash):
+        return self.get(block_hash, prefix=DB._KeyPrefixes.BLOCK) is not None
+
+    def get_block_heights(self):
+        """
+        Reads heights of all the blocks without decoding them, blocks come in hash order
+
+        :return: generator of (block_hash, height) tuples
         """
         blocks_db = self.db.prefixed_db(DB._KeyPrefixes.BLOCK.value)
-        enc = [rlp.decode(value, sedes=sedes.List([sedes.big_endian_int, sedes.raw])) for _, value in blocks_db]
-        return [(height, DB._rlp_serializer.decode(encoded)) for height, encoded in enc]
+        for block_hash, value in blocks_db:
+            height, _ = rlp.decode(value, sedes=DB._block_sedes)
+            yield block_hash, height
+
+    def iter_block_hashes(self, start_height=0, end_height=None):
+        """
+        Reads hashes of the blocks from the given range of heights in height order
+
+        :param start_height: first height of the range
+        :param end_height: end of the range (exclusive), the range is open if None
+        :return: generator of (height, block_hash) tuples
+        """
+        heights_db = self.db.prefixed_db(DB._KeyPrefixes.BLOCK_HEIGHT.value)
+        stop = DB._height_key(end_height) if end_height is not None else None
+        for key, block_hash in heights_db.iterator(start=DB._height_key(start_height), stop=stop):
+            yield DB._height_from_key(key), block_hash
+
+    def iter_encoded_blocks(self, start_height=0, end_height=None):
+        """
+        Reads blocks from the given range of heights in height order without decoding them
+
+        :param start_height: first height of the range
+        :param end_height: end of the range (exclusive), the range is open if None
+        :return: generator of (height, block_hash, encoded block) tuples
+        """
+        for height, block_hash in self.iter_block_hashes(start_height, end_height):
+            _, encoded_block = self.get_block(block_hash)
+            yield height, block_hash, encoded_block
+
+    def iter_blocks(self, start_height=0, end_height=None):
+        """
+        Reads blocks from the given range of heights in height order, one block is decoded at a time
+
+        :param start_height: first height of the range
+        :param end_height: end of the range (exclusive), the range is open if None
+        :return: generator of (height, block) tuples
+        """
+        for height, _, encoded_block in self.iter_encoded_blocks(start_height, end_height):
+            yield height, DB._rlp_serializer.decode(encoded_block)
+
+    @staticmethod
+    def _height_key(height):
+        # NOTE: big-endian keeps LevelDB's lexicographic order equal to the height order
+        return height.to_bytes(8, byteorder='big')
+
+    @staticmethod
+    def _height_from_key(key):
+        return int.from_bytes(key, byteorder='big')
+
+    @staticmethod
+    def _sequence_key(sequence):
+        # NOTE: big-endian keeps LevelDB's lexicographic order equal to the order of the numbers
+        return sequence.to_bytes(8, byteorder='big')
+
+    @staticmethod
+    def _offer_timeout_key(timeout, offer_hash=b''):
+        # NOTE: timeouts beyond 8 bytes are capped, such offers never time out in practice
+        return min(timeout, 2 ** 64 - 1).to_bytes(8, byteorder='big') + offer_hash
+
+    def put_tx_index(self, tx_hash, block_hash, index):
+        self.put(tx_hash, rlp.encode([block_hash, index]), prefix=DB._KeyPrefixes.TRANSACTION)
+
+    def get_tx_index(self, tx_hash):
+        """
+        Finds a transaction in the chain
+
+        :return: (block_hash, index) tuple or None if the transaction is unknown
+        """
+        encoded = self.get(tx_hash, prefix=DB._KeyPrefixes.TRANSACTION)
+        if encoded is None:
+            return None
+
+        block_hash, index = rlp.decode(encoded, sedes.List([sedes.binary, sedes.big_endian_int]))
+        return block_hash, index
 
     def delete_utxo(self, tx_hash, index):
         key = rlp.encode([tx_hash, index])
@@ -138,32 +256,114 @@ class DB:
         key = rlp.encode([tx_hash, index])
         self.delete(key, prefix=DB._KeyPrefixes.DUTXO)
 
-    def delete_pending(self, index):
-        self.delete(Serializer.int_to_bytes(index), prefix=DB._KeyPrefixes.PENDING_TRANSACTION)
+    def put_address_utxo(self, address, tx_hash, index):
+        self.put(rlp.encode([address, tx_hash, index]), b'', prefix=DB._KeyPrefixes.ADDRESS_UTXO)
 
-    def put_pending_tx(self, index, tx, priority):
+    def delete_address_utxo(self, address, tx_hash, index):
+        self.delete(rlp.encode([address, tx_hash, index]), prefix=DB._KeyPrefixes.ADDRESS_UTXO)
+
+    def get_address_utxos(self):
+        """
+        Reads address index of utxos
+
+        :return: list of a (address, (tx_hash, index)) tuple
+        """
+        return self._get_address_txos(DB._KeyPrefixes.ADDRESS_UTXO)
+
+    def put_address_dutxo(self, address, tx_hash, index):
+        self.put(rlp.encode([address, tx_hash, index]), b'', prefix=DB._KeyPrefixes.ADDRESS_DUTXO)
+
+    def delete_address_dutxo(self, address, tx_hash, index):
+        self.delete(rlp.encode([address, tx_hash, index]), prefix=DB._KeyPrefixes.ADDRESS_DUTXO)
+
+    def get_address_dutxos(self):
+        """
+        Reads address index of dutxos
+
+        :return: list of a (address, (tx_hash, index)) tuple
+        """
+        return self._get_address_txos(DB._KeyPrefixes.ADDRESS_DUTXO)
+
+    def _get_address_txos(self, prefix):
+        address_txos = self.db.prefixed_db(prefix.value)
+        keys = [rlp.decode(k, sedes.List([sedes.binary, sedes.binary, sedes.big_endian_int]))
+                for k, _ in address_txos]
+        return [(address, (tx_hash, index)) for address, tx_hash, index in keys]
+
+    def put_balance(self, address, balance):
+        self.put(address, Serializer.int_to_bytes(balance), prefix=DB._KeyPrefixes.ADDRESS_BALANCE)
+
+    def delete_balance(self, address):
+        self.delete(address, prefix=DB._KeyPrefixes.ADDRESS_BALANCE)
+
+    def get_balances(self):
+        """
+        Reads balances of all the addresses
+
+        :return: list of a (address, balance) tuple
+        """
+        balances = self.db.prefixed_db(DB._KeyPrefixes.ADDRESS_BALANCE.value)
+        return [(address, Serializer.bytes_to_int(balance)) for address, balance in balances]
+
+    def delete_pending(self, sequence):
+        self.delete(DB._sequence_key(sequence), prefix=DB._KeyPrefixes.PENDING_TRANSACTION)
+
+    def put_pending_tx(self, sequence, tx, priority):
+        """
+        :param sequence: number of the transaction in the order transactions were added
+        """
         encoded = rlp.encode([priority, DB._rlp_serializer.encode(tx)])
-        self.put(Serializer.int_to_bytes(index), encoded, prefix=DB._KeyPrefixes.PENDING_TRANSACTION)
+        self.put(DB._sequence_key(sequence), encoded, prefix=DB._KeyPrefixes.PENDING_TRANSACTION)
 
     def get_pending_txs(self):
         """
-        Gets pending transactions from the database
+        Gets pending transactions from the database in the order they were added
 
-        NOTE: It does not restore FIFO order
-        :return: list of a (index, priority, tx) tuple
+        :return: list of (sequence number, priority, tx) tuples
         """
-        pending_txs = self.db.prefixed_db(DB._KeyPrefixes.PENDING_TRANSACTION.value)
-        enc = [(Serializer.bytes_to_int(key), encoded) for key, encoded in pending_txs]
-        pairs = [(key, rlp.decode(encoded, sedes=sedes.List([sedes.big_endian_int, sedes.raw])))
-                 for key, encoded in enc]
+        return [(int.from_bytes(key, byteorder='big'), priority, tx) for key, priority, tx in self._iter_pending_txs()]
+
+    def get_legacy_pending_txs(self):
+        """
+        Gets pending transactions of a database created before they were numbered, keyed by their slots in the queue
+
+        :return: list of (slot index, priority, tx) tuples
+        """
+        return [(Serializer.bytes_to_int(key), priority, tx) for key, priority, tx in self._iter_pending_txs()]
+
+    def delete_legacy_pending(self, index):
+        self.delete(Serializer.int_to_bytes(index), prefix=DB._KeyPrefixes.PENDING_TRANSACTION)
 
-        return [(index, priority, DB._rlp_serializer.decode(tx_enc)) for index, (priority, tx_enc) in pairs]
+    def _iter_pending_txs(self):
+        pending_txs = self.db.prefixed_db(DB._KeyPrefixes.PENDING_TRANSACTION.value)
+        for key, encoded in pending_txs:
+            priority, tx_enc = rlp.decode(encoded, sedes=sedes.List([sedes.big_endian_int, sedes.raw]))
+            yield key, priority, DB._rlp_serializer.decode(tx_enc)
 
     def put_active_offer(self, offer):
         self.put(offer.hash(), DB._rlp_serializer.encode(offer), DB._KeyPrefixes.OFFER_ACTIVE)
+        self.put_offer_timeout(offer)
+
+    def delete_active_offer(self, offer):
+        self.delete(offer.hash(), DB._KeyPrefixes.OFFER_ACTIVE)
+        self.delete(DB._offer_timeout_key(offer.timeout, offer.hash()), DB._KeyPrefixes.OFFER_TIMEOUT)
 
-    def delete_active_offer(self, offer_hash):
-        self.delete(offer_hash, DB._KeyPrefixes.OFFER_ACTIVE)
+    def put_offer_timeout(self, offer):
+        """
+        Indexes an active offer by its timeout, see :func: `iter_timeouted_offers`
+        """
+        self.put(DB._offer_timeout_key(offer.timeout, offer.hash()), b'', DB._KeyPrefixes.OFFER_TIMEOUT)
+
+    def iter_timeouted_offers(self, timestamp):
+        """
+        Reads hashes of the active offers which timed out before the given timestamp, in timeout order.
+        Only the timed out offers are read.
+
+        :return: generator of offer hashes
+        """
+        timeouts_db = self.db.prefixed_db(DB._KeyPrefixes.OFFER_TIMEOUT.value)
+        for key in timeouts_db.iterator(stop=DB._offer_timeout_key(timestamp), include_value=False):
+            yield key[8:]
 
     def get_active_offers(self):
         new_offers = self.db.prefixed_db(DB._KeyPrefixes.OFFER_ACTIVE.value)
@@ -0,0 +1,93 @@
+import threading
+from contextlib import contextmanager
+
+
+class ReadWriteLock:
+    """
+    Lock which can be held by many readers or by a single writer.
+
+    Writers are preferred: once a writer waits, new readers wait for it, so a steady stream of readers
+    cannot starve it. Both sides are reentrant and the writer may take the read side as well,
+    but a reader cannot upgrade to the write side.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._writer_depth = 0
+        self._waiting_writers = 0
+        self._local = threading.local()
+
+    @contextmanager
+    def read(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+    def acquire_read(self):
+        local = self._local
+        if self._writer == threading.get_ident():
+            local.nested = getattr(local, 'nested', 0) + 1
+            return
+
+        depth = getattr(local, 'depth', 0)
+        if depth == 0:
+            with self._condition:
+                while self._writer is not None or self._waiting_writers:
+                    self._condition.wait()
+                self._readers += 1
+        local.depth = depth + 1
+
+    def release_read(self):
+        local = self._local
+        if getattr(local, 'nested', 0):
+            local.nested -= 1
+            return
+
+        local.depth -= 1
+        if local.depth == 0:
+            with self._condition:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._condition.notify_all()
+
+    def acquire_write(self):
+        """
+        :raise RuntimeError: if the thread holds the read side
+        """
+        me = threading.get_ident()
+        if self._writer == me:
+            self._writer_depth += 1
+            return
+
+        if getattr(self._local, 'depth', 0):
+            raise RuntimeError('Read lock cannot be upgraded to a write lock')
+
+        with self._condition:
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._condition.wait()
+            finally:
+                self._waiting_writers -= 1
+
+            self._writer = me
+            self._writer_depth = 1
+
+    def release_write(self):
+        self._writer_depth -= 1
+        if self._writer_depth == 0:
+            with self._condition:
+                self._writer = None
+                self._condition.notify_all()
@@ -1,21 +1,37 @@
 import os
+from enum import Enum
+from threading import Lock
 
 from chasm.consensus.validation.block_validator import BlockValidator, DIFFICULTY_COMPUTATION_INTERVAL
-from chasm.consensus.validation.tx_validator import TxValidator
 from chasm.maintenance.config import Config
+from chasm.maintenance.exceptions import DuplicatedPendingTxError, MempoolConflictError
 from chasm.services_manager import Service
 from chasm.state.state import State
 
 
+class StateEvent(Enum):
+    """
+    Events published to the subscribers of :class: `StateService`
+    """
+    NEW_TIP = 0  # args: height, block hash
+    NEW_PENDING_TX = 1  # args: transaction, its fee
+
+
 class StateService(Service):
     def __init__(self, config: Config, dev=False):
         self._state: State = None
         self._config = config
         self._dev = dev
 
+        self._subscribers = []
+        self._subscribers_lock = Lock()
+
+        self.last_validation_timings = {}  # durations of the stages of the last block validation, see BlockValidator
+
     def start(self, _stop_condition):
         db_dir = os.path.join(self._config.get('datadir'), 'db')
-        self._state = State(db_dir, self._config.get('xpeer_pending_txs'))
+        self._state = State(db_dir, self._config.get('xpeer_pending_txs'), self._config.get('xpeer_block_cache_size'),
+                            self._config.get('xpeer_verifier_workers'))
         return True
 
     def is_running(self):
@@ -24,13 +40,42 @@ class StateService(Service):
     def stop(self):
         self._state.close()
 
+    def subscribe(self, callback):
+        """
+        Registers a callback invoked with a :class: `StateEvent` and its args after every change of the state.
+
+        NOTE: callbacks are invoked by the thread which changed the state and must not block
+        """
+        with self._subscribers_lock:
+            self._subscribers = self._subscribers + [callback]
+
+    def unsubscribe(self, callback):
+        with self._subscribers_lock:
+            self._subscribers = [subscriber for subscriber in self._subscribers if subscriber != callback]
+
     def apply_block(self, block):
-        self._build_block_validator().validate(block)
+        validator = self._build_block_validator()
+        validator.validate(block)
+        self.last_validation_timings = validator.timings
+
         self._state.apply_block(block)
 
+        self._publish(StateEvent.NEW_TIP, self._state.current_height, block.hash())
+
     def add_pending_tx(self, tx):
-        self._build_tx_validator().validate(tx)
-        self._state.add_pending_tx(tx)
+        """
+        :raise DuplicatedPendingTxError: when the transaction is already pending, before validating it
+        """
+        if self._state.is_pending(tx.hash()):
+            raise DuplicatedPendingTxError(tx.hash())
+        # NOTE: read before the validator is, so a block applied meanwhile makes the state check the tx again
+        height = self._state.current_height
+        self._state.tx_validator.validate(tx)
+
+        fee = self._get_fee(tx, self._state.get_mempool_utxos())
+        self._state.add_pending_tx(tx, validated_height=height)
+
+        self._publish(StateEvent.NEW_PENDING_TX, tx, fee)
 
     def __getattribute__(self, item):
         try:
@@ -38,6 +83,24 @@ class StateService(Service):
         except AttributeError:
             return getattr(self._state, item)
 
+    def _publish(self, event, *args):
+        for callback in self._subscribers:
+            callback(event, *args)
+
+    def _get_fee(self, tx, utxos):
+        """
+        :raise MempoolConflictError: when an input was spent since the transaction was validated
+        """
+        input_sum = 0
+        for tx_input in tx.inputs:
+            output = utxos.get((tx_input.tx_hash, tx_input.output_no))
+            if output is None:
+                raise MempoolConflictError(tx.hash(), tx_input.tx_hash, tx_input.output_no,
+                                           self._state.get_pending_spender(tx_input.tx_hash, tx_input.output_no))
+            input_sum += output.value
+
+        return input_sum - sum(tx_output.value for tx_output in tx.outputs)
+
     def _build_block_validator(self):
         height = self._state.current_height
 
@@ -45,8 +108,8 @@ class StateService(Service):
         last_block = self._state.get_block_by_no(height)
         old_block = self._state.get_block_by_no(old_block_no)
 
-        return BlockValidator(self._state.get_utxos(), self._state.get_active_offers(),
-                              self._state.get_matched_offers(), last_block.header, old_block.header, height, dev=self._dev)
+        snapshot = self._state.snapshot()
+        return BlockValidator(snapshot.utxos, snapshot.active_offers, snapshot.matched_offers,
+                              last_block.header, old_block.header, height, dev=self._dev,
+                              signature_verifier=self._state.signature_verifier)
 
-    def _build_tx_validator(self):
-        return TxValidator(self._state.get_utxos(), self._state.get_active_offers(), self._state.get_matched_offers())
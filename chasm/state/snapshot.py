@@ -0,0 +1,179 @@
+from collections.abc import Mapping
+
+_REMOVED = object()
+_MISSING = object()
+
+
+class Snapshot(Mapping):
+    """
+    Immutable, read-only version of a mapping.
+
+    A snapshot is a stack of layers. Each layer holds the entries changed by the versions it covers
+    (removals are kept as `_REMOVED` markers), the bottom layer holds the base version.
+    Layers are never mutated once published, so a new version shares all the unchanged entries
+    with the previous one, and obtaining a snapshot is O(1).
+
+    NOTE: values are shared between versions and must be treated as read-only.
+    """
+
+    __slots__ = ('_layer', '_parent', '_len')
+
+    def __init__(self, layer=None, parent=None, length=None):
+        self._layer = layer if layer is not None else {}
+        self._parent = parent
+        self._len = length if length is not None else len(self._layer)
+
+    def __getitem__(self, key):
+        value = self._lookup(key)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self._lookup(key) is not _MISSING
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        if self._parent is None:
+            yield from self._layer
+            return
+
+        seen = set()
+        snapshot = self
+        while snapshot is not None:
+            for key, value in snapshot._layer.items():
+                if key not in seen:
+                    seen.add(key)
+                    if value is not _REMOVED:
+                        yield key
+            snapshot = snapshot._parent
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({dict(self.items())})'
+
+    @property
+    def depth(self):
+        depth = 0
+        snapshot = self._parent
+        while snapshot is not None:
+            depth += 1
+            snapshot = snapshot._parent
+        return depth
+
+    def _lookup(self, key):
+        snapshot = self
+        while snapshot is not None:
+            value = snapshot._layer.get(key, _MISSING)
+            if value is not _MISSING:
+                return _MISSING if value is _REMOVED else value
+            snapshot = snapshot._parent
+        return _MISSING
+
+    def derive(self, changes, length):
+        """
+        Publishes a new version on top of this one.
+
+        Layers are merged like in a log-structured tree: a layer is folded into its parent only
+        when it is at least half of the parent's size, so every entry gets copied O(log n) times
+        during its lifetime and the depth of the stack stays logarithmic.
+        :param changes: dict with the changed entries, `_REMOVED` marks removals
+        :param length: number of entries in the new version
+        :return: new snapshot
+        """
+        layer, parent = changes, self
+
+        while parent is not None and 2 * len(layer) >= len(parent._layer):
+            merged = dict(parent._layer)
+            merged.update(layer)
+            layer, parent = merged, parent._parent
+
+        if parent is None:
+            layer = {key: value for key, value in layer.items() if value is not _REMOVED}
+
+        return Snapshot(layer, parent, length)
+
+
+class VersionedDict:
+    """
+    Mutable mapping which publishes its state as immutable snapshots.
+
+    Writes are buffered until :func: `commit` is invoked, readers only see committed versions
+    through :func: `snapshot`.
+    """
+
+    def __init__(self, items=()):
+        self._snapshot = Snapshot(dict(items))
+        self._changes = {}
+        self._len = len(self._snapshot)
+
+    def snapshot(self) -> Snapshot:
+        return self._snapshot
+
+    def commit(self):
+        if self._changes:
+            self._snapshot = self._snapshot.derive(self._changes, self._len)
+            self._changes = {}
+
+    def rollback(self):
+        self._changes = {}
+        self._len = len(self._snapshot)
+
+    def get(self, key, default=None):
+        value = self._lookup(key)
+        return default if value is _MISSING else value
+
+    def pop(self, key, *default):
+        value = self._lookup(key)
+        if value is _MISSING:
+            if default:
+                return default[0]
+            raise KeyError(key)
+
+        self._changes[key] = _REMOVED
+        self._len -= 1
+        return value
+
+    def items(self):
+        return self._working_snapshot().items()
+
+    def keys(self):
+        return self._working_snapshot().keys()
+
+    def values(self):
+        return self._working_snapshot().values()
+
+    def __getitem__(self, key):
+        value = self._lookup(key)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if self._lookup(key) is _MISSING:
+            self._len += 1
+        self._changes[key] = value
+
+    def __contains__(self, key):
+        return self._lookup(key) is not _MISSING
+
+    def __iter__(self):
+        return iter(self._working_snapshot())
+
+    def __len__(self):
+        return self._len
+
+    def _working_snapshot(self):
+        if not self._changes:
+            return self._snapshot
+        return Snapshot(dict(self._changes), self._snapshot, self._len)
+
+    def _lookup(self, key):
+        value = self._changes.get(key, _MISSING)
+        if value is _REMOVED:
+            return _MISSING
+        if value is not _MISSING:
+            return value
+        return self._snapshot._lookup(key)
+
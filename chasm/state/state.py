@@ -1,40 +1,75 @@
 import copy
+import heapq
 import os
 import queue
+from collections import namedtuple
+from contextlib import ExitStack
 from threading import RLock
 from typing import Union
 
 import plyvel
 import rlp
-from depq import DEPQ
 
 from chasm.consensus import GENESIS_BLOCK
 from chasm.consensus.primitives.block import Block
 from chasm.consensus.primitives.transaction import SignedTransaction, MintingTransaction, OfferTransaction, \
     MatchTransaction, UnlockingDepositTransaction, ConfirmationTransaction
 from chasm.consensus.validation.block_validator import BlockValidator
+from chasm.consensus.validation.overlay import OverlayView
+from chasm.consensus.validation.signature_verifier import SignatureVerifier
 from chasm.consensus.validation.tx_validator import TxValidator
-from chasm.maintenance.exceptions import TxOverwriteError
+from chasm.maintenance.exceptions import TxOverwriteError, MempoolConflictError, DuplicatedPendingTxError
+from chasm.serialization.rlp_serializer import RLPView
+from chasm.state._block_store import BlockStore, DEFAULT_BLOCK_CACHE_SIZE
 from chasm.state._db import DB
+from chasm.state._rwlock import ReadWriteLock
+from chasm.state.snapshot import VersionedDict, Snapshot
+
+TX_INDEX_VERSION = 1  # NOTE: keyed b'index_version_txs', keys starting with b't' belong to the index itself
+OFFER_TIMEOUT_INDEX_VERSION = 1
+QUEUE_VERSION = 1  # NOTE: keyed b'queue_version', keys starting with b'p' belong to pending transactions
+
+StateSnapshot = namedtuple('StateSnapshot', 'height utxos dutxos active_offers matched_offers')
 
 
 class State:
-    def __init__(self, db_dir, pending_queue_size):
-        self.blocks = {}
-        self.tx_indices = {}
-        self.utxos = {}
-        self.dutxos = {}
-        self.blocks_by_height = {}
+    """
+    Chain state and the mempool of pending transactions.
+
+    The chain state is changed by one writer at a time, which buffers its changes in versioned dicts
+    and publishes them at once when the block is written to the database. Readers work on the published
+    snapshots and only wait for the short publication, not for the whole block to be applied.
+    The mempool has its own lock, so adding pending transactions does not wait for blocks either.
+
+    Locks are taken in the order: applying lock, mempool lock, chain lock.
+    """
+
+    def __init__(self, db_dir, pending_queue_size, block_cache_size=DEFAULT_BLOCK_CACHE_SIZE, verifier_workers=0):
+        self.blocks: BlockStore = None
+        self.utxos = VersionedDict()
+        self.dutxos = VersionedDict()
         self.pending_txs = None
-        self.active_offers = {}
-        self.matched_offers = {}
+        self.mempool_spent = {}  # outpoint -> hash of the pending tx spending it
+        self.mempool_outputs = {}
+        self.mempool_txs = {}  # tx hash -> pending tx
+        self.mempool_addresses = {}  # address -> hashes of the pending txs with outputs it receives
+        self.active_offers = VersionedDict()
+        self.matched_offers = VersionedDict()
+        self.address_utxos = VersionedDict()
+        self.address_dutxos = VersionedDict()
+        self.balances = VersionedDict()
         self.current_height = 0
+        self._applied_height = None  # height written by the block being applied, published with the versions
         self.buffer_len = pending_queue_size
+        self.block_cache_size = block_cache_size
 
         self.block_validator: BlockValidator = None
-        self.tx_validator: TxValidator = None
+        self._tx_validator: TxValidator = None
+        self.signature_verifier = SignatureVerifier(workers=verifier_workers)
 
-        self._lock = RLock()
+        self._apply_lock = RLock()  # serializes writers of the chain state
+        self._chain_lock = ReadWriteLock()  # readers of the chain state vs publication of its new version
+        self._mempool_lock = RLock()
 
         self.db = None
         self._db_dir = db_dir
@@ -51,10 +86,8 @@ class State:
     def apply_block(self, block: Block):
         block_hash = block.hash()
 
-        with _DBTransaction(self), self._lock:
-            self._clean_timeouted_offers()
-
-            self._build_tx_indices(block, block_hash)
+        with self._apply_lock, ExitStack() as mempool_lock, _DBTransaction(self):
+            self._apply_tx_indices(block, block_hash)
 
             new_utxos, new_dutxos = self._extract_outputs_from_block(block)
             self._apply_new_utxos(new_utxos)
@@ -74,103 +107,400 @@ class State:
 
             self._apply_block(block, block_hash)
 
-    def add_pending_tx(self, tx: SignedTransaction, priority=0):
-        with self._lock:
-            index = self.pending_txs.push(tx, priority)
-            self.db.put_pending_tx(index, tx, priority)
+            # NOTE: offers which timed out before the new tip are expired with it, so the published state
+            #       never has an offer the next block could not match
+            expired_offers = self._clean_timeouted_offers(block.timestamp, new_offers)
+
+            # NOTE: held until the block is published, so no transaction conflicting with it gets pending
+            mempool_lock.enter_context(self._mempool_lock)
+            self._evict_pending_txs(block, expired_offers)
+
+    @property
+    def tx_validator(self) -> TxValidator:
+        """
+        Validator of transactions against the current state.
+
+        It reads a read-only snapshot of the state, so it is built once and reused
+        until a new block is applied. UTXOs are seen through the mempool overlay,
+        so outputs of pending transactions can be spent and outputs spent by them can not.
+        """
+        with self._chain_lock.read():
+            if self._tx_validator is None:
+                snapshot = self.snapshot()
+                self._tx_validator = TxValidator(self.get_mempool_utxos(snapshot.utxos), snapshot.active_offers,
+                                                 snapshot.matched_offers, self.signature_verifier)
+            return self._tx_validator
+
+    def get_mempool_utxos(self, utxos=None) -> OverlayView:
+        """
+        Returns UTXOs as they will be once all the pending transactions are applied
+        :param utxos: confirmed UTXOs to put the overlay on, the current ones by default
+        """
+        return OverlayView(utxos if utxos is not None else self.get_utxos(), self.mempool_outputs,
+                           self.mempool_spent)
+
+    def add_pending_tx(self, tx: SignedTransaction, priority=0, validated_height=None):
+        """
+        Adds a transaction to the pending ones
+
+        :param validated_height: height of the state the transaction was validated against, if blocks were applied
+                                 since, the transaction is checked again against the current state
+        When the queue is full, the pending transaction with the lowest priority is evicted together
+        with the pending ones spending its outputs.
+
+        :raise DuplicatedPendingTxError: when the transaction is already pending
+        :raise MempoolConflictError: when the transaction spends an output already spent by a pending one,
+                                     or by a block applied after the transaction was validated
+        :raise queue.Full: when the queue is full of transactions of the same or higher priority,
+                           or the transaction spends outputs of the ones which would be evicted for it
+        """
+        with self._mempool_lock:
+            if tx.hash() in self.mempool_txs:
+                raise DuplicatedPendingTxError(tx.hash())
+            self._check_mempool_conflicts(tx)
+
+            # NOTE: blocks evict conflicting transactions with the mempool lock held, so one applied after
+            #       the validation has already changed the height and did not see this transaction
+            if validated_height is not None and validated_height != self.current_height:
+                self._check_inputs_unspent(tx)
+                self.tx_validator.validate_stateful(tx)
+
+            lowest = self.pending_txs.get_evicted(priority)
+            evicted = self._with_descendants([lowest[1].hash()]) if lowest is not None else set()
+            if any(tx_input.tx_hash in evicted for tx_input in tx.inputs):
+                raise queue.Full
+
+            removed = self.pending_txs.remove(evicted)
+            sequence, _evicted = self.pending_txs.push(tx, priority)
+            with _DBTransaction(self, mempool_only=True):
+                self.db.put_pending_tx(sequence, tx, priority)
+                for removed_sequence, _removed_tx in removed:
+                    self.db.delete_pending(removed_sequence)
+
+            for _removed_sequence, removed_tx in removed:
+                self._remove_from_mempool_overlay(removed_tx)
+            self._add_to_mempool_overlay(tx)
+
+    def get_pending_txs(self) -> [SignedTransaction]:
+        """
+        :return: pending transactions in the order :func: `pop_pending_tx` would return them
+        """
+        with self._mempool_lock:
+            return [tx for _sequence, tx in self.pending_txs]
+
+    def is_pending(self, tx_hash) -> bool:
+        return tx_hash in self.mempool_txs
+
+    def get_pending_tx(self, tx_hash) -> SignedTransaction:
+        """
+        :raise KeyError: if there is no such a pending transaction
+        """
+        return self.mempool_txs[tx_hash]
+
+    def get_pending_spender(self, tx_hash, index) -> Union[bytes, None]:
+        """
+        :return: hash of the pending transaction spending the output, None if no pending one spends it
+        """
+        return self.mempool_spent.get((tx_hash, index))
+
+    def get_address_pending_txs(self, address) -> [SignedTransaction]:
+        """
+        Returns pending transactions with outputs received by the address, costs O(number of the transactions)
+        """
+        with self._mempool_lock:
+            return [self.mempool_txs[tx_hash] for tx_hash in sorted(self.mempool_addresses.get(address, ()))]
+
+    def remove_pending_txs(self, tx_hashes):
+        """
+        Removes the pending transactions with the given hashes, unknown hashes are ignored
+        """
+        tx_hashes = set(tx_hashes)
+
+        with self._mempool_lock, _DBTransaction(self, mempool_only=True):
+            for sequence, tx in self.pending_txs.remove(tx_hashes):
+                self.db.delete_pending(sequence)
+                self._remove_from_mempool_overlay(tx)
 
     def pop_pending_tx(self) -> SignedTransaction:
-        with self._lock:
-            index, tx = self.pending_txs.pop()
-            self.db.delete_pending(index)
+        with self._mempool_lock:
+            sequence, tx = self.pending_txs.pop()
+            self.db.delete_pending(sequence)
+            self._remove_from_mempool_overlay(tx)
 
         return tx
 
-    def get_utxos(self) -> dict:
-        with self._lock:
-            return copy.deepcopy(self.utxos)
+    def snapshot(self) -> StateSnapshot:
+        """
+        Returns a consistent, read-only view of the state at the current height.
 
-    def get_utxo(self, tx_hash: int, index: int) -> Union[SignedTransaction, MintingTransaction]:
-        with self._lock:
-            utxo = self.utxos[(tx_hash, index)]
-            return copy.deepcopy(utxo)
+        NOTE: the view is obtained in O(1) and is not affected by blocks applied later on
+        """
+        with self._chain_lock.read():
+            return StateSnapshot(self.current_height, self.utxos.snapshot(), self.dutxos.snapshot(),
+                                 self.active_offers.snapshot(), self.matched_offers.snapshot())
 
-    def get_transaction(self, tx_hash) -> Union[SignedTransaction, MintingTransaction]:
-        with self._lock:
-            block, index = self.tx_indices[tx_hash]
-            block = self.get_block_by_hash(block)
-            return block.transactions[index]
+    def get_utxos(self) -> Snapshot:
+        with self._chain_lock.read():
+            return self.utxos.snapshot()
+
+    def get_utxo(self, tx_hash: int, index: int) -> Union[SignedTransaction, MintingTransaction]:
+        utxo = self.get_utxos()[(tx_hash, index)]
+        return copy.deepcopy(utxo)
+
+    def get_transaction(self, tx_hash, lazy=False) -> Union[SignedTransaction, MintingTransaction, RLPView]:
+        """
+        :param lazy: return a lazily decoded :class: `RLPView` instead of decoding the transaction,
+                     unless its block is cached
+        :raise KeyError: if there is no such a transaction in the chain
+        """
+        with self._chain_lock.read():
+            tx_index = self.db.get_tx_index(tx_hash)
+            if tx_index is None:
+                raise KeyError(tx_hash)
+
+            block_hash, index = tx_index
+            return self.blocks.get_transaction(block_hash, index, lazy=lazy)
+
+    def get_address_utxos(self, address) -> dict:
+        """
+        Returns UTXOs owned by the address, costs O(number of the address outputs)
+        :param address: receiver of the outputs
+        :return: dict of (tx_hash, index) -> output
+        """
+        with self._chain_lock.read():
+            txos = self.address_utxos.snapshot().get(address, ())
+            utxos = self.utxos.snapshot()
+
+        return {txo: utxos[txo] for txo in sorted(txos)}
+
+    def get_address_dutxos(self, address) -> dict:
+        """
+        Returns DUTXOs owned by the address, costs O(number of the address outputs)
+        :param address: receiver of the outputs
+        :return: dict of (tx_hash, index) -> output
+        """
+        with self._chain_lock.read():
+            txos = self.address_dutxos.snapshot().get(address, ())
+            dutxos = self.dutxos.snapshot()
+
+        return {txo: dutxos[txo] for txo in sorted(txos)}
+
+    def get_balance(self, address) -> int:
+        with self._chain_lock.read():
+            return self.balances.snapshot().get(address, 0)
 
     def get_block_by_no(self, block_no) -> Block:
-        with self._lock:
-            block_hash = self.blocks_by_height[block_no]
-            return self.get_block_by_hash(block_hash)
+        with self._chain_lock.read():
+            return self.blocks.get_by_height(block_no)
 
-    def get_block_by_hash(self, block_hash):
-        with self._lock:
-            return copy.deepcopy(self.blocks[block_hash])
+    def iter_blocks(self, start_height=0, end_height=None):
+        """
+        Streams blocks from the given range of heights in height order
 
-    def get_active_offers(self):
-        with self._lock:
-            self._clean_timeouted_offers()
-            return copy.deepcopy(self.active_offers)
+        NOTE: returned blocks may be shared with the state and must not be modified
+        :param end_height: end of the range (exclusive), defaults to the current height + 1
+        :return: generator of (height, block) tuples
+        """
+        if end_height is None:
+            end_height = self.current_height + 1
 
-    def get_matched_offers(self):
-        with self._lock:
-            return copy.deepcopy(self.matched_offers)
+        return self.blocks.iter_range(start_height, end_height)
 
-    def get_dutxos(self):
-        with self._lock:
-            return copy.deepcopy(self.dutxos)
+    def get_block_by_hash(self, block_hash):
+        """
+        NOTE: returned block is shared with the state and must not be modified
+        """
+        with self._chain_lock.read():
+            return self.blocks.get(block_hash)
+
+    def get_active_offers(self) -> Snapshot:
+        """
+        NOTE: offers which timed out before the timestamp of the chain tip are already removed
+        """
+        with self._chain_lock.read():
+            return self.active_offers.snapshot()
+
+    def get_matched_offers(self) -> Snapshot:
+        with self._chain_lock.read():
+            return self.matched_offers.snapshot()
+
+    def get_dutxos(self) -> Snapshot:
+        with self._chain_lock.read():
+            return self.dutxos.snapshot()
 
     def _read_current_height(self):
         encoded = self.db.get(b'highest_block')
         return rlp.decode(encoded, rlp.sedes.big_endian_int)
 
     def _set_current_height(self, height):
-        self.current_height = height
+        self._applied_height = height
         encoded = rlp.encode(height)
         self.db.put(b'highest_block', encoded)
 
     def close(self):
+        self.signature_verifier.close()
         self.db.close()
 
-    @staticmethod
-    def _build_blocks_from_db_data(db_blocks):
-        block_indices = {}
-        tx_indices = {}
-        blocks = {}
+    def _build_tx_indices_from_db_data(self):
+        """
+        Indexes transactions of a database created before the index was persisted
+        """
+        with _DBTransaction(self, reload_on_failure=False):
+            for (_height, block_hash, encoded) in self.db.iter_encoded_blocks():
+                for i, tx in enumerate(RLPView(encoded).transactions):
+                    self.db.put_tx_index(tx.hash(), block_hash, i)
+
+            self._put_tx_index_version()
+
+    def _put_tx_index_version(self):
+        self.db.put(b'index_version_txs', rlp.encode(TX_INDEX_VERSION))
+        # NOTE: the key it was kept under before lies in the keyspace of the index
+        self.db.delete(b'tx_index_version')
+
+    def _build_offer_timeout_index_from_db_data(self):
+        """
+        Indexes active offers by their timeouts in a database created before the index was persisted
+        """
+        with _DBTransaction(self, reload_on_failure=False):
+            for _offer_hash, offer in self.db.get_active_offers():
+                self.db.put_offer_timeout(offer)
+
+            self.db.put(b'offer_timeout_index_version', rlp.encode(OFFER_TIMEOUT_INDEX_VERSION))
+
+    def _build_pending_txs_order_from_db_data(self):
+        """
+        Keys pending transactions of a database created before they were numbered in the order they were added,
+        the order they had is unknown, so they are numbered by priority
+        """
+        legacy = sorted(self.db.get_legacy_pending_txs(), key=lambda entry: (-entry[1], entry[0]))
+
+        with _DBTransaction(self, reload_on_failure=False):
+            for sequence, (index, priority, tx) in enumerate(legacy):
+                self.db.delete_legacy_pending(index)
+                self.db.put_pending_tx(sequence, tx, priority)
+
+            self.db.put(b'queue_version', rlp.encode(QUEUE_VERSION))
+
+    def _build_height_index_from_db_data(self):
+        """
+        Indexes blocks by height in a database created before the index was persisted
+        """
+        with _DBTransaction(self, reload_on_failure=False):
+            for block_hash, height in self.db.get_block_heights():
+                self.db.put_block_hash(height, block_hash)
 
-        for (height, block) in db_blocks:
-            block_hash = block.hash()
-            blocks[block_hash] = block
-            block_indices[height] = block_hash
-            for tx, i in zip(block.transactions, range(len(block.transactions))):
-                tx_indices[tx.hash()] = (block_hash, i)
+    def reload(self):
+        with self._apply_lock, self._mempool_lock, self._chain_lock.write():
+            if self.db.get_block_hash(0) is None:
+                self._build_height_index_from_db_data()
 
-        return blocks, block_indices, tx_indices
+            self.blocks = BlockStore(self.db, self.block_cache_size)
 
-    def reload(self):
-        with self._lock:
-            blocks, blocks_height_indexes, tx_indices = self._build_blocks_from_db_data(self.db.get_blocks())
+            if self.db.get(b'index_version_txs') is None:
+                if self.db.get(b'tx_index_version') is None:
+                    self._build_tx_indices_from_db_data()
+                else:
+                    with _DBTransaction(self, reload_on_failure=False):
+                        self._put_tx_index_version()
 
-            self.blocks = blocks
-            self.blocks_by_height = blocks_height_indexes
+            if self.db.get(b'offer_timeout_index_version') is None:
+                self._build_offer_timeout_index_from_db_data()
 
-            self.tx_indices = tx_indices
+            if self.db.get(b'queue_version') is None:
+                self._build_pending_txs_order_from_db_data()
 
-            self.utxos = dict(self.db.get_utxos())
-            self.dutxos = dict(self.db.get_dutxos())
+            self.utxos = VersionedDict(self.db.get_utxos())
+            self.dutxos = VersionedDict(self.db.get_dutxos())
 
-            self.active_offers = dict(self.db.get_active_offers())
-            self.matched_offers = dict(self.db.get_matched_offers())
+            self.active_offers = VersionedDict(self.db.get_active_offers())
+            self.matched_offers = VersionedDict(self.db.get_matched_offers())
+
+            self._load_address_indices()
 
-            self.pending_txs = _PendingTxsQueue(maxlen=self.buffer_len, elements=self.db.get_pending_txs())
             self.current_height = self._read_current_height()
+            self._applied_height = None
+
+            # NOTE: databases written before offers were expired with the tip may still hold timed out ones
+            with _DBTransaction(self, reload_on_failure=False):
+                self._clean_timeouted_offers(self.blocks.get_by_height(self.current_height).timestamp)
+
+            self._reload_mempool()
+
+            self._tx_validator = None
+
+    def _reload_mempool(self):
+        with self._mempool_lock:
+            self.pending_txs = _PendingTxsQueue(maxlen=self.buffer_len, elements=self.db.get_pending_txs())
+
+            # NOTE: refilled in place, the cached tx validator sees UTXOs through an overlay of these dicts
+            for index in (self.mempool_spent, self.mempool_outputs, self.mempool_txs, self.mempool_addresses):
+                index.clear()
+            for _, tx in self.pending_txs:
+                self._add_to_mempool_overlay(tx)
+
+    def _load_address_indices(self):
+        address_utxos = self._group_by_address(self.db.get_address_utxos())
+        address_dutxos = self._group_by_address(self.db.get_address_dutxos())
+        balances = self.db.get_balances()
+
+        if not address_utxos and not address_dutxos and (self.utxos or self.dutxos):
+            # NOTE: database created before address indices were introduced
+            address_utxos, address_dutxos, balances = self._build_address_indices()
+
+        self.address_utxos = VersionedDict(address_utxos)
+        self.address_dutxos = VersionedDict(address_dutxos)
+        self.balances = VersionedDict(balances)
+
+    def _build_address_indices(self):
+        address_utxos, address_dutxos, balances = {}, {}, {}
+
+        with _DBTransaction(self, reload_on_failure=False):
+            for txo, output in self.utxos.items():
+                address = getattr(output, 'receiver', None)
+                if address is not None:
+                    address_utxos.setdefault(address, set()).add(txo)
+                    balances[address] = balances.get(address, 0) + output.value
+                    self.db.put_address_utxo(address, *txo)
+
+            for txo, output in self.dutxos.items():
+                address = getattr(output, 'receiver', None)
+                if address is not None:
+                    address_dutxos.setdefault(address, set()).add(txo)
+                    self.db.put_address_dutxo(address, *txo)
+
+            for address, balance in balances.items():
+                self.db.put_balance(address, balance)
+
+        return ({address: frozenset(txos) for address, txos in address_utxos.items()},
+                {address: frozenset(txos) for address, txos in address_dutxos.items()},
+                balances)
+
+    @staticmethod
+    def _group_by_address(entries):
+        grouped = {}
+        for address, txo in entries:
+            grouped.setdefault(address, set()).add(txo)
+        return {address: frozenset(txos) for address, txos in grouped.items()}
+
+    def _publish_versions(self):
+        """
+        NOTE: must be invoked with the chain lock held for writing
+        """
+        if self._applied_height is not None:
+            self.current_height, self._applied_height = self._applied_height, None
+
+        for versioned in (self.utxos, self.dutxos, self.active_offers, self.matched_offers,
+                          self.address_utxos, self.address_dutxos, self.balances):
+            versioned.commit()
+
+        self._tx_validator = None
 
     def _init_database(self):
         self.db.put_block(GENESIS_BLOCK, 0)
         self._set_current_height(0)
+        self.db.put(b'index_version_txs', rlp.encode(TX_INDEX_VERSION))
+        self.db.put(b'offer_timeout_index_version', rlp.encode(OFFER_TIMEOUT_INDEX_VERSION))
+        self.db.put(b'queue_version', rlp.encode(QUEUE_VERSION))
 
     @staticmethod
     def _extract_inputs_from_block(block):
@@ -188,15 +518,119 @@ class State:
         dutxos = []
 
         for tx in block.transactions:
-            for output, i in zip(tx.outputs, range(tx.outputs.__len__())):
-                utxos.append((tx.hash(), i, output))
-            if isinstance(tx, SignedTransaction):
-                if isinstance(tx.transaction, (OfferTransaction, MatchTransaction, UnlockingDepositTransaction)):
-                    index = tx.transaction.deposit_index
-                    dutxos.append(utxos.pop(-len(tx.outputs) + index))
+            tx_utxos, tx_dutxos = State._extract_outputs(tx)
+            utxos.extend(tx_utxos)
+            dutxos.extend(tx_dutxos)
 
         return utxos, dutxos
 
+    @staticmethod
+    def _extract_outputs(tx):
+        utxos = []
+        dutxos = []
+
+        for output, i in zip(tx.outputs, range(tx.outputs.__len__())):
+            utxos.append((tx.hash(), i, output))
+        if isinstance(tx, SignedTransaction):
+            if isinstance(tx.transaction, (OfferTransaction, MatchTransaction, UnlockingDepositTransaction)):
+                index = tx.transaction.deposit_index
+                dutxos.append(utxos.pop(-len(tx.outputs) + index))
+
+        return utxos, dutxos
+
+    def _evict_pending_txs(self, block, expired_offers=()):
+        """
+        Removes pending transactions included in the block, spending outputs spent by it, matching offers
+        which expired with it or spending outputs of the removed conflicting ones
+        """
+        included = set()
+        conflicting = []
+        if expired_offers:
+            for tx_hash, tx in self.mempool_txs.items():
+                if isinstance(tx, SignedTransaction) and isinstance(tx.transaction, MatchTransaction) and \
+                        tx.transaction.exchange in expired_offers:
+                    conflicting.append(tx_hash)
+
+        for tx in block.transactions:
+            tx_hash = tx.hash()
+            if tx_hash in self.mempool_txs:
+                included.add(tx_hash)
+
+            for tx_input in tx.inputs:
+                spender = self.mempool_spent.get((tx_input.tx_hash, tx_input.output_no))
+                if spender is not None and spender != tx_hash:
+                    conflicting.append(spender)
+
+        evicted = included | self._with_descendants(conflicting)
+        for sequence, tx in self.pending_txs.remove(evicted):
+            self.db.delete_pending(sequence)
+            self._remove_from_mempool_overlay(tx)
+
+    def _with_descendants(self, tx_hashes):
+        """
+        :return: set of hashes of the given pending transactions and of the pending ones spending their outputs,
+                 directly or through other pending ones
+        """
+        found = set(tx_hashes)
+        unvisited = list(found)
+        while unvisited:
+            tx_hash = unvisited.pop()
+            for index in range(len(self.mempool_txs[tx_hash].outputs)):
+                spender = self.mempool_spent.get((tx_hash, index))
+                if spender is not None and spender not in found:
+                    found.add(spender)
+                    unvisited.append(spender)
+
+        return found
+
+    def _check_mempool_conflicts(self, tx):
+        for tx_input in tx.inputs:
+            spender = self.mempool_spent.get((tx_input.tx_hash, tx_input.output_no))
+            if spender is not None:
+                raise MempoolConflictError(tx.hash(), tx_input.tx_hash, tx_input.output_no, spender)
+
+    def _check_inputs_unspent(self, tx):
+        utxos = self.get_mempool_utxos()
+        for tx_input in tx.inputs:
+            if (tx_input.tx_hash, tx_input.output_no) not in utxos:
+                raise MempoolConflictError(tx.hash(), tx_input.tx_hash, tx_input.output_no)
+
+    def _add_to_mempool_overlay(self, tx):
+        tx_hash = tx.hash()
+        self.mempool_txs[tx_hash] = tx
+
+        for tx_input in tx.inputs:
+            self.mempool_spent[(tx_input.tx_hash, tx_input.output_no)] = tx_hash
+
+        utxos, _dutxos = self._extract_outputs(tx)
+        for (_, index, output) in utxos:
+            self.mempool_outputs[(tx_hash, index)] = output
+
+        for address in self._get_receivers(tx):
+            self.mempool_addresses.setdefault(address, set()).add(tx_hash)
+
+    def _remove_from_mempool_overlay(self, tx):
+        tx_hash = tx.hash()
+        for tx_input in tx.inputs:
+            txo = (tx_input.tx_hash, tx_input.output_no)
+            if self.mempool_spent.get(txo) == tx_hash:
+                self.mempool_spent.pop(txo)
+
+        for index in range(len(tx.outputs)):
+            self.mempool_outputs.pop((tx_hash, index), None)
+
+        for address in self._get_receivers(tx):
+            tx_hashes = self.mempool_addresses[address]
+            tx_hashes.discard(tx_hash)
+            if not tx_hashes:
+                self.mempool_addresses.pop(address)
+
+        self.mempool_txs.pop(tx_hash, None)
+
+    @staticmethod
+    def _get_receivers(tx):
+        return {output.receiver for output in tx.outputs if getattr(output, 'receiver', None) is not None}
+
     @staticmethod
     def _extract_new_offers(block):
         return [tx.transaction for tx in block.transactions if
@@ -218,25 +652,20 @@ class State:
         return confirmations, unlocks
 
     def _apply_block(self, block, block_hash):
-        self.blocks[block_hash] = block
-        self.blocks_by_height[self.current_height + 1] = block_hash
-        self.db.put_block(block, self.current_height + 1)
+        self.blocks.put(block, self.current_height + 1, block_hash)
         self._set_current_height(self.current_height + 1)
 
     def _apply_new_utxos(self, utxos):
         for (tx_hash, index, output) in utxos:
-            self.utxos[(tx_hash, index)] = output
-            self.db.put_utxo(tx_hash, index, output)
+            self._put_utxo((tx_hash, index), output)
 
     def _apply_new_dutxos(self, dutxos):
         for (tx_hash, index, output) in dutxos:
-            self.dutxos[(tx_hash, index)] = output
-            self.db.put_dutxo(tx_hash, index, output)
+            self._put_dutxo((tx_hash, index), output)
 
     def _apply_used_utxos(self, spend_txos):
         for txo in spend_txos:
-            self.utxos.pop(txo)
-            self.db.delete_utxo(*txo)
+            self._pop_utxo(txo)
 
     def _apply_new_offers(self, offers):
         for tx in offers:
@@ -247,7 +676,7 @@ class State:
     def _apply_new_matches(self, matches, block_timestamp):
         for match in matches:
             offer = self.active_offers.pop(match.exchange)
-            self.db.delete_active_offer(offer.hash())
+            self.db.delete_active_offer(offer)
 
             self.matched_offers[offer.hash()] = (offer, match, block_timestamp)
             self.db.put_matched_offer(offer.hash(), offer, match, block_timestamp)
@@ -260,17 +689,11 @@ class State:
             utxo1 = (offer.hash(), offer.deposit_index)
             utxo2 = (acceptance.hash(), acceptance.deposit_index)
 
-            dutxo1 = self.dutxos.pop(utxo1)
-            self.db.delete_dutxo(*utxo1)
+            dutxo1 = self._pop_dutxo(utxo1)
+            dutxo2 = self._pop_dutxo(utxo2)
 
-            dutxo2 = self.dutxos.pop(utxo2)
-            self.db.delete_dutxo(*utxo2)
-
-            self.utxos[utxo1] = dutxo1
-            self.db.put_utxo(*utxo1, output=dutxo1)
-
-            self.utxos[utxo2] = dutxo2
-            self.db.put_utxo(*utxo2, output=dutxo2)
+            self._put_utxo(utxo1, dutxo1)
+            self._put_utxo(utxo2, dutxo2)
 
         for tx in unlocks:
             (offer, acceptance, _timestamp) = self.matched_offers.pop(tx.exchange)
@@ -279,85 +702,251 @@ class State:
             utxo1 = (offer.hash(), offer.deposit_index)
             utxo2 = (acceptance.hash(), acceptance.deposit_index)
 
-            dutxo1 = self.dutxos.pop(utxo1)
-            self.db.delete_dutxo(*utxo1)
-
-            dutxo2 = self.dutxos.pop(utxo2)
-            self.db.delete_dutxo(*utxo2)
+            dutxo1 = self._pop_dutxo(utxo1)
+            dutxo2 = self._pop_dutxo(utxo2)
 
             if tx.proof_side == 0:
-                self.utxos[utxo1] = dutxo1
-                self.db.put_utxo(*utxo1, output=dutxo1)
+                self._put_utxo(utxo1, dutxo1)
             else:
-                self.utxos[utxo2] = dutxo2
-                self.db.put_utxo(*utxo2, output=dutxo2)
+                self._put_utxo(utxo2, dutxo2)
+
+    def _clean_timeouted_offers(self, timestamp, new_offers=()):
+        """
+        Expires active offers which timed out before the timestamp of the chain tip, their deposits are returned
+
+        :param new_offers: offers of the block being applied, they are not in the database index yet
+        :return: set of hashes of the expired offers
+        """
+        timeouted = list(self.db.iter_timeouted_offers(timestamp))
+        timeouted.extend(offer.hash() for offer in new_offers if offer.timeout < timestamp)
 
-    def _clean_timeouted_offers(self):
-        last_block_timestamp = self.get_block_by_no(self.current_height).timestamp
+        expired = set()
+        for tx_hash in timeouted:
+            # NOTE: offers matched by the block being applied are still in the database index
+            offer = self.active_offers.pop(tx_hash, None)
+            if offer is None:
+                continue
+            self.db.delete_active_offer(offer)
+            expired.add(tx_hash)
 
-        for tx_hash, offer in self.active_offers.items():
-            if offer.timeout < last_block_timestamp:
-                self.active_offers.pop(tx_hash)
-                self.db.delete_active_offer(tx_hash)
+            deposit = (tx_hash, offer.deposit_index)
+            self._put_utxo(deposit, self._pop_dutxo(deposit))
 
-                v = self.dutxos.pop((tx_hash, offer.deposit_index))
-                self.db.delete_dutxo((tx_hash, offer.deposit_index))
+        return expired
 
-                self.utxos[(tx_hash, offer.deposit_index)] = v
-                self.db.put_utxo(tx_hash, offer.deposit_index, v)
+    def _put_utxo(self, txo, output):
+        self.utxos[txo] = output
+        self.db.put_utxo(*txo, output=output)
 
-    def _build_tx_indices(self, block, block_hash):
+        address = self._add_to_address_index(self.address_utxos, txo, output)
+        if address is not None:
+            self._update_balance(address, output.value)
+            self.db.put_address_utxo(address, *txo)
+
+    def _pop_utxo(self, txo):
+        output = self.utxos.pop(txo)
+        self.db.delete_utxo(*txo)
+
+        address = self._remove_from_address_index(self.address_utxos, txo, output)
+        if address is not None:
+            self._update_balance(address, -output.value)
+            self.db.delete_address_utxo(address, *txo)
+
+        return output
+
+    def _put_dutxo(self, txo, output):
+        self.dutxos[txo] = output
+        self.db.put_dutxo(*txo, output=output)
+
+        address = self._add_to_address_index(self.address_dutxos, txo, output)
+        if address is not None:
+            self.db.put_address_dutxo(address, *txo)
+
+    def _pop_dutxo(self, txo):
+        output = self.dutxos.pop(txo)
+        self.db.delete_dutxo(*txo)
+
+        address = self._remove_from_address_index(self.address_dutxos, txo, output)
+        if address is not None:
+            self.db.delete_address_dutxo(address, *txo)
+
+        return output
+
+    @staticmethod
+    def _add_to_address_index(index, txo, output):
+        address = getattr(output, 'receiver', None)
+        if address is not None:
+            index[address] = index.get(address, frozenset()) | {txo}
+        return address
+
+    @staticmethod
+    def _remove_from_address_index(index, txo, output):
+        address = getattr(output, 'receiver', None)
+        if address is not None:
+            txos = index[address] - {txo}
+            if txos:
+                index[address] = txos
+            else:
+                index.pop(address)
+        return address
+
+    def _update_balance(self, address, change):
+        balance = self.balances.get(address, 0) + change
+        if address in self.address_utxos:
+            self.balances[address] = balance
+            self.db.put_balance(address, balance)
+        else:
+            self.balances.pop(address, None)
+            self.db.delete_balance(address)
+
+    def _apply_tx_indices(self, block, block_hash):
+        indexed = set()
 
         for tx, i in zip(block.transactions, range(len(block.transactions))):
-            if tx.hash() in self.tx_indices:
-                raise TxOverwriteError(tx.hash())
-            self.tx_indices[tx.hash()] = (block_hash, i)
+            tx_hash = tx.hash()
+            if tx_hash in indexed or self.db.get_tx_index(tx_hash) is not None:
+                raise TxOverwriteError(tx_hash)
+            indexed.add(tx_hash)
+            self.db.put_tx_index(tx_hash, block_hash, i)
 
 
 class _PendingTxsQueue:
-    def __init__(self, maxlen, elements=None):
-        self.free_indices = queue.Queue(maxsize=maxlen)
-        self.priority_queue = DEPQ(maxlen=maxlen)
+    """
+    Bounded queue of pending transactions ordered by priority, FIFO within a priority.
 
-        indices = [i for i in range(maxlen)]
+    Transactions are numbered in the order they are pushed, the numbers key them in the database,
+    so the order survives restarts. Two heaps keep the first (highest priority, oldest) and the last
+    (lowest priority, newest) transaction, removed entries are skipped lazily when they reach
+    the top of a heap. Pushing, popping and evicting cost O(log n), removing costs O(1) per transaction.
+    """
 
-        if elements is not None:
-            for index, priority, tx in elements:
-                indices.remove(index)
-                self.free_indices.put_nowait(index)
-                self.push(tx, priority)
+    def __init__(self, maxlen, elements=None):
+        """
+        :param elements: (sequence number, priority, tx) tuples restored from the database
+        """
+        self.maxlen = maxlen
+        self._entries = {}  # sequence number -> (priority, tx)
+        self._sequences = {}  # tx hash -> sequence number
 
-        for i in indices:
-            self.free_indices.put_nowait(i)
+        for sequence, priority, tx in elements or ():
+            self._entries[sequence] = (priority, tx)
+            self._sequences[tx.hash()] = sequence
 
-    def push(self, tx, priority):
-        if self.priority_queue.size() == self.priority_queue.maxlen:
-            if self.priority_queue.low() < priority:
-                index, _ = self.priority_queue.last()
-                self.free_indices.put_nowait(index)
-            else:
-                raise queue.Full
+        self._next_sequence = max(self._entries, default=-1) + 1
+        self._rebuild_heaps()
 
-        index = self.free_indices.get_nowait()
-        self.priority_queue.insert((index, tx), priority)
-        return index
+    def push(self, tx, priority):
+        """
+        Inserts a transaction, evicting the one with the lowest priority when the queue is full
+
+        :raise queue.Full: when the queue is full of transactions of the same or higher priority
+        :return: (sequence number, evicted (sequence number, tx) tuple or None) tuple
+        """
+        evicted = self.get_evicted(priority)
+        if evicted is not None:
+            self._pop_entry(evicted[0])
+
+        sequence = self._next_sequence
+        self._next_sequence += 1
+
+        self._entries[sequence] = (priority, tx)
+        self._sequences[tx.hash()] = sequence
+        heapq.heappush(self._first, (-priority, sequence))
+        heapq.heappush(self._last, (priority, -sequence))
+
+        return sequence, evicted
+
+    def get_evicted(self, priority):
+        """
+        :raise queue.Full: when the queue is full of transactions of the same or higher priority
+        :return: (sequence number, tx) tuple of the transaction :func: `push` would evict for one of the priority,
+                 None when the queue is not full
+        """
+        if len(self._entries) < self.maxlen:
+            return None
+
+        lowest = self._peek(self._last)
+        if lowest is None or self._entries[lowest][0] >= priority:
+            raise queue.Full
+        return lowest, self._entries[lowest][1]
 
     def pop(self):
-        if self.is_empty():
+        """
+        :raise queue.Empty: when there are no transactions
+        :return: (sequence number, tx) tuple of the transaction with the highest priority
+        """
+        sequence = self._peek(self._first)
+        if sequence is None:
             raise queue.Empty
 
-        (index, tx), _ = self.priority_queue.popfirst()
-        self.free_indices.put_nowait(index)
+        return sequence, self._pop_entry(sequence)
 
-        return index, tx
+    def remove(self, tx_hashes):
+        """
+        :return: list of the removed (sequence number, tx) tuples
+        """
+        removed = []
+        for tx_hash in tx_hashes:
+            sequence = self._sequences.get(tx_hash)
+            if sequence is not None:
+                removed.append((sequence, self._pop_entry(sequence)))
+
+        return removed
 
     def is_empty(self):
-        return self.priority_queue.is_empty()
+        return not self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        """
+        :return: generator of (sequence number, tx) tuples in the order :func: `pop` would return them
+        """
+        ordered = sorted((-priority, sequence) for sequence, (priority, _tx) in self._entries.items())
+        return ((sequence, self._entries[sequence][1]) for _priority, sequence in ordered)
+
+    def _peek(self, heap):
+        """
+        :return: sequence number of the top entry of the heap, None if empty
+        """
+        while heap:
+            sequence = abs(heap[0][1])
+            if sequence in self._entries:
+                return sequence
+            heapq.heappop(heap)
+        return None
+
+    def _pop_entry(self, sequence):
+        _priority, tx = self._entries.pop(sequence)
+        if self._sequences.get(tx.hash()) == sequence:
+            self._sequences.pop(tx.hash())
+
+        # NOTE: popping skips removed entries of the first heap only, evicting of the last one only
+        if max(len(self._first), len(self._last)) > 2 * len(self._entries) + 64:
+            self._rebuild_heaps()
+
+        return tx
+
+    def _rebuild_heaps(self):
+        """
+        Drops the removed entries from the heaps, so they stay proportional to the number of transactions
+        """
+        self._first = [(-priority, sequence) for sequence, (priority, _tx) in self._entries.items()]
+        self._last = [(priority, -sequence) for sequence, (priority, _tx) in self._entries.items()]
+        heapq.heapify(self._first)
+        heapq.heapify(self._last)
 
 
 class _DBTransaction:
-    def __init__(self, state):
+    def __init__(self, state, reload_on_failure=True, mempool_only=False):
+        """
+        :param mempool_only: the transaction changes only the mempool, so only the mempool is reloaded on failure
+                             and no new version of the chain state is published
+        """
         self.associated_state = state
+        self.reload_on_failure = reload_on_failure
+        self.mempool_only = mempool_only
 
     def __enter__(self):
         self.associated_state.db.start_transaction()
@@ -365,6 +954,14 @@ class _DBTransaction:
     def __exit__(self, exc_type, exc_val, exc_tb):
         if exc_type is not None:
             self.associated_state.db.dismiss_transaction()
-            self.associated_state.reload()
-        else:
+            if self.reload_on_failure:
+                if self.mempool_only:
+                    self.associated_state._reload_mempool()
+                else:
+                    self.associated_state.reload()
+        elif self.mempool_only:
             self.associated_state.db.execute_transaction()
+        else:
+            with self.associated_state._chain_lock.write():
+                self.associated_state.db.execute_transaction()
+                self.associated_state._publish_versions()
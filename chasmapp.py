@@ -5,6 +5,7 @@ import argparse
 from chasm.consensus.mining.miner_service import MinerService
 from chasm.maintenance.config import Config, DEFAULT_CONFIG_FILE
 from chasm.maintenance.logger import Logger
+from chasm.rpc.async_node import AsyncRPCServerService
 from chasm.rpc.node import RPCServerService
 from chasm.services_manager import LazyService, ServicesManager
 from chasm.state.service import StateService
@@ -48,9 +49,11 @@ def main():
 
     Logger.level = config.get('logger_level')
 
+    rpc_service = AsyncRPCServerService if config.get('rpc_server') == 'async' else RPCServerService
+
     services = [
         LazyService('state', StateService, dev=args.dev, config=config),
-        LazyService('rpc_server', RPCServerService, config=config, required_services=['state']),
+        LazyService('rpc_server', rpc_service, config=config, required_services=['state']),
         LazyService('miner', MinerService, dev=args.dev, config=config, required_services=['state'])
     ]
 
@@ -0,0 +1,148 @@
+import time
+
+import pytest
+from pytest import fixture
+
+from chasm import consensus
+from chasm.consensus import GENESIS_BLOCK, Block
+from chasm.consensus.mining.block_builder import BlockBuilder
+from chasm.consensus.primitives.transaction import SignedTransaction, Transaction
+from chasm.consensus.primitives.tx_input import TxInput
+from chasm.consensus.primitives.tx_output import TransferOutput
+from chasm.consensus.validation import block_validator
+from chasm.consensus.validation.block_validator import BlockStatelessValidator
+from chasm.serialization.rlp_serializer import RLPSerializer
+
+
+class _MempoolState:
+    """
+    Lightweight stand-in for the state, holds only UTXOs and pending transactions
+    """
+
+    def __init__(self, utxos, pending_txs):
+        self.current_height = 0
+        self._utxos = utxos
+        self._pending_txs = list(pending_txs)
+
+    def get_block_by_no(self, _height):
+        return GENESIS_BLOCK
+
+    def get_utxos(self):
+        return self._utxos
+
+    def get_pending_txs(self):
+        return list(self._pending_txs)
+
+    def remove_pending_txs(self, tx_hashes):
+        tx_hashes = set(tx_hashes)
+        self._pending_txs = [tx for tx in self._pending_txs if tx.hash() not in tx_hashes]
+
+
+def _utxo(i):
+    return consensus.HASH_FUNC(i.to_bytes(4, byteorder='big')).digest(), 0
+
+
+def _tx(inputs, value, receiver):
+    tx = Transaction(inputs=[TxInput(*utxo) for utxo in inputs], outputs=[TransferOutput(value, receiver)])
+    return SignedTransaction(tx, [bytes(64)])
+
+
+def _mempool_state(txs_no, receiver, fee=lambda i: 10):
+    utxos, txs = {}, []
+    for i in range(txs_no):
+        utxos[_utxo(i)] = TransferOutput(100, receiver)
+        txs.append(_tx([_utxo(i)], 100 - fee(i), receiver))
+
+    return _MempoolState(utxos, txs)
+
+
+@fixture
+def block_fitting(monkeypatch, alice):
+    """
+    Limits size of the block to hold the minting transaction and the given number of transactions from the mempool
+    """
+
+    def limit(state, txs_no):
+        full_state = _MempoolState(state.get_utxos(), state.get_pending_txs()[:txs_no])
+        size = _encoded_len(BlockBuilder(full_state, alice.pub).build_block())
+        monkeypatch.setattr(block_validator, 'MAX_BLOCK_SIZE', size)
+
+    return limit
+
+
+def _encoded_len(block):
+    block.header.set_nonce(2 ** 64 - 1)
+    return len(RLPSerializer().encode(block))
+
+
+def test_fills_block_up_to_size_limit(alice):
+    state = _mempool_state(6000, alice.pub)
+
+    block = BlockBuilder(state, alice.pub).build_block()
+
+    assert 1 < len(block.transactions) < 6000
+    assert _encoded_len(block) <= Block.MAX_BLOCK_SIZE
+
+    next_tx = RLPSerializer().encode(state.get_pending_txs()[0])
+    assert _encoded_len(block) + len(next_tx) > Block.MAX_BLOCK_SIZE
+
+    fees = 10 * (len(block.transactions) - 1)
+    assert BlockStatelessValidator.get_minting_value(1) + fees == block.transactions[0].outputs[0].value
+
+
+def test_takes_all_pending_txs_which_fit(alice):
+    state = _mempool_state(10, alice.pub)
+
+    builder = BlockBuilder(state, alice.pub)
+    block = builder.build_block()
+
+    assert 11 == len(block.transactions)
+    assert 10 == len(state.get_pending_txs())
+    assert 100 == builder.last_fees
+    assert builder.last_build_time > 0
+
+
+def test_prefers_transactions_paying_more_per_byte(alice, block_fitting):
+    state = _mempool_state(10, alice.pub, fee=lambda i: i + 1)
+    block_fitting(state, 3)
+
+    block = BlockBuilder(state, alice.pub).build_block()
+
+    assert [10, 9, 8] == [100 - tx.outputs[0].value for tx in block.transactions[1:]]
+    assert 10 == len(state.get_pending_txs())
+
+
+def test_selects_parents_together_with_well_paying_children(alice, block_fitting):
+    state = _mempool_state(3, alice.pub, fee=lambda i: [1, 20, 30][i])
+    parent = state.get_pending_txs()[0]
+    child = _tx([(parent.hash(), 0)], 1, alice.pub)
+    state._pending_txs.insert(0, child)
+    block_fitting(state, 2)
+
+    block = BlockBuilder(state, alice.pub).build_block()
+
+    assert [parent, child] == block.transactions[1:]
+
+
+def test_drops_transactions_which_can_never_be_valid(alice):
+    state = _mempool_state(2, alice.pub)
+    orphan = _tx([_utxo(100)], 1, alice.pub)
+    orphan_child = _tx([(orphan.hash(), 0)], 1, alice.pub)
+    state._pending_txs += [orphan, orphan_child]
+
+    block = BlockBuilder(state, alice.pub).build_block()
+
+    assert 3 == len(block.transactions)
+    assert block.transactions[1:] == state.get_pending_txs()
+
+
+@pytest.mark.benchmark
+def test_benchmark_fills_block_from_large_mempool(alice):
+    state = _mempool_state(10000, alice.pub)
+
+    started = time.perf_counter()
+    block = BlockBuilder(state, alice.pub).build_block()
+    elapsed = time.perf_counter() - started
+
+    print(f'\nbuilt a block with {len(block.transactions)} transactions in {elapsed:.3f}s')
+    assert _encoded_len(block) <= Block.MAX_BLOCK_SIZE
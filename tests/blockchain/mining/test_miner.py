@@ -0,0 +1,89 @@
+import time
+
+import pytest
+from pytest import fixture
+
+from chasm.consensus import Block
+from chasm.consensus.mining.miner import MiningPool, HeaderTemplate, Miner
+from chasm.consensus.validation.block_validator import BlockStatelessValidator
+
+
+@fixture(scope="module")
+def pool():
+    pool = MiningPool(workers=2, step=100)
+    pool.start()
+    yield pool
+    pool.stop()
+
+
+def _header(difficulty):
+    return Block(previous_block_hash=bytes(32), difficulty=difficulty, merkle_root=bytes(32)).header
+
+
+@pytest.mark.parametrize("nonce", [0, 1, 127, 128, 255, 256, 2 ** 16, 2 ** 32 - 1, 2 ** 63, 2 ** 64 - 1])
+@pytest.mark.parametrize("merkle_root", [b'', bytes(32)])
+def test_template_hash_matches_header_hash(nonce, merkle_root):
+    header = Block(previous_block_hash=bytes(range(32)), difficulty=20, merkle_root=merkle_root).header
+    template = HeaderTemplate(header)
+
+    header.set_nonce(nonce)
+    assert header.hash() == template.hash(nonce)
+
+
+def test_miner_finds_the_first_matching_nonce():
+    header = _header(difficulty=8)
+
+    miner = Miner(header)
+    miner.check_nonce_in_range(range(10 ** 6))
+
+    expected = next(nonce for nonce in range(10 ** 6)
+                    if BlockStatelessValidator.check_block_hash(_with_nonce(header, nonce).hash(), 8))
+    assert expected == miner.result
+
+
+def _with_nonce(header, nonce):
+    header.set_nonce(nonce)
+    return header
+
+
+def _hashrate(hash_nonce, nonces):
+    started = time.perf_counter()
+    for nonce in nonces:
+        hash_nonce(nonce)
+    return len(nonces) / (time.perf_counter() - started)
+
+
+@pytest.mark.benchmark
+def test_benchmark_template_hashrate():
+    header = _header(difficulty=20)
+    template = HeaderTemplate(header)
+    nonces = range(10 ** 6, 10 ** 6 + 20000)
+
+    header_hashrate = _hashrate(lambda nonce: _with_nonce(header, nonce).hash(), nonces)
+    template_hashrate = _hashrate(template.hash, nonces)
+
+    print(f'\nheader: {header_hashrate:.0f} H/s, template: {template_hashrate:.0f} H/s, '
+          f'gain: {template_hashrate / header_hashrate:.1f}x')
+    assert template_hashrate > header_hashrate
+
+
+def test_finds_nonce(pool):
+    header = _header(difficulty=10)
+
+    nonce = pool.mine(header, lambda: False)
+
+    assert nonce is not None
+    assert header.nonce == 0
+    header.set_nonce(nonce)
+    assert BlockStatelessValidator.check_block_hash(header.hash(), header.difficulty)
+
+
+def test_abandons_search_when_exit_condition_fires(pool):
+    deadline = time.monotonic() + 0.5
+
+    started = time.monotonic()
+    assert pool.mine(_header(difficulty=255), lambda: time.monotonic() > deadline) is None
+    assert time.monotonic() - started < 2
+    assert pool.hashrate > 0
+
+    assert pool.mine(_header(difficulty=8), lambda: False) is not None
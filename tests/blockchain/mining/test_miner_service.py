@@ -0,0 +1,128 @@
+# pylint: disable=missing-docstring,redefined-outer-name,protected-access
+import os
+import shutil
+
+from pytest import fixture
+
+from chasm.consensus.mining import miner_service as miner_service_module
+from chasm.consensus.mining.block_builder import BlockBuilder
+from chasm.consensus.mining.miner_service import MinerService
+from chasm.consensus.primitives.transaction import SignedTransaction, Transaction
+from chasm.consensus.primitives.tx_input import TxInput
+from chasm.consensus.primitives.tx_output import TransferOutput
+from chasm.maintenance.config import Config, DEFAULT_CONFIG_FILE, DEFAULT_CONFIG_DIR
+from chasm.maintenance.exceptions import BlockMintingError
+from chasm.maintenance.logger import Logger
+from chasm.state.service import StateService
+
+FEE_THRESHOLD = 100
+
+
+@fixture
+def state_service(config):
+    shutil.rmtree(os.path.join(config.get('datadir'), 'db'), ignore_errors=True)
+
+    service = StateService(config, dev=True)
+    service.start(lambda: False)
+    yield service
+
+    service.stop()
+    shutil.rmtree(os.path.join(config.get('datadir'), 'db'))
+
+
+@fixture
+def miner_service(state_service, monkeypatch):
+    monkeypatch.setattr(Logger, 'level', 'WARNING')
+    config = Config([DEFAULT_CONFIG_FILE, os.path.join(DEFAULT_CONFIG_DIR, 'dev.ini')],
+                    overridden={'xpeer_miner_rebuild_fee_threshold': FEE_THRESHOLD})
+
+    service = MinerService(state_service, config, dev=True)
+    state_service.subscribe(service._on_state_event)
+    yield service
+
+    state_service.unsubscribe(service._on_state_event)
+
+
+def _transfers(state_service, entity, fees):
+    block = BlockBuilder(state_service, entity.pub, dev=True).build_block()
+    state_service.apply_block(block)
+
+    minted = block.transactions[0]
+    return [SignedTransaction.build_signed(
+        Transaction([TxInput(minted.hash(), 0)], [TransferOutput(minted.outputs[0].value - fee, entity.pub)]),
+        [entity.priv]) for fee in fees]
+
+
+def test_abandons_template_when_chain_tip_changes(miner_service, state_service, alice):
+    miner_service._reset_template_state()
+    assert not miner_service._is_template_stale()
+
+    state_service.apply_block(BlockBuilder(state_service, alice.pub, dev=True).build_block())
+
+    assert miner_service._is_template_stale()
+    miner_service._reset_template_state()
+    assert not miner_service._is_template_stale()
+
+
+def test_abandons_template_once_new_transactions_pay_threshold_in_fees(miner_service, state_service, alice):
+    txs = [_transfers(state_service, alice, [FEE_THRESHOLD // 2])[0] for _ in range(2)]
+    miner_service._reset_template_state()
+    miner_service._discount_included_txs(BlockBuilder(state_service, alice.pub, dev=True).build_block())
+
+    state_service.add_pending_tx(txs[0])
+    assert not miner_service._is_template_stale()
+
+    state_service.add_pending_tx(txs[1])
+    assert miner_service._is_template_stale()
+
+
+def test_does_not_count_transactions_included_in_the_template(miner_service, state_service, alice, monkeypatch):
+    included, arrived_later = [_transfers(state_service, alice, [FEE_THRESHOLD])[0] for _ in range(2)]
+    miner_service._reset_template_state()
+
+    builder = BlockBuilder(state_service, alice.pub, dev=True)
+    build_block = builder.build_block
+
+    def _build_block_while_tx_arrives():
+        state_service.add_pending_tx(included)
+        return build_block()
+
+    monkeypatch.setattr(builder, 'build_block', _build_block_while_tx_arrives)
+    block = builder.build_block()
+    miner_service._discount_included_txs(block)
+
+    assert included.hash() in [tx.hash() for tx in block.transactions]
+    assert not miner_service._is_template_stale()
+
+    state_service.add_pending_tx(arrived_later)
+    assert miner_service._is_template_stale()
+
+
+def test_drops_invalid_transactions_of_block_which_fails_to_apply(miner_service, state_service, alice):
+    valid, conflicting = _transfers(state_service, alice, [10, 20])
+    state_service.add_pending_tx(valid)
+    block = BlockBuilder(state_service, alice.pub, dev=True).build_block()
+    assert [valid] == state_service.get_pending_txs()
+
+    block.transactions.append(conflicting)
+    miner_service._revalidate_transactions(block)
+
+    assert [valid] == state_service.get_pending_txs()
+
+
+def test_keeps_transactions_of_block_which_fails_to_apply(miner_service, state_service, alice, monkeypatch):
+    tx, = _transfers(state_service, alice, [10])
+    state_service.add_pending_tx(tx)
+
+    def _apply_block(_block):
+        raise BlockMintingError('rejected')
+
+    exit_checks = iter([False, True])
+    monkeypatch.setattr(miner_service_module.time, 'sleep', lambda _seconds: None)
+    monkeypatch.setattr(state_service, 'apply_block', _apply_block)
+    miner_service._builder = BlockBuilder(state_service, alice.pub, dev=True)
+    miner_service._exit_condition = lambda: next(exit_checks)
+
+    miner_service()
+
+    assert [tx] == state_service.get_pending_txs()
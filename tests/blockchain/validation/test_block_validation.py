@@ -0,0 +1,141 @@
+# pylint: disable=missing-docstring,redefined-outer-name,invalid-name
+import time
+
+from ecdsa import BadSignatureError
+from pytest import fixture, raises, mark
+
+from chasm.consensus import Block, GENESIS_BLOCK
+from chasm.consensus.primitives.transaction import Transaction, SignedTransaction, MintingTransaction, \
+    OfferTransaction, MatchTransaction, UnlockingDepositTransaction
+from chasm.consensus.primitives.tx_input import TxInput
+from chasm.consensus.primitives.tx_output import TransferOutput, XpeerFeeOutput
+from chasm.consensus.tokens import Tokens
+from chasm.consensus.validation.block_validator import BlockValidator, BlockStatelessValidator
+from chasm.consensus.validation.signature_verifier import SignatureVerifier, PARALLEL_BATCH_SIZE
+from chasm.maintenance.exceptions import BlockMintingError, NonexistentUTXO, MatchNonExistentOfferError, \
+    BlockUnlockError
+
+HEIGHT = 5
+
+
+@fixture
+def utxos(alice):
+    return {(i.to_bytes(32, byteorder='big'), 0): TransferOutput(100, alice.pub) for i in range(4)}
+
+
+@fixture
+def validator(utxos):
+    def _get_validator():
+        return BlockValidator(utxos, {}, {}, GENESIS_BLOCK.header, GENESIS_BLOCK.header, HEIGHT, dev=True)
+
+    return _get_validator
+
+
+def _transfer(entity, tx_hash, value, receiver, output_no=0):
+    tx = Transaction([TxInput(tx_hash, output_no)], [TransferOutput(value, receiver)])
+    return SignedTransaction.build_signed(tx, [entity.priv])
+
+
+def _block(txs, minted_value=0, receiver=bytes(64)):
+    minting_tx = MintingTransaction([TransferOutput(minted_value, receiver)], HEIGHT)
+    return Block(bytes(32), 0, transactions=[minting_tx] + txs)
+
+
+def test_validates_transactions_in_stages(validator, alice, bob):
+    v = validator()
+    parent = _transfer(alice, bytes(32), 90, bob.pub)
+    child = _transfer(bob, parent.hash(), 80, alice.pub)
+
+    v.check_all_transactions(_block([parent, child], BlockStatelessValidator.get_minting_value(HEIGHT + 1) + 20))
+
+    assert ['signatures', 'stateful', 'stateless'] == sorted(v.timings)
+
+
+def test_rejects_double_spends(validator, alice, bob):
+    block = _block([_transfer(alice, bytes(32), 90, bob.pub), _transfer(alice, bytes(32), 80, alice.pub)])
+
+    with raises(NonexistentUTXO):
+        validator().check_all_transactions(block)
+
+
+def test_rejects_invalid_signatures(validator, bob):
+    with raises(BadSignatureError):
+        validator().check_all_transactions(_block([_transfer(bob, bytes(32), 90, bob.pub)]))
+
+
+def test_rejects_minting_more_than_reward_and_fees(validator, alice, bob):
+    minted_value = BlockStatelessValidator.get_minting_value(HEIGHT + 1) + 11
+    block = _block([_transfer(alice, bytes(32), 90, bob.pub)], minted_value)
+
+    with raises(BlockMintingError):
+        validator().check_all_transactions(block)
+
+
+def test_rejects_blocks_without_minting_transaction(validator, alice, bob):
+    block = Block(bytes(32), 0, transactions=[_transfer(alice, bytes(32), 90, bob.pub)])
+
+    with raises(BlockMintingError):
+        validator().check_all_transactions(block)
+
+
+def test_rejects_minting_transaction_of_other_height(validator):
+    block = Block(bytes(32), 0, transactions=[MintingTransaction([TransferOutput(1, bytes(64))], HEIGHT + 1)])
+
+    with raises(BlockMintingError):
+        validator().check_all_transactions(block)
+
+
+def _offer(entity, timeout):
+    return OfferTransaction([TxInput(bytes(32), 1)], [XpeerFeeOutput(50), TransferOutput(100, entity.pub)],
+                            token_in=Tokens.XPEER.value, token_out=Tokens.XPEER.value, value_in=1, value_out=2,
+                            address_out=entity.pub, confirmation_fee_index=0, deposit_index=1, timeout=timeout)
+
+
+def _validator_with_offer(utxos, offer):
+    last_block = Block(bytes(32), 0, timestamp=1000)
+    return BlockValidator(utxos, {offer.hash(): offer}, {}, last_block.header, last_block.header, HEIGHT, dev=True)
+
+
+def test_expires_offers_timed_out_before_last_block(utxos, alice, bob):
+    offer = _offer(alice, timeout=999)
+    match = SignedTransaction.build_signed(MatchTransaction(
+        [TxInput(bytes(32), 0)], [XpeerFeeOutput(50), TransferOutput(50, bob.pub)], exchange=offer.hash(),
+        address_in=bob.pub, confirmation_fee_index=0, deposit_index=1), [alice.priv])
+
+    with raises(MatchNonExistentOfferError):
+        _validator_with_offer(utxos, offer).check_all_transactions(_block([match]))
+
+    refund = _transfer(alice, offer.hash(), 100, alice.pub, output_no=1)
+    _validator_with_offer(utxos, offer).check_all_transactions(_block([refund]))
+
+
+def test_rejects_unlocking_deposits_of_unmatched_offer(utxos, alice):
+    offer = _offer(alice, timeout=1000)
+    unlock = SignedTransaction.build_signed(UnlockingDepositTransaction(
+        [TxInput(bytes(32), 0)], [TransferOutput(100, alice.pub)], exchange=offer.hash(), proof_side=0,
+        tx_proof=offer.hash()), [alice.priv])
+
+    with raises(BlockUnlockError):
+        _validator_with_offer(utxos, offer).check_all_transactions(_block([unlock]))
+
+
+@mark.benchmark
+def test_benchmark_validates_large_block(alice, bob):
+    txs_no = 400
+    utxos = {(i.to_bytes(32, byteorder='big'), 0): TransferOutput(100, alice.pub) for i in range(txs_no)}
+    block = _block([_transfer(alice, i.to_bytes(32, byteorder='big'), 99, bob.pub) for i in range(txs_no)])
+
+    for workers in [0, 4]:
+        verifier = SignatureVerifier(workers=workers)
+        if workers:  # starts the workers
+            verifier.verify_batch([(alice.pub, bytes(64), b'warm up', None)] * PARALLEL_BATCH_SIZE)
+        validator = BlockValidator(utxos, {}, {}, GENESIS_BLOCK.header, GENESIS_BLOCK.header, HEIGHT, dev=True,
+                                   signature_verifier=verifier)
+
+        started = time.perf_counter()
+        validator.check_all_transactions(block)
+        elapsed = time.perf_counter() - started
+        verifier.close()
+
+        timings = ', '.join(f'{stage}: {duration:.3f}s' for stage, duration in validator.timings.items())
+        print(f'\nworkers: {workers}, {txs_no} transactions in {elapsed:.3f}s ({timings})')
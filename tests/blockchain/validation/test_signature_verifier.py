@@ -0,0 +1,104 @@
+# pylint: disable=missing-docstring,redefined-outer-name,invalid-name
+import time
+
+from ecdsa import BadSignatureError
+from pytest import fixture, raises, mark
+
+from chasm.consensus.primitives.transaction import Transaction, SignedTransaction
+from chasm.consensus.primitives.tx_input import TxInput
+from chasm.consensus.primitives.tx_output import TransferOutput
+from chasm.consensus.validation import signature_verifier
+from chasm.consensus.validation.signature_verifier import SignatureVerifier
+from chasm.consensus.validation.tx_validator import TxValidator
+
+
+def _sign(entity, message):
+    return SignedTransaction.build_signed(message, [entity.priv]).signatures[0]
+
+
+@fixture
+def transaction(alice):
+    return Transaction([TxInput(bytes(32), 0)], [TransferOutput(100, alice.pub)])
+
+
+def test_caches_verified_signatures(alice, transaction, monkeypatch):
+    verifier = SignatureVerifier()
+    signature = _sign(alice, transaction)
+    assert verifier.verify(alice.pub, signature, transaction.encoded, transaction.hash())
+
+    monkeypatch.setattr(SignatureVerifier, '_get_key', None)
+    assert verifier.verify(alice.pub, signature, transaction.encoded, transaction.hash())
+    assert verifier.verify(alice.pub, signature, transaction.encoded)
+
+
+def test_does_not_cache_invalid_signatures(alice, bob, transaction):
+    verifier = SignatureVerifier()
+    signature = _sign(bob, transaction)
+
+    for _ in range(2):
+        with raises(BadSignatureError):
+            verifier.verify(alice.pub, signature, transaction.encoded)
+
+
+def test_evicts_least_recently_verified_signatures(alice, bob, transaction):
+    verifier = SignatureVerifier(cache_size=1)
+    verifier.verify(alice.pub, _sign(alice, transaction), transaction.encoded)
+    verifier.verify(bob.pub, _sign(bob, transaction), transaction.encoded)
+
+    assert 1 == len(verifier._verified)
+
+
+@mark.parametrize('workers', [0, 2])
+def test_verifies_batches(alice, bob, transaction, workers, monkeypatch):
+    monkeypatch.setattr(signature_verifier, 'PARALLEL_BATCH_SIZE', 1)
+    verifier = SignatureVerifier(workers=workers)
+    message = transaction.encoded
+
+    try:
+        results = verifier.verify_batch([(alice.pub, _sign(alice, transaction), message, None),
+                                         (alice.pub, _sign(bob, transaction), message, None),
+                                         (b'malformed', _sign(bob, transaction), message, None),
+                                         (bob.pub, _sign(bob, transaction), message, transaction.hash())])
+    finally:
+        verifier.close()
+
+    assert [True, False, False, True] == results
+    assert verifier.verify(bob.pub, _sign(bob, transaction), message)
+
+
+def test_verifies_signatures_of_transactions_ahead(alice, bob, transaction, monkeypatch):
+    child = Transaction([TxInput(transaction.hash(), 0)], [TransferOutput(90, bob.pub)])
+    signed_txs = [SignedTransaction.build_signed(transaction, [bob.priv]),
+                  SignedTransaction.build_signed(child, [alice.priv])]
+    utxos = {(bytes(32), 0): TransferOutput(100, bob.pub)}
+
+    validator = TxValidator(utxos, {}, {})
+    validator.verify_signatures(signed_txs)
+
+    monkeypatch.setattr(SignatureVerifier, '_get_key', None)
+    utxos[(transaction.hash(), 0)] = transaction.outputs[0]
+    for signed_tx in signed_txs:
+        assert validator.check_signatures(signed_tx.transaction, signed_tx.signatures)
+
+
+@mark.benchmark
+def test_benchmark_batch_verification(alice):
+    transactions = [Transaction([TxInput(i.to_bytes(32, byteorder='big'), 0)], [TransferOutput(i, alice.pub)])
+                    for i in range(200)]
+    requests = [(alice.pub, _sign(alice, tx), tx.encoded, tx.hash()) for tx in transactions]
+    warm_up_size = signature_verifier.PARALLEL_BATCH_SIZE
+    warm_up, requests = requests[:warm_up_size], requests[warm_up_size:]
+
+    for workers in [0, 4]:
+        verifier = SignatureVerifier(workers=workers)
+        verifier.verify_batch(warm_up)  # starts the workers
+        started = time.perf_counter()
+        assert all(verifier.verify_batch(requests))
+        elapsed = time.perf_counter() - started
+
+        started = time.perf_counter()
+        verifier.verify_batch(requests)
+        cached = time.perf_counter() - started
+        verifier.close()
+
+        print(f'\nworkers: {workers}, {len(requests) / elapsed:.0f} signatures/s, cached: {cached * 1000:.2f}ms')
@@ -3,7 +3,7 @@ import datetime
 import time
 
 from ecdsa import BadSignatureError
-from pytest import fixture, raises
+from pytest import fixture, raises, mark
 
 from chasm.consensus import Side
 from chasm.consensus.primitives.transaction import Transaction, SignedTransaction, OfferTransaction, \
@@ -12,6 +12,7 @@ from chasm.consensus.primitives.tx_input import TxInput
 from chasm.consensus.primitives.tx_output import TransferOutput, XpeerOutput, XpeerFeeOutput
 from chasm.consensus.tokens import Tokens
 from chasm.consensus.validation.tx_validator import TxValidator
+from chasm.consensus.validation.validator import Validator
 from chasm.maintenance.exceptions import DuplicatedInput, NonexistentUTXO, \
     InputOutputSumsException, SignaturesAmountException, TransactionSizeException, \
     UseXpeerFeeOutputAsInputException, NegativeOutput, OfferTimeoutBeforeNowError, \
@@ -165,12 +166,13 @@ def utxos_xpeer_output(exchange_side_inputs, alice, bob, xpeer_output):
 
 
 @fixture
-def too_much_signed_simple_transaction(signed_simple_transaction):
+def too_much_signed_simple_transaction(signed_simple_transaction, alice, bob, carol):
+    outputs = signed_simple_transaction.transaction.outputs
     for _ in range(13):
-        signed_simple_transaction.transaction.outputs.extend(
-            signed_simple_transaction.transaction.outputs.copy())
+        outputs = outputs + outputs
 
-    return signed_simple_transaction
+    return SignedTransaction.build_signed(Transaction(signed_simple_transaction.inputs, outputs),
+                                          [alice.priv, bob.priv, carol.priv])
 
 
 @fixture
@@ -857,3 +859,23 @@ def test_unlocking_sender_use_xpeer_output_after_timeout(validator, utxos_xpeer_
     ],
         simple_offer.hash(): []}). \
         validate(signed_tx)
+
+
+@mark.benchmark
+def test_benchmark_validation_overhead(validator, utxos, signed_simple_transaction, monkeypatch):
+    tx_validator = validator(utxos)
+    tx_validator.validate(signed_simple_transaction)  # signatures get cached, so only the overhead is measured
+    rounds = 2000
+
+    def _per_tx():
+        started = time.perf_counter()
+        for _ in range(rounds):
+            tx_validator.validate(signed_simple_transaction)
+        return (time.perf_counter() - started) / rounds * 10 ** 6
+
+    cached = _per_tx()
+    monkeypatch.setattr(Validator, '_get_plan',
+                        lambda self, skipped_checks: Validator._build_plan(self.__class__, skipped_checks))
+    uncached = _per_tx()
+
+    print(f'\nvalidation: {cached:.1f}us per tx with cached check plans, {uncached:.1f}us without')
@@ -0,0 +1,174 @@
+import http.client
+import json
+import os
+import shutil
+import socket
+import threading
+import time
+
+from pytest import fixture, mark
+
+from chasm.consensus.primitives.block import Block
+from chasm.consensus.primitives.transaction import SignedTransaction, Transaction, MintingTransaction
+from chasm.consensus.primitives.tx_input import TxInput
+from chasm.consensus.primitives.tx_output import TransferOutput
+from chasm.maintenance.config import Config, DEFAULT_CONFIG_FILE, DEFAULT_CONFIG_DIR
+from chasm.maintenance.logger import Logger
+from chasm.rpc.async_node import AsyncRPCServerService
+from chasm.rpc.node import RPCServerService
+from chasm.serialization.json_serializer import JSONSerializer
+from chasm.state.service import StateService
+
+
+def _config(**overridden):
+    return Config([DEFAULT_CONFIG_FILE, os.path.join(DEFAULT_CONFIG_DIR, 'dev.ini')], overridden=overridden)
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('localhost', 0))
+        return sock.getsockname()[1]
+
+
+def _payload(method, params=(), request_id=0):
+    return json.dumps({'jsonrpc': '2.0', 'id': request_id, 'method': method, 'params': list(params)})
+
+
+def _http_request(payload):
+    return (f'POST /jsonrpc HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n'
+            f'Content-Length: {len(payload)}\r\n\r\n{payload}').encode()
+
+
+def _read_response(stream):
+    """
+    :return: (status, body) tuple of a response read from the stream of a connection
+    """
+    status = int(stream.readline().split()[1])
+    headers = {}
+    for line in iter(stream.readline, b'\r\n'):
+        name, _, value = line.decode().partition(':')
+        headers[name.lower()] = value.strip()
+    return status, stream.read(int(headers['content-length']))
+
+
+@fixture
+def state_service(monkeypatch):
+    monkeypatch.setattr(Logger, 'level', 'WARNING')
+    config = _config(xpeer_pending_txs=1000)
+    shutil.rmtree(os.path.join(config.get('datadir'), 'db'), ignore_errors=True)
+
+    service = StateService(config, dev=True)
+    service.start(lambda: False)
+    yield service
+
+    service.stop()
+    shutil.rmtree(os.path.join(config.get('datadir'), 'db'))
+
+
+@fixture
+def start_server(state_service):
+    servers = []
+
+    def _start(service_class):
+        config = _config(rpc_port=_free_port())
+        server = service_class(state_service, config)
+        assert server.start(lambda: False)
+        servers.append(server)
+        return config.get('rpc_port')
+
+    yield _start
+
+    for server in servers:
+        server.stop()
+
+
+def test_keeps_connections_alive(start_server):
+    connection = http.client.HTTPConnection('localhost', start_server(AsyncRPCServerService))
+
+    sockets = set()
+    for i in range(3):
+        connection.request('POST', '/jsonrpc', _payload('hello', request_id=i))
+        response = connection.getresponse()
+        assert {'jsonrpc': '2.0', 'id': i, 'result': 'elho'} == json.loads(response.read())
+        sockets.add(connection.sock)
+
+    assert 1 == len(sockets)
+    connection.close()
+
+
+def test_answers_pipelined_requests_in_order(start_server):
+    with socket.create_connection(('localhost', start_server(AsyncRPCServerService))) as sock:
+        sock.sendall(b''.join(_http_request(_payload('hello', request_id=i)) for i in range(5)))
+
+        with sock.makefile('rb') as stream:
+            for i in range(5):
+                status, body = _read_response(stream)
+                assert (200, i) == (status, json.loads(body)['id'])
+
+
+def test_rejects_malformed_requests(start_server):
+    with socket.create_connection(('localhost', start_server(AsyncRPCServerService))) as sock:
+        sock.sendall(b'garbage\r\n\r\n')
+
+        with sock.makefile('rb') as stream:
+            assert (400, b'') == _read_response(stream)
+            assert b'' == stream.read()  # closed
+
+
+def _signed_transfers(state_service, entity, transfers_no):
+    minting_tx = MintingTransaction([TransferOutput(100, entity.pub)] * transfers_no, height=1)
+    block = Block(state_service.get_block_by_no(0).hash(), 0, transactions=[minting_tx])
+    state_service._state.apply_block(block)  # pylint: disable=protected-access
+
+    serializer = JSONSerializer()
+    return [serializer.encode(SignedTransaction.build_signed(
+        Transaction([TxInput(minting_tx.hash(), i)], [TransferOutput(99, entity.pub)]), [entity.priv]))
+        for i in range(transfers_no)]
+
+
+def _load(port, payloads, clients_no):
+    """
+    :return: (throughput, p99 latency) tuple
+    """
+    latencies, errors = [], []
+    chunks = [payloads[i::clients_no] for i in range(clients_no)]
+
+    def _client(chunk):
+        connection = http.client.HTTPConnection('localhost', port)
+        for payload in chunk:
+            started = time.perf_counter()
+            connection.request('POST', '/jsonrpc', payload, headers={'Content-Type': 'application/json'})
+            response = json.loads(connection.getresponse().read())
+            if 'error' in response or response['result'] is False:
+                errors.append(response)
+            latencies.append(time.perf_counter() - started)
+        connection.close()
+
+    clients = [threading.Thread(target=_client, args=(chunk,)) for chunk in chunks]
+    started = time.perf_counter()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed = time.perf_counter() - started
+
+    assert [] == errors
+    latencies.sort()
+    return len(payloads) / elapsed, latencies[int(len(latencies) * 0.99)]
+
+
+@mark.benchmark
+def test_benchmark_rpc_servers(state_service, start_server, alice):
+    requests_no, clients_no = 400, 8
+    transfers = _signed_transfers(state_service, alice, requests_no)
+
+    for service_class in [RPCServerService, AsyncRPCServerService]:
+        port = start_server(service_class)
+        own_transfers, transfers = transfers[:requests_no // 2], transfers[requests_no // 2:]
+
+        for method, payloads in [
+                ('get_utxos', [_payload('get_utxos', [alice.pub.hex()])] * requests_no),
+                ('get_current_offers', [_payload('get_current_offers', [0, 0])] * requests_no),
+                ('publish_transaction', [_payload('publish_transaction', [tx]) for tx in own_transfers])]:
+            throughput, p99 = _load(port, payloads, clients_no)
+            print(f'\n{service_class.__name__} {method}: {throughput:.0f} requests/s, p99: {p99 * 1000:.2f}ms')
@@ -0,0 +1,69 @@
+# pylint: disable=missing-docstring,redefined-outer-name,invalid-name
+import threading
+
+from pytest import raises
+
+from chasm.state._rwlock import ReadWriteLock
+
+
+def _start(target):
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_readers_do_not_block_each_other():
+    lock = ReadWriteLock()
+    entered = threading.Event()
+
+    def _read():
+        with lock.read():
+            entered.set()
+
+    with lock.read():
+        _start(_read)
+        assert entered.wait(5)
+
+
+def test_waiting_writer_blocks_new_readers():
+    lock = ReadWriteLock()
+    events = []
+
+    def _write():
+        with lock.write():
+            events.append('write')
+
+    def _read():
+        with lock.read():
+            events.append('read')
+
+    with lock.read():
+        writer = _start(_write)
+        while not lock._waiting_writers:  # pylint: disable=protected-access
+            pass
+        reader = _start(_read)
+        reader.join(0.1)
+        assert [] == events
+
+    writer.join(5)
+    reader.join(5)
+    assert ['write', 'read'] == events
+
+
+def test_is_reentrant():
+    lock = ReadWriteLock()
+
+    with lock.write(), lock.write(), lock.read():
+        pass
+    with lock.read(), lock.read():
+        pass
+
+    with lock.write():
+        pass
+
+
+def test_does_not_upgrade_read_lock():
+    lock = ReadWriteLock()
+
+    with lock.read(), raises(RuntimeError):
+        lock.acquire_write()
@@ -1,8 +1,15 @@
+import json
+import time
+
 from pytest import mark
 
+from chasm.consensus import Block
+from chasm.consensus.primitives.transaction import SignedTransaction, Transaction
+from chasm.consensus.primitives.tx_input import TxInput
+from chasm.consensus.primitives.tx_output import TransferOutput
 
 from chasm.serialization.json_serializer import JSONSerializer
-from chasm.serialization.rlp_serializer import RLPSerializer
+from chasm.serialization.rlp_serializer import RLPSerializer, RLPView
 
 
 @mark.parametrize('serializer', [RLPSerializer(), JSONSerializer()])
@@ -87,3 +94,125 @@ def test_encode_block(block, serializer):
     encoded = serializer.encode(block)
     decoded = serializer.decode(encoded)
     assert decoded == block
+
+
+def test_memoizes_encoding_and_hash_of_transactions(signed_simple_transaction):
+    encoded = RLPSerializer().encode(signed_simple_transaction)
+
+    assert encoded is RLPSerializer().encode(signed_simple_transaction)
+    assert signed_simple_transaction.hash() is signed_simple_transaction.hash()
+
+    decoded = RLPSerializer().decode(encoded)
+    assert encoded is RLPSerializer().encode(decoded)
+    assert signed_simple_transaction.hash() == decoded.hash()
+
+
+def test_invalidates_header_hash_on_change(block):
+    header = block.header
+    initial_hash = header.hash()
+
+    header.set_nonce(header.nonce + 1)
+    assert initial_hash != header.hash()
+
+    root = header.merkle_root
+    block.transactions.append(block.transactions[0])
+    block.update_merkle_root()
+    assert root != header.merkle_root
+
+    header_hash = header.hash()
+    header.nonce -= 1
+    header.merkle_root = root
+    assert initial_hash == header.hash()
+    assert header_hash != header.hash()
+
+
+def test_decodes_lazily(block, signed_simple_transaction):
+    view = RLPSerializer().decode_lazy(RLPSerializer().encode(block))
+
+    assert Block == view.obj_type
+    assert block.hash() == view.hash()
+    assert [tx.hash() for tx in block.transactions] == [tx.hash() for tx in view.transactions]
+    assert block.transactions[1].outputs == [output.materialize() for output in view.transactions[1].outputs]
+    assert block == view.materialize()
+    assert JSONSerializer().encode(block) == JSONSerializer().encode(view)
+
+    signed_view = RLPView(RLPSerializer().encode(signed_simple_transaction))
+    assert signed_simple_transaction.signatures == signed_view.signatures
+    assert signed_simple_transaction.hash() == signed_view.hash()
+    assert signed_simple_transaction == signed_view.materialize()
+
+
+def test_builds_plain_json_objects(signed_simple_transaction):
+    serializer = JSONSerializer()
+    plain = serializer.to_plain(signed_simple_transaction)
+
+    assert 'SignedTransaction' == plain['type']
+    assert 'Transaction' == plain['transaction']['type']
+    assert [signature.hex() for signature in signed_simple_transaction.signatures] == plain['signatures']
+    assert json.loads(serializer.encode(signed_simple_transaction)) == plain
+    assert signed_simple_transaction == serializer.decode(plain)
+
+
+def test_encodes_integers_wider_than_64_bits(alice):
+    output = TransferOutput(2 ** 70, alice.pub)
+    assert output == JSONSerializer().decode(JSONSerializer().encode(output))
+
+
+def _realistic_block(txs_no):
+    transactions = [SignedTransaction(Transaction([TxInput(i.to_bytes(32, byteorder='big'), 0)],
+                                                  [TransferOutput(100 + i, bytes(64)), TransferOutput(i, bytes(64))]),
+                                      [bytes(64)])
+                    for i in range(txs_no)]
+    return Block(bytes(32), 16, merkle_root=bytes(32), nonce=2 ** 32, transactions=transactions)
+
+
+def _forget_encodings(block):
+    for tx in block.transactions:
+        tx._encoded = None
+        tx.transaction._encoded = None
+
+
+@mark.benchmark
+def test_benchmark_rlp_block_throughput():
+    serializer = RLPSerializer()
+    block = _realistic_block(1000)
+    rounds = 10
+
+    encoding_time = 0
+    for _ in range(rounds):
+        _forget_encodings(block)
+        started = time.perf_counter()
+        encoded = serializer.encode(block)
+        encoding_time += time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        decoded = serializer.decode(encoded)
+    decoding_time = time.perf_counter() - started
+
+    _forget_encodings(decoded)
+    assert encoded == serializer.encode(decoded)
+
+    size = len(encoded) * rounds / 2 ** 20
+    print(f'\nencode: {rounds / encoding_time:.1f} blocks/s ({size / encoding_time:.1f} MB/s), '
+          f'decode: {rounds / decoding_time:.1f} blocks/s ({size / decoding_time:.1f} MB/s)')
+
+
+@mark.benchmark
+def test_benchmark_json_block_throughput():
+    serializer = JSONSerializer()
+    block = _realistic_block(1000)
+    rounds = 10
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        encoded = serializer.encode(block)
+    encoding_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        decoded = serializer.decode(encoded)
+    decoding_time = time.perf_counter() - started
+
+    assert block == decoded
+    print(f'\nencode: {rounds / encoding_time:.1f} blocks/s, decode: {rounds / decoding_time:.1f} blocks/s')
@@ -0,0 +1,72 @@
+from pytest import raises
+
+from chasm.state.snapshot import VersionedDict
+
+
+def test_writes_are_not_visible_until_committed():
+    versioned = VersionedDict({1: 'a'})
+    snapshot = versioned.snapshot()
+
+    versioned[2] = 'b'
+    versioned.pop(1)
+
+    assert dict(snapshot) == {1: 'a'}
+    assert dict(versioned.snapshot()) == {1: 'a'}
+    assert dict(versioned.items()) == {2: 'b'}
+
+    versioned.commit()
+
+    assert dict(snapshot) == {1: 'a'}
+    assert dict(versioned.snapshot()) == {2: 'b'}
+
+
+def test_rollback_restores_last_committed_version():
+    versioned = VersionedDict({1: 'a'})
+
+    versioned[2] = 'b'
+    versioned.pop(1)
+    versioned.rollback()
+
+    assert dict(versioned.items()) == {1: 'a'}
+    assert len(versioned) == 1
+
+
+def test_removed_entries_are_missing():
+    versioned = VersionedDict({1: 'a', 2: 'b'})
+    versioned.pop(1)
+    versioned.commit()
+
+    snapshot = versioned.snapshot()
+
+    assert 1 not in snapshot
+    assert len(snapshot) == 1
+    with raises(KeyError):
+        _ = snapshot[1]
+    with raises(KeyError):
+        versioned.pop(1)
+
+
+def test_old_versions_stay_valid_across_many_commits():
+    versioned = VersionedDict((i, i) for i in range(100))
+    snapshots = []
+
+    for i in range(100):
+        snapshots.append(versioned.snapshot())
+        versioned.pop(i)
+        versioned[i + 1000] = i
+        versioned.commit()
+
+    for i, snapshot in enumerate(snapshots):
+        expected = {**{k: k for k in range(i, 100)}, **{k + 1000: k for k in range(i)}}
+        assert dict(snapshot) == expected
+        assert len(snapshot) == len(expected)
+
+    assert versioned.snapshot().depth < 10
+
+
+def test_snapshot_compares_with_dict():
+    versioned = VersionedDict({1: 'a'})
+    versioned[2] = 'b'
+    versioned.commit()
+
+    assert versioned.snapshot() == {1: 'a', 2: 'b'}
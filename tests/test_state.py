@@ -1,9 +1,12 @@
 import queue
 import shutil
+import threading
+import time
 from queue import Empty
 
 import pytest
-from pytest import fixture
+import rlp
+from pytest import fixture, mark
 
 from chasm import consensus
 from chasm.consensus import GENESIS_BLOCK, Block
@@ -12,8 +15,11 @@ from chasm.consensus.primitives.transaction import Transaction, MintingTransacti
 from chasm.consensus.primitives.tx_input import TxInput
 from chasm.consensus.primitives.tx_output import TransferOutput, XpeerFeeOutput
 from chasm.consensus.tokens import Tokens
-from chasm.maintenance.exceptions import TxOverwriteError
-from chasm.state.state import State
+from chasm.maintenance.exceptions import TxOverwriteError, NonexistentUTXO, MempoolConflictError, \
+    DuplicatedPendingTxError
+from chasm.serialization.rlp_serializer import RLPSerializer
+from chasm.serialization.serializer import Serializer
+from chasm.state.state import State, _PendingTxsQueue
 
 
 class RestoredState:
@@ -173,9 +179,9 @@ def utxos_from_filled_state(filled_state):
     return list(filled_state.get_utxos().keys())
 
 
-def next_empty_block(state):
+def next_empty_block(state, timestamp=None):
     prev_hash = state.get_block_by_no(state.current_height).hash()
-    return Block(prev_hash, 0)
+    return Block(prev_hash, 0, timestamp=timestamp)
 
 
 def test_saves_pending_tx(empty_state, pending_transaction):
@@ -191,6 +197,21 @@ def test_pending_txs_fifo(empty_state, pending_transactions):
         assert tx == empty_state.pop_pending_tx()
 
 
+def test_removes_chosen_pending_txs(empty_state, pending_transactions, restored_state):
+    for tx in pending_transactions:
+        empty_state.add_pending_tx(tx)
+
+    removed = pending_transactions[1:4]
+    empty_state.remove_pending_txs([tx.hash() for tx in removed])
+
+    remaining = [pending_transactions[0], pending_transactions[4]]
+    assert remaining == empty_state.get_pending_txs()
+    assert (removed[0].inputs[0].tx_hash, removed[0].inputs[0].output_no) not in empty_state.mempool_spent
+
+    with restored_state as state:
+        assert {tx.hash() for tx in remaining} == {tx.hash() for tx in state.get_pending_txs()}
+
+
 def test_throws_when_no_pending_txs(empty_state):
     with pytest.raises(Empty):
         empty_state.pop_pending_tx()
@@ -204,16 +225,127 @@ def test_respects_priority_of_pending_txs(empty_state, pending_transactions):
         assert tx == empty_state.pop_pending_tx()
 
 
-def test_removes_pending_txs_with_lowest_priority(empty_state, pending_transactions, pending_transaction):
+def test_removes_pending_txs_with_lowest_priority(empty_state, pending_transactions, alice):
     for i in range(len(pending_transactions)):
         empty_state.add_pending_tx(pending_transactions[i], priority=i)
 
+    tx_hash = consensus.HASH_FUNC(b'dead').digest()
+    prioritized = [SignedTransaction(Transaction([TxInput(tx_hash, i)], [TransferOutput(i, alice.pub)]), [b'beef'])
+                   for i in range(10)]
+
     # overwrite already pending txs with ones of higher priority
-    for i in range(10):
-        empty_state.add_pending_tx(pending_transaction, priority=100)
+    for tx in prioritized:
+        empty_state.add_pending_tx(tx, priority=100)
+
+    for tx in prioritized:
+        assert tx == empty_state.pop_pending_tx()
+
+
+def test_rejects_pending_tx_spending_already_spent_output(empty_state, pending_transaction, alice):
+    empty_state.add_pending_tx(pending_transaction)
+
+    double_spend = SignedTransaction(Transaction(pending_transaction.inputs, [TransferOutput(1, alice.pub)]),
+                                     [b'beef'])
+
+    with pytest.raises(MempoolConflictError):
+        empty_state.add_pending_tx(double_spend)
+
+    assert pending_transaction == empty_state.pop_pending_tx()
+    empty_state.add_pending_tx(double_spend)
+
+
+def test_rejects_pending_tx_spending_output_spent_by_block_applied_after_validation(filled_state, utxo, alice, bob):
+    validated_height = filled_state.current_height
+    tx = SignedTransaction.build_signed(Transaction([TxInput(*utxo)], [TransferOutput(100, bob.pub)]), [alice.priv])
+    assert filled_state.tx_validator.validate(tx)
+
+    block = next_empty_block(filled_state)
+    block.add_transaction(SignedTransaction.build_signed(
+        Transaction([TxInput(*utxo)], [TransferOutput(100, alice.pub)]), [alice.priv]))
+    block.update_merkle_root()
+    filled_state.apply_block(block)
+
+    with pytest.raises(MempoolConflictError):
+        filled_state.add_pending_tx(tx, validated_height=validated_height)
+
+    assert not filled_state.is_pending(tx.hash())
+
+
+def test_indexes_pending_txs(empty_state, pending_transactions, alice, restored_state):
+    for tx in pending_transactions:
+        empty_state.add_pending_tx(tx)
 
-    for i in range(10):
-        assert pending_transaction == empty_state.pop_pending_tx()
+    first, second = pending_transactions[:2]
+    assert empty_state.is_pending(first.hash())
+    assert first == empty_state.get_pending_tx(first.hash())
+    assert first.hash() == empty_state.get_pending_spender(first.inputs[0].tx_hash, first.inputs[0].output_no)
+    assert sorted(pending_transactions, key=lambda tx: tx.hash()) == empty_state.get_address_pending_txs(alice.pub)
+
+    assert first == empty_state.pop_pending_tx()
+    empty_state.remove_pending_txs([second.hash()])
+
+    for tx in (first, second):
+        assert not empty_state.is_pending(tx.hash())
+        assert empty_state.get_pending_spender(tx.inputs[0].tx_hash, tx.inputs[0].output_no) is None
+        with pytest.raises(KeyError):
+            empty_state.get_pending_tx(tx.hash())
+
+    with restored_state as state:
+        remaining = sorted(pending_transactions[2:], key=lambda tx: tx.hash())
+        assert remaining == state.get_address_pending_txs(alice.pub)
+        assert [] == state.get_address_pending_txs(bytes(64))
+
+
+def test_evicts_pending_txs_included_in_or_conflicting_with_applied_block(filled_state, utxo, second_utxo,
+                                                                          pending_transaction, alice, bob,
+                                                                          restored_state):
+    def _transfer(entity, txo, value, receiver):
+        return SignedTransaction.build_signed(
+            Transaction(inputs=[TxInput(*txo)], outputs=[TransferOutput(value, receiver)]), [entity.priv])
+
+    included = _transfer(alice, second_utxo, 100, bob.pub)
+    conflicting = _transfer(alice, utxo, 100, bob.pub)
+    conflicting_child = _transfer(bob, (conflicting.hash(), 0), 90, alice.pub)
+    for tx in (pending_transaction, included, conflicting, conflicting_child):
+        filled_state.add_pending_tx(tx)
+
+    block = next_empty_block(filled_state)
+    block.add_transaction(included)
+    block.add_transaction(_transfer(alice, utxo, 90, alice.pub))
+    block.update_merkle_root()
+    filled_state.apply_block(block)
+
+    assert [pending_transaction] == filled_state.get_pending_txs()
+    assert [] == filled_state.get_address_pending_txs(bob.pub)
+    assert filled_state.get_pending_spender(*utxo) is None
+
+    with restored_state as state:
+        assert [pending_transaction] == state.get_pending_txs()
+
+
+def test_rejects_duplicated_pending_txs(empty_state, pending_transaction):
+    empty_state.add_pending_tx(pending_transaction)
+
+    with pytest.raises(DuplicatedPendingTxError):
+        empty_state.add_pending_tx(pending_transaction, priority=1)
+
+    assert [pending_transaction] == empty_state.get_pending_txs()
+
+
+def test_allows_spending_outputs_of_pending_txs(filled_state, utxo, alice, bob):
+    parent = SignedTransaction.build_signed(
+        Transaction(inputs=[TxInput(*utxo)], outputs=[TransferOutput(100, bob.pub)]), [alice.priv])
+    child = SignedTransaction.build_signed(
+        Transaction(inputs=[TxInput(parent.hash(), 0)], outputs=[TransferOutput(90, alice.pub)]), [bob.priv])
+
+    filled_state.tx_validator.validate(parent)
+    filled_state.add_pending_tx(parent)
+
+    assert utxo not in filled_state.get_mempool_utxos()
+    assert (parent.hash(), 0) in filled_state.get_mempool_utxos()
+
+    filled_state.tx_validator.validate(child)
+    filled_state.add_pending_tx(child)
 
 
 def test_persists_pending_txs(empty_state, restored_state, pending_transactions):
@@ -228,6 +360,67 @@ def test_persists_pending_txs(empty_state, restored_state, pending_transactions)
             state.pop_pending_tx()
 
 
+def test_restores_fifo_order_of_pending_txs(empty_state, restored_state, pending_transactions):
+    for tx in reversed(pending_transactions):
+        empty_state.add_pending_tx(tx, priority=1)
+
+    with restored_state as state:
+        assert list(reversed(pending_transactions)) == state.get_pending_txs()
+
+
+def test_does_not_restore_evicted_pending_txs(empty_state, restored_state, pending_transactions, alice, config):
+    tx_hash = consensus.HASH_FUNC(b'dead').digest()
+    prioritized = [SignedTransaction(Transaction([TxInput(tx_hash, i)], [TransferOutput(i, alice.pub)]), [b'beef'])
+                   for i in range(config.get('xpeer_pending_txs'))]
+
+    for tx in pending_transactions + prioritized:
+        empty_state.add_pending_tx(tx, priority=1 if tx in prioritized else 0)
+
+    assert not any(empty_state.is_pending(tx.hash()) for tx in pending_transactions)
+
+    with restored_state as state:
+        assert prioritized == state.get_pending_txs()
+
+
+def test_evicts_pending_descendants_of_evicted_tx(empty_state, restored_state, alice, config):
+    def _tx(tx_hash, index):
+        return SignedTransaction(Transaction([TxInput(tx_hash, index)], [TransferOutput(1, alice.pub)]), [b'beef'])
+
+    parent = _tx(consensus.HASH_FUNC(b'dead').digest(), 0)
+    child = _tx(parent.hash(), 0)
+    empty_state.add_pending_tx(parent, priority=0)
+    empty_state.add_pending_tx(child, priority=1)
+    for i in range(config.get('xpeer_pending_txs') - 2):
+        empty_state.add_pending_tx(_tx(consensus.HASH_FUNC(b'beef').digest(), i), priority=1)
+
+    with pytest.raises(queue.Full):
+        empty_state.add_pending_tx(_tx(child.hash(), 0), priority=2)
+    assert empty_state.is_pending(parent.hash()) and empty_state.is_pending(child.hash())
+
+    newcomer = _tx(consensus.HASH_FUNC(b'cafe').digest(), 0)
+    empty_state.add_pending_tx(newcomer, priority=2)
+
+    assert not empty_state.is_pending(parent.hash())
+    assert not empty_state.is_pending(child.hash())
+    assert empty_state.get_pending_spender(parent.hash(), 0) is None
+    assert config.get('xpeer_pending_txs') - 1 == len(empty_state.get_pending_txs())
+
+    with restored_state as state:
+        assert newcomer == state.get_pending_txs()[0]
+        assert not state.is_pending(child.hash())
+
+
+def test_numbers_pending_txs_of_database_without_order(empty_state, restored_state, pending_transactions):
+    for i, tx in enumerate(pending_transactions):
+        empty_state.db.put(Serializer.int_to_bytes(i), rlp.encode([i % 2, RLPSerializer().encode(tx)]), prefix=b'p')
+    empty_state.db.delete(b'queue_version')
+
+    with restored_state as state:
+        expected = pending_transactions[1::2] + pending_transactions[0::2]
+        assert expected == state.get_pending_txs()
+        assert list(range(len(expected))) == [sequence for sequence, _, _ in state.db.get_pending_txs()]
+
+
 def test_removes_pending_and_does_not_restore_them(empty_state, restored_state, pending_transactions):
     for tx, priority in zip(pending_transactions, range(len(pending_transactions), 0, -1)):
         empty_state.add_pending_tx(tx, priority)
@@ -329,12 +522,118 @@ def test_does_not_apply_block_when_utxo_does_not_exits(empty_state, restored_sta
             state.get_block_by_no(2)
 
 
+def test_snapshot_is_not_affected_by_applied_blocks(filled_state, utxo, alice, bob):
+    snapshot = filled_state.snapshot()
+
+    tx = Transaction(inputs=[TxInput(*utxo)], outputs=[TransferOutput(100, bob.pub)])
+    signed = SignedTransaction.build_signed(tx, [alice.priv])
+
+    new_block = next_empty_block(filled_state)
+    new_block.add_transaction(signed)
+    new_block.update_merkle_root()
+
+    filled_state.apply_block(new_block)
+
+    assert utxo in snapshot.utxos
+    assert (signed.hash(), 0) not in snapshot.utxos
+    assert snapshot.height == filled_state.current_height - 1
+
+    assert utxo not in filled_state.get_utxos()
+    assert (signed.hash(), 0) in filled_state.get_utxos()
+
+
 def test_can_get_transaction_by_hash(filled_state):
     tx = filled_state.get_block_by_no(1).transactions[0]
 
     assert tx == filled_state.get_transaction(tx.hash())
 
 
+def test_persists_transaction_index(filled_state, restored_state):
+    tx = filled_state.get_block_by_no(50).transactions[0]
+
+    with restored_state as state:
+        assert tx == state.get_transaction(tx.hash())
+
+        with pytest.raises(KeyError):
+            state.get_transaction(consensus.HASH_FUNC(b'unknown').digest())
+
+
+def test_indexes_transactions_of_database_without_index(filled_state, restored_state):
+    tx = filled_state.get_block_by_no(50).transactions[0]
+
+    filled_state.db.delete(b'index_version_txs')
+    for key, _ in filled_state.db.db.prefixed_db(b't'):
+        filled_state.db.delete(key, prefix=b't')
+
+    with pytest.raises(KeyError):
+        filled_state.get_transaction(tx.hash())
+
+    with restored_state as state:
+        assert tx == state.get_transaction(tx.hash())
+
+
+def test_moves_transaction_index_version_out_of_index_keyspace(filled_state, restored_state):
+    tx = filled_state.get_block_by_no(50).transactions[0]
+
+    filled_state.db.put(b'tx_index_version', filled_state.db.get(b'index_version_txs'))
+    filled_state.db.delete(b'index_version_txs')
+
+    with restored_state as state:
+        assert state.db.get(b'tx_index_version') is None
+        assert state.db.get(b'index_version_txs') is not None
+        assert tx == state.get_transaction(tx.hash())
+
+
+def test_iterates_blocks_in_height_order(filled_state):
+    blocks = [filled_state.get_block_by_no(i) for i in range(filled_state.current_height + 1)]
+
+    assert blocks == [block for _, block in filled_state.iter_blocks()]
+    assert list(enumerate(blocks))[10:20] == list(filled_state.iter_blocks(10, 20))
+    assert list(enumerate(blocks))[45:] == list(filled_state.db.iter_blocks(45))
+    assert [] == list(filled_state.iter_blocks(filled_state.current_height + 1))
+
+
+def test_indexes_blocks_of_database_without_height_index(filled_state, restored_state):
+    blocks = [filled_state.get_block_by_no(i) for i in range(filled_state.current_height + 1)]
+
+    for height in range(filled_state.current_height + 1):
+        filled_state.db.delete(height.to_bytes(8, byteorder='big'), prefix=b'n')
+
+    with restored_state as state:
+        assert blocks == [block for _, block in state.iter_blocks()]
+
+
+def test_reads_blocks_and_transactions_from_db_when_not_cached(filled_state, config):
+    blocks = [filled_state.get_block_by_no(i) for i in range(filled_state.current_height + 1)]
+    filled_state.close()
+
+    state = State(config.get('datadir'), config.get('xpeer_pending_txs'), block_cache_size=0)
+    try:
+        for height, block in enumerate(blocks):
+            assert block == state.get_block_by_no(height)
+            for tx in block.transactions:
+                assert tx == state.get_transaction(tx.hash())
+                assert tx.hash() == state.get_transaction(tx.hash(), lazy=True).hash()
+    finally:
+        state.close()
+
+
+def test_block_cache_respects_size_limit(filled_state, config):
+    block = filled_state.get_block_by_no(1)
+    block_size = len(RLPSerializer().encode(block))
+    filled_state.close()
+
+    state = State(config.get('datadir'), config.get('xpeer_pending_txs'), block_cache_size=3 * block_size)
+    try:
+        for height in range(1, filled_state.current_height + 1):
+            state.get_block_by_no(height)
+
+        assert state.blocks._cached_bytes <= 3 * block_size
+        assert len(state.blocks._cache) == 3
+    finally:
+        state.close()
+
+
 def test_cannot_apply_transaction_with_the_same_hash_twice(filled_state, utxo, alice, minting_transaction):
     next_block = next_empty_block(filled_state)
     next_block.add_transaction(minting_transaction)
@@ -373,6 +672,63 @@ def test_stores_offer_transaction_and_its_deposit(filled_state, utxo, alice, res
         assert offer_transaction.hash() in state.get_active_offers()
 
 
+def test_returns_deposits_of_timed_out_offers(filled_state, utxo, alice, restored_state):
+    timeout = int(time.time()) + 1000
+    tx = OfferTransaction([TxInput(*utxo)], outputs=[XpeerFeeOutput(50), TransferOutput(10, alice.pub)],
+                          token_in=Tokens.ETHEREUM.value, token_out=Tokens.BITCOIN.value, value_in=1, value_out=2,
+                          address_out=alice.pub, confirmation_fee_index=0, deposit_index=1, timeout=timeout)
+    offer = SignedTransaction.build_signed(tx, [alice.priv])
+
+    next_block = next_empty_block(filled_state)
+    next_block.add_transaction(offer)
+    next_block.update_merkle_root()
+    filled_state.apply_block(next_block)
+
+    assert offer.hash() in filled_state.get_active_offers()
+    assert [offer.hash()] == list(filled_state.db.iter_timeouted_offers(timeout + 1))
+
+    filled_state.apply_block(next_empty_block(filled_state, timestamp=timeout + 1))
+
+    assert offer.hash() not in filled_state.get_active_offers()
+    assert (offer.hash(), 1) in filled_state.get_utxos()
+    assert (offer.hash(), 1) not in filled_state.get_dutxos()
+
+    with restored_state as state:
+        assert offer.hash() not in state.get_active_offers()
+        assert [] == list(state.db.iter_timeouted_offers(2 ** 64))
+
+
+def test_expires_offers_timed_out_before_their_block(filled_state, utxo, alice):
+    tx = OfferTransaction([TxInput(*utxo)], outputs=[XpeerFeeOutput(50), TransferOutput(10, alice.pub)],
+                          token_in=Tokens.ETHEREUM.value, token_out=Tokens.BITCOIN.value, value_in=1, value_out=2,
+                          address_out=alice.pub, confirmation_fee_index=0, deposit_index=1, timeout=1)
+    offer = SignedTransaction.build_signed(tx, [alice.priv])
+
+    next_block = next_empty_block(filled_state)
+    next_block.add_transaction(offer)
+    next_block.update_merkle_root()
+    filled_state.apply_block(next_block)
+
+    assert offer.hash() not in filled_state.get_active_offers()
+    assert (offer.hash(), 1) in filled_state.get_utxos()
+    assert [] == list(filled_state.db.iter_timeouted_offers(2 ** 64))
+
+
+def test_indexes_offer_timeouts_of_database_without_index(filled_state, offer_transaction, restored_state):
+    next_block = next_empty_block(filled_state)
+    next_block.add_transaction(offer_transaction)
+    next_block.update_merkle_root()
+    filled_state.apply_block(next_block)
+
+    filled_state.db.delete(b'offer_timeout_index_version')
+    for key, _ in filled_state.db.db.prefixed_db(b'ot'):
+        filled_state.db.delete(key, prefix=b'ot')
+
+    with restored_state as state:
+        assert [] == list(state.db.iter_timeouted_offers(2 ** 32))
+        assert [offer_transaction.hash()] == list(state.db.iter_timeouted_offers(2 ** 32 + 1))
+
+
 def test_stores_offer_match(filled_state, offer_transaction, match_transaction, second_utxo):
     next_block = next_empty_block(filled_state)
     next_block.add_transaction(offer_transaction)
@@ -530,3 +886,228 @@ def test_persists_unlocking_deposits(filled_state_with_matched_offer, offer_tran
 
         assert offer_transaction.hash() not in state.get_active_offers()
         assert offer_transaction.hash() not in state.get_matched_offers()
+
+
+def test_indexes_utxos_by_address(filled_state, utxo, alice, bob):
+    assert len(filled_state.get_address_utxos(alice.pub)) == 100
+    assert filled_state.get_balance(alice.pub) == 100 * 100
+
+    tx = Transaction(inputs=[TxInput(*utxo)], outputs=[TransferOutput(60, bob.pub), TransferOutput(40, alice.pub)])
+    signed = SignedTransaction.build_signed(tx, [alice.priv])
+
+    new_block = next_empty_block(filled_state)
+    new_block.add_transaction(signed)
+    new_block.update_merkle_root()
+
+    filled_state.apply_block(new_block)
+
+    assert filled_state.get_address_utxos(bob.pub) == {(signed.hash(), 0): TransferOutput(60, bob.pub)}
+    assert utxo not in filled_state.get_address_utxos(alice.pub)
+    assert (signed.hash(), 1) in filled_state.get_address_utxos(alice.pub)
+
+    assert filled_state.get_balance(bob.pub) == 60
+    assert filled_state.get_balance(alice.pub) == 99 * 100 + 40
+
+
+def test_indexes_dutxos_by_address(filled_state_with_matched_offer, offer_transaction, match_transaction, alice, bob,
+                                   confirmation_transaction):
+    state = filled_state_with_matched_offer
+
+    assert (offer_transaction.hash(), 1) in state.get_address_dutxos(alice.pub)
+    assert (match_transaction.hash(), 1) in state.get_address_dutxos(bob.pub)
+    assert (offer_transaction.hash(), 1) not in state.get_address_utxos(alice.pub)
+
+    next_block = next_empty_block(state)
+    next_block.add_transaction(confirmation_transaction)
+    next_block.update_merkle_root()
+
+    state.apply_block(next_block)
+
+    assert state.get_address_dutxos(alice.pub) == {}
+    assert state.get_address_dutxos(bob.pub) == {}
+    assert (offer_transaction.hash(), 1) in state.get_address_utxos(alice.pub)
+    assert state.get_balance(bob.pub) == 10
+
+
+def test_persists_address_indices(filled_state_with_matched_offer, restored_state, alice, bob):
+    utxos = filled_state_with_matched_offer.get_address_utxos(alice.pub)
+    dutxos = filled_state_with_matched_offer.get_address_dutxos(bob.pub)
+    balance = filled_state_with_matched_offer.get_balance(alice.pub)
+
+    with restored_state as state:
+        assert state.get_address_utxos(alice.pub) == utxos
+        assert state.get_address_dutxos(bob.pub) == dutxos
+        assert state.get_balance(alice.pub) == balance
+
+
+def test_reuses_tx_validator_until_block_is_applied(filled_state, utxo, alice, bob):
+    validator = filled_state.tx_validator
+    assert validator is filled_state.tx_validator
+
+    tx = Transaction(inputs=[TxInput(*utxo)], outputs=[TransferOutput(100, bob.pub)])
+    signed = SignedTransaction.build_signed(tx, [alice.priv])
+    assert validator.validate(signed)
+
+    new_block = next_empty_block(filled_state)
+    new_block.add_transaction(signed)
+    new_block.update_merkle_root()
+    filled_state.apply_block(new_block)
+
+    assert validator is not filled_state.tx_validator
+    with pytest.raises(NonexistentUTXO):
+        filled_state.tx_validator.validate(signed)
+
+
+def test_tx_validator_sees_mempool_reloaded_after_failed_write(filled_state, utxo, alice, bob, monkeypatch):
+    validator = filled_state.tx_validator
+    tx = SignedTransaction.build_signed(Transaction([TxInput(*utxo)], [TransferOutput(100, bob.pub)]), [alice.priv])
+    filled_state.add_pending_tx(tx)
+
+    def _fail(_sequence):
+        raise OSError('write failed')
+
+    with monkeypatch.context() as patch:
+        patch.setattr(filled_state.db, 'delete_pending', _fail)
+        with pytest.raises(OSError):
+            filled_state.remove_pending_txs([tx.hash()])
+    assert filled_state.is_pending(tx.hash())
+
+    filled_state.remove_pending_txs([tx.hash()])
+
+    assert validator is filled_state.tx_validator
+    assert validator.validate(tx)
+
+
+def _apply_block_in_background(state, block, monkeypatch):
+    """
+    Starts applying a block which stops before it is written until the returned `resume` event is set
+    """
+    applying, resume = threading.Event(), threading.Event()
+    apply_new_offers = State._apply_new_offers
+
+    def _paused_apply_new_offers(self, offers):
+        applying.set()
+        resume.wait(5)
+        apply_new_offers(self, offers)
+
+    monkeypatch.setattr(State, '_apply_new_offers', _paused_apply_new_offers)
+    thread = threading.Thread(target=state.apply_block, args=(block,))
+    thread.start()
+    assert applying.wait(5)
+
+    return thread, resume
+
+
+def _run_with_timeout(func):
+    results = []
+    thread = threading.Thread(target=lambda: results.append(func()), daemon=True)
+    thread.start()
+    thread.join(5)
+
+    assert results, 'blocked by the block being applied'
+    return results[0]
+
+
+def test_reads_previous_version_while_block_is_applied(filled_state, alice, monkeypatch):
+    height = filled_state.current_height
+    block = next_empty_block(filled_state)
+    block.add_transaction(MintingTransaction(outputs=[TransferOutput(100, alice.pub)], height=height + 1))
+    block.update_merkle_root()
+
+    thread, resume = _apply_block_in_background(filled_state, block, monkeypatch)
+    try:
+        snapshot = _run_with_timeout(filled_state.snapshot)
+        assert height == snapshot.height
+        assert 100 * 100 == _run_with_timeout(lambda: filled_state.get_balance(alice.pub))
+    finally:
+        resume.set()
+        thread.join()
+
+    assert height + 1 == filled_state.current_height
+    assert 101 * 100 == filled_state.get_balance(alice.pub)
+
+
+def test_adds_pending_txs_while_block_is_applied(filled_state, pending_transaction, monkeypatch):
+    thread, resume = _apply_block_in_background(filled_state, next_empty_block(filled_state), monkeypatch)
+    try:
+        _run_with_timeout(lambda: filled_state.add_pending_tx(pending_transaction))
+    finally:
+        resume.set()
+        thread.join()
+
+    assert [pending_transaction] == filled_state.get_pending_txs()
+
+
+@mark.benchmark
+def test_benchmark_reads_under_block_application(filled_state, alice):
+    readers_no, blocks_no = 8, 50
+    stop = threading.Event()
+    latencies = [[] for _ in range(readers_no)]
+
+    def _read(reader):
+        while not stop.is_set():
+            started = time.perf_counter()
+            filled_state.get_balance(alice.pub)
+            filled_state.get_address_utxos(alice.pub)
+            filled_state.snapshot()
+            latencies[reader].append(time.perf_counter() - started)
+            time.sleep(0.001)  # RPC readers wait for requests
+
+    readers = [threading.Thread(target=_read, args=(i,)) for i in range(readers_no)]
+    for reader in readers:
+        reader.start()
+
+    started = time.perf_counter()
+    for _ in range(blocks_no):
+        block = next_empty_block(filled_state)
+        block.add_transaction(MintingTransaction(outputs=[TransferOutput(100, alice.pub)],
+                                                 height=filled_state.current_height + 1))
+        block.update_merkle_root()
+        filled_state.apply_block(block)
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    for reader in readers:
+        reader.join()
+
+    latencies = sorted(latency for reader_latencies in latencies for latency in reader_latencies)
+    print(f'\n{readers_no} readers, {blocks_no} blocks applied in {elapsed:.3f}s, {len(latencies)} reads, '
+          f'p50: {latencies[len(latencies) // 2] * 1000:.2f}ms, max: {latencies[-1] * 1000:.2f}ms')
+
+
+def test_pending_txs_queue_drops_removed_entries_from_both_heaps(pending_transactions):
+    tx = pending_transactions[0]
+    pending = _PendingTxsQueue(1000)
+    for _ in range(1000):
+        pending.push(tx, 0)
+
+    while len(pending) > 10:
+        pending.pop()
+
+    assert len(pending._first) <= 2 * len(pending) + 64  # pylint: disable=protected-access
+    assert len(pending._last) <= 2 * len(pending) + 64  # pylint: disable=protected-access
+
+
+@mark.benchmark
+def test_benchmark_pending_txs_queue(alice):
+    txs_no = 10_000
+    tx_hash = consensus.HASH_FUNC(b'beef').digest()
+    txs = [SignedTransaction(Transaction([TxInput(tx_hash, i)], [TransferOutput(i, alice.pub)]), [b'beef'])
+           for i in range(2 * txs_no)]
+
+    started = time.perf_counter()
+    pending = _PendingTxsQueue(txs_no, elements=[(i, i % 7, tx) for i, tx in enumerate(txs[:txs_no])])
+    restored = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for i, tx in enumerate(txs[txs_no:]):
+        pending.push(tx, 7 + i % 7)  # evicts
+    pushed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    while not pending.is_empty():
+        pending.pop()
+    popped = time.perf_counter() - started
+
+    print(f'\n{txs_no} pending txs restored in {restored * 1000:.1f}ms, pushed with eviction in {pushed * 1000:.1f}ms, '
+          f'popped in {popped * 1000:.1f}ms')
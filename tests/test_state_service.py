@@ -0,0 +1,171 @@
+import os
+import shutil
+import time
+
+from pytest import fixture, raises
+
+from chasm.consensus import Block
+from chasm.consensus.mining.block_builder import BlockBuilder
+from chasm.consensus.primitives.transaction import SignedTransaction, Transaction, OfferTransaction, \
+    MatchTransaction, MintingTransaction
+from chasm.consensus.primitives.tx_input import TxInput
+from chasm.consensus.primitives.tx_output import TransferOutput, XpeerFeeOutput
+from chasm.consensus.tokens import Tokens
+from chasm.consensus.validation.tx_validator import TxValidator
+from chasm.maintenance.exceptions import DuplicatedPendingTxError, MatchNonExistentOfferError, MempoolConflictError, \
+    NonexistentUTXO
+from chasm.state.service import StateService, StateEvent
+
+
+@fixture
+def state_service(config):
+    shutil.rmtree(os.path.join(config.get('datadir'), 'db'), ignore_errors=True)
+
+    service = StateService(config, dev=True)
+    service.start(lambda: False)
+    yield service
+
+    service.stop()
+    shutil.rmtree(os.path.join(config.get('datadir'), 'db'))
+
+
+def test_publishes_state_changes(state_service, alice, bob):
+    events = []
+    state_service.subscribe(lambda event, *args: events.append((event, *args)))
+
+    block = BlockBuilder(state_service, alice.pub, dev=True).build_block()
+    state_service.apply_block(block)
+
+    assert [(StateEvent.NEW_TIP, 1, block.hash())] == events
+
+    minted = block.transactions[0]
+    tx = SignedTransaction.build_signed(
+        Transaction(inputs=[TxInput(minted.hash(), 0)], outputs=[TransferOutput(minted.outputs[0].value - 7, bob.pub)]),
+        [alice.priv])
+    state_service.add_pending_tx(tx)
+
+    assert (StateEvent.NEW_PENDING_TX, tx, 7) == events[-1]
+
+
+def test_stops_publishing_to_unsubscribed(state_service, alice):
+    events = []
+
+    def callback(event, *args):
+        events.append(event)
+
+    state_service.subscribe(callback)
+    state_service.unsubscribe(callback)
+    state_service.apply_block(BlockBuilder(state_service, alice.pub, dev=True).build_block())
+
+    assert [] == events
+
+
+def test_rejects_duplicated_pending_txs_before_validating_them(state_service, alice, bob, monkeypatch):
+    block = BlockBuilder(state_service, alice.pub, dev=True).build_block()
+    state_service.apply_block(block)
+
+    minted = block.transactions[0]
+    tx = SignedTransaction.build_signed(
+        Transaction(inputs=[TxInput(minted.hash(), 0)], outputs=[TransferOutput(minted.outputs[0].value, bob.pub)]),
+        [alice.priv])
+    state_service.add_pending_tx(tx)
+
+    monkeypatch.setattr(TxValidator, 'validate', None)
+    with raises(DuplicatedPendingTxError):
+        state_service.add_pending_tx(tx)
+
+
+def test_rejects_pending_tx_spending_output_spent_while_it_is_validated(state_service, alice, bob, monkeypatch):
+    block = BlockBuilder(state_service, alice.pub, dev=True).build_block()
+    state_service.apply_block(block)
+
+    minted = block.transactions[0]
+    tx, conflicting = [SignedTransaction.build_signed(
+        Transaction(inputs=[TxInput(minted.hash(), 0)], outputs=[TransferOutput(minted.outputs[0].value, receiver)]),
+        [alice.priv]) for receiver in (bob.pub, alice.pub)]
+
+    validate = TxValidator.validate
+
+    def validate_and_apply_block(validator, obj, *args, **kwargs):
+        result = validate(validator, obj, *args, **kwargs)
+        monkeypatch.setattr(TxValidator, 'validate', validate)
+        state_service.apply_block(_block(state_service, alice, [conflicting]))
+        return result
+
+    monkeypatch.setattr(TxValidator, 'validate', validate_and_apply_block)
+    with raises(MempoolConflictError):
+        state_service.add_pending_tx(tx)
+
+    assert not state_service.is_pending(tx.hash())
+
+
+def test_keeps_transactions_of_built_block_pending_until_it_is_applied(state_service, alice, bob):
+    block = BlockBuilder(state_service, alice.pub, dev=True).build_block()
+    state_service.apply_block(block)
+
+    minted = block.transactions[0]
+    parent, conflicting = [SignedTransaction.build_signed(
+        Transaction(inputs=[TxInput(minted.hash(), 0)], outputs=[TransferOutput(minted.outputs[0].value, receiver)]),
+        [alice.priv]) for receiver in (bob.pub, alice.pub)]
+    state_service.add_pending_tx(parent)
+
+    template = BlockBuilder(state_service, alice.pub, dev=True).build_block()
+
+    child = SignedTransaction.build_signed(
+        Transaction(inputs=[TxInput(parent.hash(), 0)], outputs=[TransferOutput(minted.outputs[0].value, alice.pub)]),
+        [bob.priv])
+    state_service.add_pending_tx(child)
+    with raises(NonexistentUTXO):
+        state_service.add_pending_tx(conflicting)
+
+    state_service.apply_block(template)
+    assert [child] == state_service.get_pending_txs()
+
+
+def _block(state_service, miner, txs=(), timestamp=None):
+    block = Block(state_service.get_block_by_no(state_service.current_height).hash(), 0, timestamp=timestamp)
+    block.add_transaction(MintingTransaction([TransferOutput(10, miner.pub)], height=state_service.current_height))
+    for tx in txs:
+        block.add_transaction(tx)
+    block.update_merkle_root()
+    return block
+
+
+def test_rejects_matches_of_offers_timed_out_before_the_tip(state_service, alice, bob):
+    builder = BlockBuilder(state_service, alice.pub, dev=True)
+    minted = []
+    for _ in range(2):
+        block = builder.build_block()
+        state_service.apply_block(block)
+        minted.append(block.transactions[0])
+
+    timeout = int(time.time()) + 1000
+    offer = SignedTransaction.build_signed(OfferTransaction(
+        [TxInput(minted[0].hash(), 0)], [XpeerFeeOutput(50), TransferOutput(1000, alice.pub),
+                                         TransferOutput(minted[0].outputs[0].value - 1050, alice.pub)],
+        token_in=Tokens.XPEER.value, token_out=Tokens.XPEER.value, value_in=1, value_out=2, address_out=alice.pub,
+        confirmation_fee_index=0, deposit_index=1, timeout=timeout), [alice.priv])
+    state_service.apply_block(_block(state_service, alice, [offer]))
+
+    match = SignedTransaction.build_signed(MatchTransaction(
+        [TxInput(minted[1].hash(), 0)], [XpeerFeeOutput(50), TransferOutput(1000, alice.pub),
+                                         TransferOutput(minted[1].outputs[0].value - 1050, alice.pub)],
+        exchange=offer.hash(), address_in=alice.pub, confirmation_fee_index=0, deposit_index=1), [alice.priv])
+    state_service.add_pending_tx(match)
+
+    state_service.apply_block(_block(state_service, alice, timestamp=timeout + 1))
+    height = state_service.current_height
+
+    assert not state_service.is_pending(match.hash())
+    with raises(MatchNonExistentOfferError):
+        state_service.tx_validator.validate(match)
+    with raises(MatchNonExistentOfferError):
+        state_service.apply_block(_block(state_service, alice, [match], timestamp=timeout + 2))
+    assert height == state_service.current_height
+
+    refund = SignedTransaction.build_signed(
+        Transaction([TxInput(offer.hash(), 1)], [TransferOutput(1000, bob.pub)]), [alice.priv])
+    state_service.add_pending_tx(refund)
+    state_service.apply_block(builder.build_block())
+
+    assert {(refund.hash(), 0)} == set(state_service.get_address_utxos(bob.pub))